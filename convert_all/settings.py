@@ -127,7 +127,8 @@ if not DEBUG:
         }
     }
 
-MEDIA_ROOT = BASE_DIR / "media"
+# MEDIA_ROOT é também a fila de conversões: web e images_worker precisam do mesmo diretório
+MEDIA_ROOT = Path(os.environ.get("MEDIA_ROOT") or BASE_DIR / "media")
 MEDIA_URL = "/media/"
 FILE_UPLOAD_TEMP_DIR = str((MEDIA_ROOT / "_tmp_uploads").resolve())
 
@@ -160,7 +161,8 @@ if not DEBUG:
 # Uploads / Limites
 # =========================================================
 FILE_UPLOAD_MAX_MEMORY_SIZE = 0
-FILE_UPLOAD_HANDLERS = ["django.core.files.uploadhandler.TemporaryFileUploadHandler"]
+# grava em disco e calcula o sha256 no caminho (dedup do lote sem reler o arquivo)
+FILE_UPLOAD_HANDLERS = ["tools.images.upload_handlers.HashingTemporaryFileUploadHandler"]
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 100_000
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1_024 * 1_024 * 1_024  # 1 GB
 
@@ -186,12 +188,136 @@ else:
 DATA_UPLOAD_MAX_NUMBER_FILES = int(ACTIVE_MAX_FILES)
 UPGRADE_URL = "/premium"
 
+# =========================================================
+# Conversor de imagens
+# =========================================================
+# Processos usados por lote (1 = sequencial). Em máquinas com vários núcleos,
+# lotes grandes convertem arquivos em paralelo.
+IMAGES_CONVERTER_WORKERS = int(os.environ.get("IMAGES_CONVERTER_WORKERS", "1"))
+
+# /processar/ só enfileira; quem converte é o worker (python manage.py images_worker).
+# Intervalo de verificação da fila quando ela está vazia.
+IMAGES_JOBS_POLL_SECONDS = float(os.environ.get("IMAGES_JOBS_POLL_SECONDS", "1.0"))
+# Jobs convertidos ao mesmo tempo por worker (dividem o IMAGES_MEMORY abaixo)
+IMAGES_JOBS_CONCURRENCY = int(os.environ.get("IMAGES_JOBS_CONCURRENCY", "1"))
+# Sem sinal de vida de nenhum worker por esse tempo, /jobs/<id>/ reporta como
+# erro um job que está na fila há mais do que isso (o worker bate a cada 1/4).
+IMAGES_WORKER_STALE_SECONDS = float(os.environ.get("IMAGES_WORKER_STALE_SECONDS", "60"))
+
+# Cache de resultados por conteúdo (mesma origem + formato + parâmetros = reaproveita).
+# DIR vazio/None desliga o cache.
+IMAGES_RESULT_CACHE = {
+    "DIR": str(MEDIA_ROOT / "_cache" / "images"),
+    "MAX_BYTES": int(os.environ.get("IMAGES_RESULT_CACHE_MAX_BYTES", 512 * 1024 * 1024)),  # 512 MB
+}
+
+# Formatos de saída (ImageFormat + plugins do Pillow) ficam em cache no processo;
+# salvar/apagar no admin invalida na hora, os outros processos recarregam após o TTL.
+IMAGES_FORMAT_REGISTRY_TTL_SECONDS = float(os.environ.get("IMAGES_FORMAT_REGISTRY_TTL_SECONDS", "300"))
+
+# Imagens com pelo menos isso de pixels são convertidas em faixas (sem decodificar
+# a imagem inteira) quando não há redimensionamento nem rotação EXIF e origem e
+# destino permitem (PNG/TIFF/BMP/PPM sem compressão exótica; ver tools.images.strips).
+# 0 desliga.
+IMAGES_STRIP_MIN_PIXELS = int(os.environ.get("IMAGES_STRIP_MIN_PIXELS", 32_000_000))
+
+# Orçamento de memória de pixels (estimado pelo cabeçalho, sem decodificar).
+#  - PROCESS_BUDGET_BYTES: teto somado das conversões simultâneas num processo
+#    (semáforo); lotes acima disso rodam enfileirados, não em paralelo.
+#  - MAX_FILE_PEAK_BYTES: arquivo cuja conversão sozinha passa disso é recusado (413).
+#    None (padrão) = nenhum é recusado: o que passa do PROCESS_BUDGET_BYTES roda
+#    sozinho, esperando as demais conversões do processo terminarem.
+#  - MAX_BATCH_DECODED_BYTES: soma dos pixels decodificados do lote (None = sem limite).
+IMAGES_MEMORY = {
+    "PROCESS_BUDGET_BYTES": int(os.environ.get("IMAGES_PROCESS_BUDGET_BYTES", 384 * 1024 * 1024)),
+    "MAX_FILE_PEAK_BYTES": int(os.environ["IMAGES_MAX_FILE_PEAK_BYTES"]) if os.environ.get("IMAGES_MAX_FILE_PEAK_BYTES") else None,
+    "MAX_BATCH_DECODED_BYTES": None,
+}
+
+# Retenção de MEDIA_ROOT/tmp_uploads (uploads + ZIP de cada job); ver tools.images.retention.
+#  - TTL_SECONDS: jobs terminados são removidos após esse tempo (o link do ZIP expira junto).
+#  - ACTIVE_MAX_AGE_SECONDS: jobs "ativos" parados há mais que isso são tratados como abandonados.
+#  - HIGH_WATER_BYTES / DISK_HIGH_WATER_PERCENT: acima disso os jobs terminados mais antigos
+#    saem antes do TTL, até LOW_WATER_RATIO do limite.
+#  - SWEEP_INTERVAL_SECONDS: intervalo da limpeza em segundo plano no images_worker (0 = desliga;
+#    também dá para rodar manage.py images_cleanup via cron).
+IMAGES_RETENTION = {
+    "TTL_SECONDS": int(os.environ.get("IMAGES_RETENTION_TTL_SECONDS", 6 * 3600)),
+    "ACTIVE_MAX_AGE_SECONDS": 24 * 3600,
+    "HIGH_WATER_BYTES": int(os.environ.get("IMAGES_RETENTION_HIGH_WATER_BYTES", 2 * 1024 * 1024 * 1024)),  # 2 GB
+    "DISK_HIGH_WATER_PERCENT": 90,
+    "LOW_WATER_RATIO": 0.8,
+    "SWEEP_INTERVAL_SECONDS": 300,
+}
+
+# Preset de esforço do encoder por plano, quando o usuário não escolhe
+# (tools.images.converter.ENCODER_PRESETS: fast / balanced / max-compression).
+# "fast" codifica PNG ~3x e WEBP ~2,5x mais rápido que "balanced", com
+# arquivos ~20% maiores; fica para quem escolhe no formulário.
+IMAGES_ENCODER_PRESETS = {
+    "FREE": "balanced",
+    "PREMIUM": "balanced",
+}
+
+# Redução a 256 cores (GIF/XPM) quando o usuário não escolhe
+# (tools.images.converter.QUANTIZERS: mediancut / fastoctree / libimagequant).
+IMAGES_QUANTIZER = os.environ.get("IMAGES_QUANTIZER", "mediancut")
+
+# Métricas de conversão (tempos por etapa, bytes), agregadas por formato.
+#  - SINKS: "log" (logger tools.images.metrics), "prometheus" (contadores em DIR,
+#    expostos em /metricas/), "db" (ConversionJob + agregados, que alimentam
+#    /api/conversions/stats) ou caminho pontilhado de uma subclasse de MetricsSink.
+#  - TOKEN: se definido, /metricas/ exige "Authorization: Bearer <TOKEN>".
+IMAGES_METRICS = {
+    "SINKS": ["log", "prometheus", "db"],
+    "DIR": str(MEDIA_ROOT / "_metrics"),
+    "TOKEN": os.environ.get("IMAGES_METRICS_TOKEN") or None,
+}
+
+# Cache de /api/conversions/stats (contador "conversões concluídas" da página)
+IMAGES_STATS_CACHE_SECONDS = int(os.environ.get("IMAGES_STATS_CACHE_SECONDS", "10"))
+
+# SSE de progresso (/jobs/<id>/eventos/): intervalo de checagem do status e keep-alive
+IMAGES_SSE_INTERVAL_SECONDS = 0.25
+IMAGES_SSE_KEEPALIVE_SECONDS = 15.0
+
+# Entrega do ZIP: "queue" (worker grava em disco, cliente baixa depois) ou
+# "stream" (ZIP gerado durante o download em /jobs/<id>/zip/, sem arquivo em disco).
+# Job em streaming sem download após IMAGES_STREAM_CLAIM_SECONDS vai para o worker.
+IMAGES_DEFAULT_DELIVERY = os.environ.get("IMAGES_DEFAULT_DELIVERY", "queue")
+IMAGES_STREAM_CLAIM_SECONDS = float(os.environ.get("IMAGES_STREAM_CLAIM_SECONDS", "30"))
+
+# Upload em partes (/envios/): lotes a partir de MIN_BATCH_BYTES vão do navegador
+# em pedaços de até CHUNK_BYTES, retomáveis pelo job_id, e a conversão começa
+# quando o primeiro arquivo termina de chegar. Sem pedaço novo por IDLE_SECONDS
+# o worker larga o job até o envio voltar (o já convertido fica no cache).
+IMAGES_UPLOAD = {
+    "CHUNK_BYTES": int(os.environ.get("IMAGES_UPLOAD_CHUNK_BYTES", 8 * 1024 * 1024)),  # 8 MB
+    "MIN_BATCH_BYTES": int(os.environ.get("IMAGES_UPLOAD_MIN_BATCH_BYTES", 32 * 1024 * 1024)),  # 32 MB
+    "IDLE_SECONDS": float(os.environ.get("IMAGES_UPLOAD_IDLE_SECONDS", "120")),
+}
+
 # =========================================================
 # Logs básicos
 # =========================================================
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "formatters": {
+        # métricas já saem como JSON na mensagem (tools.images.metrics.LoggingSink)
+        "metrics": {"format": "%(asctime)s %(name)s %(message)s"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+        "metrics": {"class": "logging.StreamHandler", "formatter": "metrics"},
+    },
     "root": {"handlers": ["console"], "level": "INFO"},
+    "loggers": {
+        # DEBUG inclui uma linha por arquivo convertido
+        "tools.images.metrics": {
+            "handlers": ["metrics"],
+            "level": os.environ.get("IMAGES_METRICS_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
+    },
 }
@@ -24,6 +24,8 @@ from tools.images import views as images_views
 urlpatterns = [
     path("i18n/", include("django.conf.urls.i18n")),
     path("admin/", admin.site.urls),
+    # fora do i18n_patterns: o live-stats.js busca o caminho fixo
+    path("api/conversions/stats", images_views.conversion_stats, name="conversion_stats"),
 ]
 
 urlpatterns += i18n_patterns(
@@ -0,0 +1,40 @@
+# gunicorn.conf.py
+"""
+Servidor web: python -m gunicorn -c gunicorn.conf.py (ver render.yaml).
+
+Workers e bind seguem o padrão do gunicorn: WEB_CONCURRENCY e PORT.
+
+Com GUNICORN_PRELOAD=1 (padrão) o mestre carrega o Django, as URLs, o
+conversor e os plugins do Pillow uma vez (tools.images.preload.warm_up),
+congela o heap no GC e só então faz o fork: os workers nascem prontos e
+compartilham essas páginas copy-on-write. Com GUNICORN_PRELOAD=0 cada worker
+carrega e aquece sozinho (útil com --reload em desenvolvimento).
+"""
+import gc
+import os
+
+wsgi_app = "convert_all.asgi:application"
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1").strip().lower() not in ("0", "false", "no", "")
+
+
+def _warm_up(log) -> None:
+    from tools.images.preload import warm_up
+
+    timings = warm_up()
+    log.info("warm-up: " + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in timings.items()))
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    _warm_up(server.log)
+    # Objetos do boot não são coletados nunca: tirá-los do GC evita que as
+    # coletas nos workers escrevam nos cabeçalhos deles e copiem as páginas
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up(worker.log)
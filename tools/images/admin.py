@@ -1,9 +1,35 @@
 from django.contrib import admin
-from .models import ImageFormat
+from .models import ConversionJob, ConversionRollup, ImageFormat
 
 @admin.register(ImageFormat)
 class ImageFormatAdmin(admin.ModelAdmin):
     """Configurações do modelo ImageFormat no site admin."""
     list_display = ('acronym', 'file_extension', 'format_name', 'description',)
     search_fields = ('acronym', 'file_extension', 'format_name',)
-    list_filter = ('acronym',)
\ No newline at end of file
+    list_filter = ('acronym',)
+
+@admin.register(ConversionJob)
+class ConversionJobAdmin(admin.ModelAdmin):
+    """Histórico de lotes (somente leitura; gravado pelo sink "db")."""
+    list_display = ('finished_at', 'out_ext', 'src_formats', 'files', 'converted', 'fallback_count', 'errors', 'ok',)
+    list_filter = ('ok', 'out_ext',)
+    date_hierarchy = 'finished_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ConversionRollup)
+class ConversionRollupAdmin(admin.ModelAdmin):
+    """Agregados por hora/dia/total (somente leitura)."""
+    list_display = ('period', 'bucket', 'src_format', 'dst_format', 'jobs', 'converted', 'fallback_count', 'errors',)
+    list_filter = ('period', 'dst_format',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
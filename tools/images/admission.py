@@ -0,0 +1,250 @@
+# tools/images/admission.py
+"""
+Controle de admissão por memória decodificada.
+
+O tamanho do upload diz pouco: um PNG de 15 MB pode virar vários GB de pixels.
+Aqui estimamos, só pelo cabeçalho (sem decodificar), quanta memória cada
+imagem vai ocupar durante a conversão, e limitamos o total em uso no processo
+com um semáforo contado em bytes (MemoryBudget).
+
+`probe()` é a leitura de cabeçalho em si (formato, dimensões, modo, quadros,
+orientação EXIF, perfil ICC); serve tanto ao endpoint de pré-validação do
+uploader quanto a `estimate()`. Imagens convertidas em faixas (ver strips)
+custam só o pico de uma faixa: `cost_of(info, streamed=True)`; as que
+decodificam reduzidas custam pelo tamanho reduzido (`reduced_to`).
+ImagesConverter.cost decide os dois a partir das opções da conversão.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator, List, Optional, Union
+
+from PIL import Image
+
+from . import strips
+
+# Bytes por pixel na memória do Pillow (RGB ocupa 4 bytes, como RGBA)
+_PIXEL_BYTES = {
+    "1": 1, "L": 1, "P": 1,
+    "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2,
+}
+_DEFAULT_PIXEL_BYTES = 4
+
+# Cópias de trabalho além da imagem decodificada (exif_transpose, conversão
+# para RGB/RGBA, fundo do achatamento de alpha...), todas em 4 bytes/pixel.
+WORKING_COPIES = 2
+# Animações guardam também o quadro anterior (caixa de diferença GIF/APNG).
+ANIMATION_EXTRA_COPIES = 1
+
+_EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class ImageProbe:
+    name: str
+    ok: bool = True         # False = cabeçalho ilegível (não é imagem?)
+    format: str = ""
+    width: int = 0
+    height: int = 0
+    mode: str = ""
+    frames: int = 1         # 0 = não deu para contar (arquivo truncado)
+    orientation: int = 1    # tag EXIF 0x0112; 5–8 trocam largura e altura
+    has_icc: bool = False
+    has_exif: bool = False  # bloco EXIF bruto (im.info["exif"]), como o conversor grava
+    strips: bool = False    # origem legível em faixas (strips.readable)
+    reason: str = ""
+
+    @property
+    def animated(self) -> bool:
+        return self.frames > 1
+
+    @property
+    def oriented_size(self) -> tuple[int, int]:
+        """Dimensões depois de aplicar a orientação EXIF."""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+    def as_dict(self) -> dict:
+        w, h = self.oriented_size
+        return {
+            "name": self.name,
+            "ok": self.ok,
+            "format": self.format,
+            "width": w,
+            "height": h,
+            "mode": self.mode,
+            "frames": self.frames,
+            "orientation": self.orientation,
+            "has_icc": self.has_icc,
+            "has_exif": self.has_exif,
+            **({"reason": self.reason} if self.reason else {}),
+        }
+
+
+@dataclass
+class ImageCost:
+    name: str
+    width: int = 0
+    height: int = 0
+    mode: str = ""
+    decoded_bytes: int = 0  # só a imagem decodificada
+    peak_bytes: int = 0     # estimativa de pico durante a conversão
+    ok: bool = True         # False = cabeçalho ilegível (não é imagem?)
+
+
+def _frame_count(im: Image.Image) -> int:
+    # GIF/APNG/WEBP percorrem os blocos sem descomprimir; arquivo truncado
+    # no meio da animação estoura aqui, mas o primeiro quadro ainda serve.
+    try:
+        return max(1, int(getattr(im, "n_frames", 1)))
+    except Exception:
+        return 0
+
+
+def exif_orientation(im: Image.Image) -> int:
+    # PngImageFile.getexif() carrega a imagem inteira se o eXIf vier depois
+    # dos dados; fora do TIFF (tags já no cabeçalho) lemos só o bloco bruto.
+    try:
+        if im.format == "TIFF":
+            exif = im.getexif()
+        else:
+            raw = im.info.get("exif")
+            if not raw:
+                return 1
+            exif = Image.Exif()
+            exif.load(raw)
+        value = int(exif.get(_EXIF_ORIENTATION, 1))
+    except Exception:
+        return 1
+    return value if 1 <= value <= 8 else 1
+
+
+def probe(fp: Union[Path, IO[bytes]], name: Optional[str] = None) -> ImageProbe:
+    """Lê só o cabeçalho: nenhum pixel é decodificado. Restaura a posição de `fp`."""
+    from .converter import load_plugins
+
+    load_plugins()  # sem isso um TIFF/WebP faria o Image.open carregar todos os plugins
+    label = str(name or getattr(fp, "name", None) or fp)
+    pos = fp.tell() if hasattr(fp, "tell") else None
+    try:
+        with Image.open(fp) as im:
+            w, h = im.size
+            if w <= 0 or h <= 0:
+                return ImageProbe(name=label, ok=False, format=im.format or "", reason="Dimensões inválidas")
+            return ImageProbe(
+                name=label,
+                format=im.format or "",
+                width=w,
+                height=h,
+                mode=im.mode,
+                frames=_frame_count(im),
+                orientation=exif_orientation(im),
+                has_icc=bool(im.info.get("icc_profile")),
+                has_exif=bool(im.info.get("exif")),
+                strips=strips.readable(im),
+            )
+    except Image.DecompressionBombError:
+        return ImageProbe(name=label, ok=False, reason="Resolução acima do limite de segurança")
+    except Exception:
+        return ImageProbe(name=label, ok=False, reason="Não é uma imagem reconhecida ou o arquivo está corrompido")
+    finally:
+        if pos is not None:
+            fp.seek(pos)
+
+
+def cost_of(
+    info: ImageProbe, *, streamed: bool = False, reduced_to: Optional[tuple[int, int]] = None,
+) -> ImageCost:
+    """
+    Custo em memória a partir de um `probe()` já feito. `streamed` = a
+    conversão sai em faixas (ImagesConverter.streams): só uma faixa fica
+    decodificada por vez. `reduced_to` = tamanho da decodificação reduzida
+    (ImagesConverter.cost): o JPEG já decodifica nele (draft); os demais
+    decodificam inteiros e só as cópias de trabalho encolhem.
+    """
+    if not info.ok:
+        return ImageCost(name=info.name, ok=False)
+    if streamed:
+        rows = strips.band_rows(info.width, info.height)
+        decoded = info.width * rows * _PIXEL_BYTES.get(info.mode, _DEFAULT_PIXEL_BYTES)
+        peak = strips.peak_bytes(info.width, info.height)
+        return ImageCost(name=info.name, width=info.width, height=info.height, mode=info.mode, decoded_bytes=decoded, peak_bytes=peak)
+    pixels = info.width * info.height
+    work = reduced_to[0] * reduced_to[1] if reduced_to else pixels
+    copies = WORKING_COPIES + (ANIMATION_EXTRA_COPIES if info.animated else 0)
+    if reduced_to and info.format == "JPEG":
+        pixels = work
+    elif reduced_to:
+        copies += 1  # a própria imagem reduzida, ao lado da original
+    decoded = pixels * _PIXEL_BYTES.get(info.mode, _DEFAULT_PIXEL_BYTES)
+    peak = decoded + work * _DEFAULT_PIXEL_BYTES * copies
+    return ImageCost(name=info.name, width=info.width, height=info.height, mode=info.mode, decoded_bytes=decoded, peak_bytes=peak)
+
+
+def estimate(fp: Union[Path, IO[bytes]], name: Optional[str] = None) -> ImageCost:
+    """Estima o custo em memória lendo apenas o cabeçalho da imagem."""
+    return cost_of(probe(fp, name))
+
+
+def batch_peak(costs: List[ImageCost], concurrency: int = 1) -> int:
+    """
+    Pico estimado do lote: as N maiores imagens convertidas ao mesmo tempo
+    (N = nº de processos/threads convertendo em paralelo).
+    """
+    peaks = sorted((c.peak_bytes for c in costs), reverse=True)
+    return sum(peaks[: max(1, concurrency)])
+
+
+class MemoryBudget:
+    """
+    Semáforo em bytes, por processo: conversões concorrentes reservam a
+    memória estimada antes de começar e devolvem ao terminar, de modo que a
+    soma nunca passa de `capacity`.
+    """
+    def __init__(self, capacity: int) -> None:
+        self.capacity = int(capacity)
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def _clamp(self, nbytes: int) -> int:
+        # uma imagem maior que o teto inteiro ainda pode rodar, sozinha
+        return max(0, min(int(nbytes), self.capacity))
+
+    def try_acquire(self, nbytes: int) -> bool:
+        n = self._clamp(nbytes)
+        with self._cond:
+            if self.in_use + n > self.capacity:
+                return False
+            self.in_use += n
+            return True
+
+    def acquire(self, nbytes: int, timeout: Optional[float] = None) -> bool:
+        n = self._clamp(nbytes)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.in_use + n > self.capacity:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.in_use += n
+            return True
+
+    def release(self, nbytes: int) -> None:
+        n = self._clamp(nbytes)
+        with self._cond:
+            self.in_use = max(0, self.in_use - n)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes: int) -> Iterator[None]:
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
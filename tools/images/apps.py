@@ -6,3 +6,13 @@ class ImagesConfig(AppConfig):
     name = 'tools.images'   # caminho REAL do pacote do app
     label = "images"        # label do app (mantém compatibilidade das migrações)
     verbose_name = "Conversor de Imagens"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from . import registry
+        from .models import ImageFormat
+
+        # cache de formatos (registry) recarrega quando o admin muda um ImageFormat
+        post_save.connect(registry.invalidate, sender=ImageFormat, dispatch_uid="images-registry-save")
+        post_delete.connect(registry.invalidate, sender=ImageFormat, dispatch_uid="images-registry-delete")
@@ -0,0 +1,410 @@
+# tools/images/bench.py
+"""
+Benchmark do motor de conversão (ImagesConverter).
+
+Gera localmente um corpus sintético e determinístico (tamanhos × modos ×
+formatos de origem), cronometra `convert_one` e `convert_batch_to_zip` para
+cada extensão de EXT_TO_PIL e devolve um relatório serializável em JSON:
+imagens/s, MP/s, latência p50/p95 e pico de RSS. O caso "flatten" mede só
+o achatamento de alpha, antes (`_legacy_flatten`) e agora (`_flatten_alpha`).
+
+Uso: python manage.py images_bench --out bench.json [--compare antigo.json]
+"""
+from __future__ import annotations
+
+import functools
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import PIL
+from PIL import Image
+
+from .converter import EXT_TO_PIL, ImagesConverter, _flatten_alpha
+
+# Tamanhos (w, h) do corpus padrão e do modo --quick
+DEFAULT_SIZES: Tuple[Tuple[int, int], ...] = ((640, 480), (1920, 1080), (4000, 3000))
+QUICK_SIZES: Tuple[Tuple[int, int], ...] = ((320, 240), (1280, 720))
+
+# Modo de origem -> formatos de origem que conseguem gravá-lo
+SOURCE_FORMATS: Dict[str, Tuple[str, ...]] = {
+    "RGB": ("jpg", "png", "webp"),
+    "RGBA": ("png", "webp", "tiff"),
+    "P": ("png", "gif"),
+    "CMYK": ("jpg", "tiff"),
+    "L": ("png", "jpg", "bmp"),
+}
+
+CASES: Tuple[str, ...] = ("convert_one", "convert_batch_to_zip", "flatten")
+
+# Origens do caso "flatten" (o que chega ao preparo de JPEG/BMP/PCX)
+FLATTEN_SOURCES: Tuple[str, ...] = ("RGBA", "RGBA-opaco", "LA", "P-transparente")
+
+
+# ------------------------------ Corpus ------------------------------
+@dataclass
+class CorpusItem:
+    path: Path
+    mode: str
+    size: Tuple[int, int]
+
+    @property
+    def megapixels(self) -> float:
+        return self.size[0] * self.size[1] / 1_000_000
+
+
+def _synthetic_rgb(size: Tuple[int, int], rng: random.Random) -> Image.Image:
+    """
+    Conteúdo "de foto": fractal + gradiente + ruído. Nem trivialmente
+    compressível (cor chapada) nem incompressível (ruído puro).
+    """
+    w, h = size
+    fractal = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 64)
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.frombytes("L", size, rng.randbytes(w * h))
+    noise = Image.blend(gradient, noise, 0.25)
+    return Image.merge("RGB", (fractal, gradient, noise))
+
+
+def build_corpus(
+    root: Path,
+    *,
+    sizes: Sequence[Tuple[int, int]] = DEFAULT_SIZES,
+    modes: Optional[Sequence[str]] = None,
+    seed: int = 1234,
+) -> List[CorpusItem]:
+    """Gera (ou reaproveita, se já existir) o corpus em `root`."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    items: List[CorpusItem] = []
+    for size in sizes:
+        rng = random.Random(f"{seed}-{size}")
+        base: Optional[Image.Image] = None
+        for mode in modes or SOURCE_FORMATS:
+            for ext in SOURCE_FORMATS[mode]:
+                path = root / f"{mode.lower()}-{size[0]}x{size[1]}.{ext}"
+                if not path.exists():
+                    if base is None:
+                        base = _synthetic_rgb(size, rng)
+                    if mode == "RGBA":
+                        im = base.copy()
+                        im.putalpha(Image.linear_gradient("L").rotate(90).resize(size))
+                    elif mode == "P":
+                        im = base.convert("P", palette=Image.Palette.ADAPTIVE)
+                    else:
+                        im = base.convert(mode)
+                    im.save(path)
+                items.append(CorpusItem(path=path, mode=mode, size=size))
+    return items
+
+
+# ------------------------------ Medições ------------------------------
+def _current_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@contextmanager
+def peak_rss() -> Iterator[Dict[str, Optional[float]]]:
+    """
+    Pico de RSS (MB) durante o bloco. Amostra /proc/self/statm a cada 5 ms;
+    sem /proc, usa ru_maxrss (pico do processo inteiro, não só do bloco).
+    """
+    out: Dict[str, Optional[float]] = {"peak_rss_mb": None}
+    if _current_rss() is None:
+        yield out
+        out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return
+
+    peak = [_current_rss() or 0]
+    stop = threading.Event()
+
+    def sample() -> None:
+        while not stop.wait(0.005):
+            peak[0] = max(peak[0], _current_rss() or 0)
+
+    t = threading.Thread(target=sample, daemon=True)
+    t.start()
+    try:
+        yield out
+    finally:
+        stop.set()
+        t.join()
+        peak[0] = max(peak[0], _current_rss() or 0)
+        out["peak_rss_mb"] = round(peak[0] / (1024 * 1024), 1)
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+@dataclass
+class BenchResult:
+    case: str
+    target: str
+    images: int
+    megapixels: float
+    seconds: float
+    images_per_s: float
+    mp_per_s: float
+    p50_ms: float
+    p95_ms: float
+    peak_rss_mb: Optional[float]
+    variant: str = ""  # rótulo das opções do conversor (ex.: preset de esforço)
+    errors: int = 0
+    fallbacks: int = 0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def _summarize(case: str, target: str, latencies: List[float], megapixels: float, wall: float,
+               peak: Optional[float], *, variant: str = "", errors: int = 0, fallbacks: int = 0,
+               **extra: Any) -> BenchResult:
+    n = len(latencies)
+    return BenchResult(
+        case=case,
+        target=target,
+        images=n,
+        megapixels=round(megapixels, 3),
+        seconds=round(wall, 4),
+        images_per_s=round(n / wall, 2) if wall else 0.0,
+        mp_per_s=round(megapixels / wall, 2) if wall else 0.0,
+        p50_ms=round(_percentile(latencies, 50) * 1000, 2),
+        p95_ms=round(_percentile(latencies, 95) * 1000, 2),
+        peak_rss_mb=peak,
+        variant=variant,
+        errors=errors,
+        fallbacks=fallbacks,
+        extra=extra,
+    )
+
+
+def _ms(timings: Dict[str, float]) -> Dict[str, float]:
+    return {k: round(v * 1000, 2) for k, v in timings.items()}
+
+
+def bench_convert_one(
+    corpus: List[CorpusItem], target: str, work_root: Path, *, repeat: int = 1,
+    converter_factory: Callable[[], ImagesConverter] = ImagesConverter, case: str = "convert_one",
+    variant: str = "",
+) -> BenchResult:
+    """`convert_one` arquivo a arquivo (inclui a gravação da saída em disco)."""
+    conv = converter_factory()
+    out_dir = Path(tempfile.mkdtemp(dir=work_root))
+    latencies: List[float] = []
+    errors = fallbacks = out_bytes = 0
+    mp = 0.0
+    stages: Dict[str, float] = {}
+    try:
+        with peak_rss() as rss:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                for item in corpus:
+                    t0 = time.perf_counter()
+                    r = conv.convert_one(item.path, out_dir, target)
+                    latencies.append(time.perf_counter() - t0)
+                    mp += item.megapixels
+                    errors += not r.ok
+                    fallbacks += r.fallback_used
+                    for stage, secs in r.timings.items():
+                        stages[stage] = stages.get(stage, 0.0) + secs
+                    if r.ok and r.dst:
+                        out_bytes += r.dst.stat().st_size
+                        r.dst.unlink()
+            wall = time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return _summarize(
+        case, target, latencies, mp, wall, rss["peak_rss_mb"], variant=variant,
+        errors=errors, fallbacks=fallbacks, out_bytes=out_bytes, stages_ms=_ms(stages),
+    )
+
+
+def bench_batch(
+    corpus: List[CorpusItem], target: str, work_root: Path, *, workers: int = 1,
+    converter_factory: Callable[..., ImagesConverter] = ImagesConverter, variant: str = "",
+) -> BenchResult:
+    """`convert_batch_to_zip` no lote inteiro (inclui a montagem do ZIP)."""
+    conv = converter_factory(workers=workers)
+    work_dir = Path(tempfile.mkdtemp(dir=work_root))
+    mp = sum(i.megapixels for i in corpus)
+    try:
+        with peak_rss() as rss:
+            start = time.perf_counter()
+            batch = conv.convert_batch_to_zip([i.path for i in corpus], out_ext=target, work_dir=work_dir)
+            wall = time.perf_counter() - start
+        zip_bytes = batch.zip_path.stat().st_size if batch.zip_path else 0
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    # latência por arquivo não é observável de fora do lote: p50/p95 = média
+    per_file = [wall / len(corpus)] * len(corpus)
+    return _summarize(
+        "convert_batch_to_zip", target, per_file, mp, wall, rss["peak_rss_mb"], variant=variant,
+        errors=len(batch.errors), fallbacks=batch.fallback_count, workers=workers, zip_bytes=zip_bytes,
+        stages_ms=_ms(batch.timings),
+    )
+
+
+def _legacy_flatten(im: Image.Image, background_rgb: Tuple[int, int, int]) -> Image.Image:
+    """Achatamento como era feito antes de `_flatten_alpha` (referência do caso "flatten")."""
+    bg = Image.new("RGB", im.size, background_rgb)
+    im_rgba = im.convert("RGBA")
+    bg.paste(im_rgba, mask=im_rgba.split()[-1])
+    return bg
+
+
+def _flatten_source(kind: str, base: Image.Image) -> Image.Image:
+    alpha = Image.linear_gradient("L").rotate(90).resize(base.size)
+    if kind == "RGBA":
+        im = base.copy()
+        im.putalpha(alpha)
+    elif kind == "RGBA-opaco":
+        im = base.convert("RGBA")
+    elif kind == "LA":
+        im = base.convert("L")
+        im.putalpha(alpha)
+    else:  # P-transparente
+        im = base.convert("P", palette=Image.Palette.ADAPTIVE)
+        im.info["transparency"] = 0
+    return im
+
+
+def bench_flatten(sizes: Sequence[Tuple[int, int]], *, repeat: int = 1, seed: int = 1234) -> List[BenchResult]:
+    """
+    Só o achatamento de alpha, em memória (sem decode/encode): variante
+    "antes" (`_legacy_flatten`) e "atual" (`_flatten_alpha`), mesmas imagens.
+    """
+    results: List[BenchResult] = []
+    background = (255, 255, 255)
+    for kind in FLATTEN_SOURCES:
+        images = [_flatten_source(kind, _synthetic_rgb(size, random.Random(f"{seed}-{size}"))) for size in sizes]
+        mp = sum(im.width * im.height for im in images) / 1_000_000 * max(3, repeat)
+        for variant, flatten in (("antes", _legacy_flatten), ("atual", _flatten_alpha)):
+            latencies: List[float] = []
+            before = _current_rss()
+            with peak_rss() as rss:
+                start = time.perf_counter()
+                for _ in range(max(3, repeat)):  # poucas amostras deixam o p50 no ruído
+                    for im in images:
+                        t0 = time.perf_counter()
+                        out = flatten(im, background)
+                        latencies.append(time.perf_counter() - t0)
+                        del out
+                wall = time.perf_counter() - start
+            # pico acima do RSS de entrada ~ buffers extras de uma chamada
+            extra_mb = round(rss["peak_rss_mb"] - before / 2**20, 1) if before and rss["peak_rss_mb"] else None
+            results.append(_summarize(
+                "flatten", kind, latencies, mp, wall, rss["peak_rss_mb"], variant=variant, rss_delta_mb=extra_mb,
+            ))
+    return results
+
+
+# ------------------------------ Relatório ------------------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    *,
+    corpus_dir: Path,
+    sizes: Sequence[Tuple[int, int]] = DEFAULT_SIZES,
+    targets: Optional[Sequence[str]] = None,
+    repeat: int = 1,
+    workers: int = 1,
+    cases: Sequence[str] = CASES,
+    variants: Optional[Dict[str, Dict[str, Any]]] = None,
+    log: Callable[[str], None] = lambda msg: None,
+) -> Dict[str, Any]:
+    """
+    `variants` mapeia um rótulo para opções do ImagesConverter (ex.:
+    {"fast": {"encoder_preset": "fast"}}); cada variante roda todos os casos.
+    """
+    corpus = build_corpus(corpus_dir, sizes=sizes)
+    results: List[BenchResult] = []
+    if "flatten" in cases:  # não depende do conversor: roda uma vez, fora das variantes
+        for r in bench_flatten(sizes, repeat=repeat):
+            results.append(r)
+            log(_format_row(r))
+    for variant, options in (variants or {"": {}}).items():
+        factory = functools.partial(ImagesConverter, **options)
+        for target in targets or list(EXT_TO_PIL):
+            if "convert_one" in cases:
+                results.append(bench_convert_one(
+                    corpus, target, Path(corpus_dir), repeat=repeat, converter_factory=factory, variant=variant,
+                ))
+                log(_format_row(results[-1]))
+            if "convert_batch_to_zip" in cases:
+                results.append(bench_batch(
+                    corpus, target, Path(corpus_dir), workers=workers, converter_factory=factory, variant=variant,
+                ))
+                log(_format_row(results[-1]))
+    return report(results, corpus=corpus, repeat=repeat, variants=variants or {})
+
+
+def report(results: List[BenchResult], *, corpus: List[CorpusItem], **meta: Any) -> Dict[str, Any]:
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "corpus": [{"file": i.path.name, "mode": i.mode, "size": list(i.size)} for i in corpus],
+            **meta,
+        },
+        "results": [asdict(r) for r in results],
+    }
+
+
+def _format_row(r: BenchResult) -> str:
+    return (
+        f"{r.case:<22} {r.target:<6} {r.variant:<16} {r.images:>4} img  {r.images_per_s:>8.2f} img/s  "
+        f"{r.mp_per_s:>8.2f} MP/s  p50 {r.p50_ms:>8.1f} ms  p95 {r.p95_ms:>8.1f} ms  "
+        f"rss {r.peak_rss_mb or 0:>7.1f} MB"
+    )
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """Linhas com a variação de MP/s e p95 por (case, target, variant) entre dois relatórios."""
+    def key(r: Dict[str, Any]) -> Tuple[str, str, str]:
+        return r["case"], r["target"], r.get("variant", "")
+
+    before = {key(r): r for r in old.get("results", [])}
+    lines = []
+    for r in new.get("results", []):
+        o = before.get(key(r))
+        if not o or not o["mp_per_s"]:
+            continue
+        d_tp = (r["mp_per_s"] - o["mp_per_s"]) / o["mp_per_s"] * 100
+        d_p95 = ((r["p95_ms"] - o["p95_ms"]) / o["p95_ms"] * 100) if o["p95_ms"] else 0.0
+        lines.append(f"{r['case']:<22} {r['target']:<6} {r.get('variant', ''):<16} MP/s {d_tp:+7.1f}%   p95 {d_p95:+7.1f}%")
+    return lines
+
+
+def dump(data: Dict[str, Any], path: Path) -> None:
+    Path(path).write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
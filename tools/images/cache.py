@@ -0,0 +1,203 @@
+# tools/images/cache.py
+"""
+Cache em disco de resultados de conversão, endereçado por conteúdo.
+
+Chave = sha256(bytes da origem) + extensão de saída + todos os parâmetros do
+ImagesConverter que afetam os bytes gerados (+ versão do Pillow). Um acerto
+devolve a saída já codificada, sem abrir o Pillow.
+
+Cada entrada é um único arquivo <root>/<k[:2]>/<k>.bin:
+
+    4 bytes (big-endian) tamanho do cabeçalho | cabeçalho JSON | dados
+
+gravado em arquivo temporário + os.replace, então leitores em outros
+processos nunca veem uma entrada pela metade. O "LRU" usa o mtime: um acerto
+toca o arquivo (os.utime) e a remoção apaga os mais antigos primeiro.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import PIL
+
+_HEADER = struct.Struct(">I")
+_CHUNK = 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    data: bytes
+    meta: Dict[str, Any]
+
+
+def file_digest(path: Path) -> str:
+    """sha256 do arquivo, lido em blocos (não carrega tudo em memória)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache LRU limitado por tamanho, seguro entre processos.
+
+    `hits`/`misses` contam as consultas feitas com esta instância. Os
+    processos do pool recebem uma cópia; o lote devolve o que eles fizeram
+    (ConvertResult.cache_hit e bytes gravados) com `record_remote`.
+    """
+    def __init__(self, root: Path, *, max_bytes: int = 1024 * 1024 * 1024, lock_timeout: float = 30.0) -> None:
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.lock_timeout = lock_timeout
+        self.hits = 0
+        self.misses = 0
+        self._approx_bytes: Optional[int] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # enviado para processos do pool: a estimativa de tamanho vai junto,
+        # medida uma vez aqui, em vez de cada processo varrer o diretório
+        if self._approx_bytes is None:
+            self._approx_bytes = self._scan()[0]
+        return self.__dict__.copy()
+
+    def record_remote(self, hits: int, misses: int, stored_bytes: int = 0) -> None:
+        """Soma consultas e gravações feitas por outro processo com uma cópia deste cache."""
+        self.hits += hits
+        self.misses += misses
+        if stored_bytes and self._approx_bytes is not None:
+            self._approx_bytes += stored_bytes
+            if self._approx_bytes > self.max_bytes:
+                self.evict()
+
+    # ------------------------------ Chaves ------------------------------
+    @staticmethod
+    def key_for(digest: str, out_ext: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"src": digest, "ext": out_ext, "params": params, "pil": PIL.__version__},
+            sort_keys=True, default=list,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.bin"
+
+    # ------------------------------ Leitura / escrita ------------------------------
+    def get(self, key: str) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                (n,) = _HEADER.unpack(fh.read(_HEADER.size))
+                meta = json.loads(fh.read(n).decode("utf-8"))
+                data = fh.read()
+        except (OSError, ValueError, struct.error):
+            # inexistente, removida por outro processo ou corrompida
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return CacheEntry(data=data, meta=meta)
+
+    def put(self, key: str, data: bytes, meta: Dict[str, Any]) -> None:
+        path = self._path(key)
+        header = json.dumps(meta).encode("utf-8")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as fh:
+                fh.write(_HEADER.pack(len(header)))
+                fh.write(header)
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return  # cache é best-effort: falha de escrita não derruba a conversão
+
+        if self._approx_bytes is None:
+            self._approx_bytes = self._scan()[0]
+        else:
+            self._approx_bytes += _HEADER.size + len(header) + len(data)
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    # ------------------------------ Remoção ------------------------------
+    def _scan(self) -> Tuple[int, list]:
+        total, entries = 0, []
+        if not self.root.exists():
+            return 0, entries
+        for sub in self.root.iterdir():
+            if not sub.is_dir():
+                continue
+            for f in sub.iterdir():
+                if f.suffix != ".bin":
+                    continue
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                total += st.st_size
+                entries.append((st.st_mtime, st.st_size, f))
+        return total, entries
+
+    def _lock(self) -> Optional[Path]:
+        """Lock entre processos via arquivo criado com O_EXCL (portável)."""
+        lock = self.root / ".evict.lock"
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - lock.stat().st_mtime > self.lock_timeout:
+                    lock.unlink(missing_ok=True)  # dono morreu no meio da remoção
+            except OSError:
+                pass
+            return None
+        os.close(fd)
+        return lock
+
+    def evict(self, target_ratio: float = 0.9) -> int:
+        """
+        Remove as entradas menos usadas até ficar abaixo de
+        `target_ratio`×max_bytes. Só um processo remove por vez; os demais
+        seguem sem esperar. Retorna os bytes liberados.
+        """
+        lock = self._lock()
+        if lock is None:
+            return 0
+        freed = 0
+        try:
+            total, entries = self._scan()
+            limit = int(self.max_bytes * target_ratio)
+            for _, size, f in sorted(entries, key=lambda e: e[0]):
+                if total <= limit:
+                    break
+                try:
+                    f.unlink()
+                except OSError:
+                    continue
+                total -= size
+                freed += size
+            self._approx_bytes = total
+        finally:
+            lock.unlink(missing_ok=True)
+        return freed
+
+    def stats(self) -> Dict[str, int]:
+        total, entries = self._scan()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,14 +1,40 @@
 # tools/images/converter.py
 from __future__ import annotations
 
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Callable, Iterable, Optional, Tuple, Dict, Any, List
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterable, Iterator, Optional, Sequence, Sized, Tuple, Dict, Any, List, Union
 from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
 import zipfile
+import io
 import os
+import shutil
+import struct
+import importlib
+import logging
+import time
+import zlib
 
-from PIL import Image, ImageOps, UnidentifiedImageError
+from functools import lru_cache
+
+from PIL import Image, ImageChops, ImageOps, UnidentifiedImageError, features
+
+from . import strips
+from .admission import ImageCost, ImageProbe, MemoryBudget, cost_of, exif_orientation, probe
+from .cache import CacheEntry, ResultCache, file_digest
+
+if TYPE_CHECKING:
+    from .metrics import MetricsSink
+
+logger = logging.getLogger(__name__)
+
+# Falhas esperadas de decode/encode (arquivo truncado, quadro corrompido, modo
+# sem suporte no formato, zlib/struct de um PNG/BMP lido em faixas). Animação
+# e faixas caem para o caminho estático com elas; outra exceção é bug e sobe.
+_CODEC_ERRORS = (OSError, ValueError, EOFError, zlib.error, struct.error)
 
 # ---------------------------------------------------------------------
 # Extensões de saída suportadas -> Formato Pillow (apenas formatos com escrita estável)
@@ -35,6 +61,39 @@ EXT_TO_PIL: Dict[str, str] = {
     "cur": "CUR",
 }
 
+# Plugin do Pillow de cada formato de EXT_TO_PIL. Image.init() importa os
+# ~45 plugins que o Pillow tem (Image.open/save chamam init() sozinhos ao
+# encontrar um formato fora do preinit: BMP/GIF/JPEG/PPM/PNG); com estes já
+# registrados o init() não acontece para nenhum formato que o conversor grava.
+_PIL_PLUGINS: Dict[str, str] = {
+    "JPEG": "JpegImagePlugin", "PNG": "PngImagePlugin", "BMP": "BmpImagePlugin",
+    "GIF": "GifImagePlugin", "TIFF": "TiffImagePlugin", "WEBP": "WebPImagePlugin",
+    "ICO": "IcoImagePlugin", "PPM": "PpmImagePlugin", "PCX": "PcxImagePlugin",
+    "EPS": "EpsImagePlugin", "XBM": "XbmImagePlugin", "XPM": "XpmImagePlugin",
+    "TGA": "TgaImagePlugin", "SGI": "SgiImagePlugin", "IM": "ImImagePlugin",
+    "CUR": "CurImagePlugin",
+}
+
+@lru_cache(maxsize=None)
+def load_plugins() -> None:
+    """Registra só os plugins do Pillow dos formatos de EXT_TO_PIL (uma vez por processo)."""
+    for name in sorted(set(_PIL_PLUGINS[fmt] for fmt in EXT_TO_PIL.values())):
+        try:
+            importlib.import_module(f"PIL.{name}")
+        except ImportError:  # plugin cuja biblioteca nativa falta neste build
+            pass
+
+@lru_cache(maxsize=None)
+def pil_can_save(pil_fmt: Optional[str]) -> bool:
+    """Se o Pillow deste ambiente tem plugin de escrita para `pil_fmt` (ex.: XPM/CUR não têm)."""
+    load_plugins()
+    return bool(pil_fmt) and pil_fmt in Image.SAVE
+
+@lru_cache(maxsize=None)
+def pil_can_open(pil_fmt: Optional[str]) -> bool:
+    load_plugins()
+    return bool(pil_fmt) and pil_fmt in Image.OPEN
+
 ProgressCB = Callable[[int, str], None]  # (percent, label)
 RGB = Tuple[int, int, int]
 
@@ -46,6 +105,13 @@ class ConvertResult:
     dst_format: Optional[str]
     fallback_used: bool
     reason: Optional[str] = None
+    data: Optional[bytes] = None  # saída codificada (só em convert_one_to_bytes)
+    cache_hit: Optional[bool] = None  # None = cache desligado
+    src_format: Optional[str] = None  # formato detectado pelo Pillow na origem
+    timings: Dict[str, float] = field(default_factory=dict)  # etapa -> segundos (ver STAGES)
+    src_bytes: int = 0
+    out_bytes: int = 0
+    duplicate_of: Optional[Path] = None  # origem de mesmo conteúdo já convertida no lote
 
 @dataclass
 class BatchResult:
@@ -55,6 +121,78 @@ class BatchResult:
     fallback_count: int
     errors: List[ConvertResult]
     results: List[ConvertResult]
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # Soma das etapas de todos os arquivos (com workers > 1 passa do tempo de
+    # parede, que fica em "total") + "zip"
+    timings: Dict[str, float] = field(default_factory=dict)
+    src_bytes: int = 0
+    out_bytes: int = 0
+    zip_bytes: int = 0
+    # Origens repetidas no lote (mesmo conteúdo): saem da conversão da
+    # primeira, sem decodificar/codificar; o tempo que a original levou
+    # (todas as etapas, todos os alvos) conta uma vez por cópia
+    duplicates: int = 0
+    dedup_saved_seconds: float = 0.0
+
+# ------------------------------ Medição --------------------------------
+# Etapas medidas por arquivo, na ordem em que acontecem
+STAGES = ("cache", "decode", "transpose", "resize", "prepare", "encode", "write")
+
+class _Trace:
+    """Acumula o tempo de cada etapa de uma conversão."""
+    def __init__(self) -> None:
+        self.timings: Dict[str, float] = {}
+        self.src_format: Optional[str] = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - t0)
+
+def _duplicate_map(files: Sequence[Path], digests: Optional[Dict[str, str]] = None) -> Dict[int, int]:
+    """
+    Índice de cada arquivo repetido do lote -> índice da primeira ocorrência
+    do mesmo conteúdo. Só arquivos com tamanho igual ao de outro são
+    comparados; o sha256 vem de `digests` (nome -> hash, calculado no
+    upload) ou é lido aqui.
+    """
+    by_size: Dict[int, List[int]] = {}
+    for i, src in enumerate(files):
+        try:
+            by_size.setdefault(src.stat().st_size, []).append(i)
+        except OSError:
+            continue  # inexistente: o conversor reporta o erro
+    copies: Dict[int, int] = {}
+    for size, idxs in by_size.items():
+        if len(idxs) < 2:
+            continue
+        first: Dict[str, int] = {}
+        for i in idxs:
+            digest = (digests or {}).get(files[i].name)
+            if digest is None:
+                try:
+                    digest = file_digest(files[i])
+                except OSError:
+                    continue
+            if digest in first:
+                copies[i] = first[digest]
+            else:
+                first[digest] = i
+    return copies
+
+def _sum_timings(results: Iterable[ConvertResult]) -> Dict[str, float]:
+    total: Dict[str, float] = {}
+    for r in results:
+        for stage, secs in r.timings.items():
+            total[stage] = total.get(stage, 0.0) + secs
+    return total
 
 # ------------------------------ Helpers --------------------------------
 def _kebab(s: str) -> str:
@@ -76,26 +214,288 @@ def _limit_sizes_for_icon(base_w: int, base_h: int) -> list[tuple[int, int]]:
         sizes = [min(max(base_w, base_h), 256)]
     return [(s, s) for s in sizes]
 
+# Formatos que já saem comprimidos: deflate no ZIP só gasta CPU sem ganho
+_ZIP_STORED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+
+def _zip_compression_for(pil_fmt: Optional[str]) -> int:
+    return zipfile.ZIP_STORED if pil_fmt in _ZIP_STORED_FORMATS else zipfile.ZIP_DEFLATED
+
+def _ext_list(out_ext: Union[str, Sequence[str]]) -> List[str]:
+    """Extensão(ões) de saída normalizadas e sem repetição, na ordem pedida."""
+    items = [out_ext] if isinstance(out_ext, str) else list(out_ext)
+    return list(dict.fromkeys(str(e).lower().lstrip(".") for e in items))
+
+def ext_label(out_ext: Union[str, Sequence[str]]) -> str:
+    """Rótulo do(s) formato(s) de saída: "png" ou, com vários alvos, "png+webp"."""
+    return "+".join(_ext_list(out_ext))
+
+def zip_name_for(out_ext: Union[str, Sequence[str]]) -> str:
+    """Nome padrão do ZIP do lote."""
+    stamp = datetime.utcnow().isoformat().replace(":", "").replace(".", "")[:15]
+    exts = dict.fromkeys(ext if ext in EXT_TO_PIL else "png" for ext in _ext_list(out_ext))
+    return f"imagens-{'-'.join(exts) or 'png'}-converte-tudo-{stamp}.zip"
+
+class _ChunkSink:
+    """
+    Destino do zipfile para ZIP em streaming: sem tell/seek o zipfile grava
+    cada entrada com data descriptor (tamanhos depois dos dados), então nada
+    precisa ser reescrito. `drain()` devolve o que chegou desde a última vez.
+    """
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self.total = 0
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        self.total += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+# ---------------------------- Redimensionamento ---------------------------
+RESIZE_MODES = ("fit", "fill", "contain")
+RESAMPLE_FILTERS: Dict[str, int] = {
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "hamming": Image.Resampling.HAMMING,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+# Com reducing_gap o Pillow faz um reduce() inteiro (rápido) antes do filtro
+# final em reduções grandes; 2.0 é praticamente indistinguível do resize puro.
+_REDUCING_GAP = 2.0
+
+def _scaled_size(
+    w: int, h: int, box_w: Optional[int], box_h: Optional[int], mode: str,
+) -> Optional[Tuple[int, int]]:
+    """
+    Tamanho após a escala (sem crop/pad), ou None se não há o que reduzir.
+    Nunca amplia: o objetivo é encolher.
+    """
+    ratios = [r for r in ((box_w / w) if box_w else None, (box_h / h) if box_h else None) if r is not None]
+    if not ratios:
+        return None
+    # "fill" cobre a caixa (maior razão) e recorta; com um lado só vira "fit"
+    s = max(ratios) if mode == "fill" and len(ratios) == 2 else min(ratios)
+    s = min(s, 1.0)
+    if s >= 1.0:
+        return None
+    return max(1, round(w * s)), max(1, round(h * s))
+
+def _resize_for_box(
+    im: Image.Image,
+    *,
+    box_w: Optional[int],
+    box_h: Optional[int],
+    mode: str,
+    resample: str,
+    background_rgb: RGB,
+) -> Image.Image:
+    """
+    fit:     cabe na caixa mantendo a proporção
+    fill:    cobre a caixa e recorta o centro (tamanho exato da caixa)
+    contain: cabe na caixa e completa com fundo até o tamanho exato
+             (transparente se a imagem tiver alpha; senão background_rgb)
+    """
+    if im.mode in ("P", "1"):
+        # resize em P/1 cai para NEAREST; converte antes para filtrar de verdade
+        has_alpha = "transparency" in im.info
+        im = im.convert("RGBA" if has_alpha else ("L" if im.mode == "1" else "RGB"))
+
+    new_size = _scaled_size(im.width, im.height, box_w, box_h, mode)
+    if new_size is not None:
+        im = im.resize(new_size, RESAMPLE_FILTERS.get(resample, Image.Resampling.LANCZOS), reducing_gap=_REDUCING_GAP)
+
+    if mode == "fill" and box_w and box_h and (im.width > box_w or im.height > box_h):
+        cw, ch = min(box_w, im.width), min(box_h, im.height)
+        left, top = (im.width - cw) // 2, (im.height - ch) // 2
+        im = im.crop((left, top, left + cw, top + ch))
+
+    elif mode == "contain" and box_w and box_h and (im.width, im.height) != (box_w, box_h):
+        has_alpha = "A" in im.getbands()
+        color: Any = (0, 0, 0, 0) if has_alpha else background_rgb
+        if im.mode == "L":
+            color = background_rgb[0]
+        elif im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if has_alpha else "RGB")
+        canvas = Image.new(im.mode, (box_w, box_h), color)
+        canvas.paste(im, ((box_w - im.width) // 2, (box_h - im.height) // 2))
+        canvas.info = im.info
+        im = canvas
+
+    return im
+
+# ---------------------- Decodificação reduzida -------------------
+# Formatos cuja saída tem lado máximo fixo (ICO/CUR: até 256px, ver _limit_sizes_for_icon)
+_MAX_SIDE_FOR_FORMAT: Dict[str, int] = {"ICO": 256, "CUR": 256}
+
+# Modos aceitos por Image.reduce (P/1/I;16 etc. seguem o caminho normal)
+_REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr"}
+
+def _reduce_factor(size: Tuple[int, int], min_size: Optional[Tuple[int, int]]) -> int:
+    if not min_size:
+        return 1
+    return min(size[0] // max(1, min_size[0]), size[1] // max(1, min_size[1]))
+
+def _decode_reduced(im: Image.Image, min_size: Optional[Tuple[int, int]]) -> Tuple[Image.Image, bool]:
+    """
+    Evita decodificar a resolução total quando a saída será bem menor.
+
+    `min_size` é o menor tamanho (w, h) que a imagem decodificada ainda
+    precisa ter; as duas dimensões nunca ficam abaixo dele.
+
+    JPEG: `draft()` faz o libjpeg decodificar direto em 1/2, 1/4 ou 1/8 da
+    escala (DCT reduzida) — menos tempo e memória de pico. Demais formatos:
+    `reduce()` por fator inteiro logo após o decode, antes de exif_transpose
+    e das conversões de modo, que passam a copiar uma imagem menor.
+    """
+    factor = _reduce_factor(im.size, min_size)
+    if factor < 2:
+        return im, False
+
+    if im.format == "JPEG":
+        before = im.size
+        im.draft(im.mode, min_size)
+        return im, im.size != before
+
+    if im.mode not in _REDUCIBLE_MODES:
+        return im, False
+    reduced = im.reduce(factor)
+    reduced.info = dict(im.info)  # preserva exif/icc para o save
+    return reduced, True
+
+def _reduced_size(fmt: str, mode: str, size: Tuple[int, int], min_size: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    Tamanho que `_decode_reduced` vai produzir, só pelo cabeçalho (None =
+    resolução total). Alimenta a estimativa de memória (ImagesConverter.cost).
+    """
+    factor = _reduce_factor(size, min_size)
+    if factor < 2:
+        return None
+    if fmt == "JPEG":
+        # escalas do DCT reduzido, como em JpegImageFile.draft
+        factor = next(s for s in (8, 4, 2) if factor >= s)
+    elif mode not in _REDUCIBLE_MODES:
+        return None
+    return (-(-size[0] // factor), -(-size[1] // factor))
+
+# ------------------------- Quantização (GIF/XPM) -------------------------
+# Backends do Pillow para reduzir a 256 cores. libimagequant depende de como
+# o Pillow foi compilado; sem ela cai para fastoctree. Modos RGBA passam pela
+# paleta como RGB (a transparência vira um índice reservado).
+#
+# median cut é o padrão (a paleta de sempre). fastoctree e libimagequant são
+# opcionais (IMAGES_QUANTIZER ou o formulário): no images_bench (--targets gif
+# --quantizers) o fastoctree foi o mais rápido, com paletas um pouco
+# diferentes. A amostra da paleta só compensa no median cut (custo
+# proporcional aos pixels) e perde um pouco de PSNR, então fica opcional.
+QUANTIZERS: Dict[str, Image.Quantize] = {
+    "mediancut": Image.Quantize.MEDIANCUT,
+    "fastoctree": Image.Quantize.FASTOCTREE,
+    "libimagequant": Image.Quantize.LIBIMAGEQUANT,
+}
+DEFAULT_QUANTIZER = "mediancut"
+# Lado máximo da cópia reduzida em que a paleta é calculada antes de ser
+# aplicada na resolução total (None = paleta da imagem inteira)
+DEFAULT_PALETTE_SAMPLE_SIDE: Optional[int] = None
+# Índice da paleta reservado para pixels transparentes no GIF
+_GIF_TRANSPARENT_INDEX = 255
+
+@lru_cache(maxsize=None)
+def _has_libimagequant() -> bool:
+    return bool(features.check_feature("libimagequant"))
+
+def _quantize_method(quantizer: str) -> Image.Quantize:
+    if quantizer == "libimagequant" and not _has_libimagequant():
+        quantizer = "fastoctree"
+    # MEDIANCUT vale 0: `get(...) or padrão` trocaria o median cut pelo padrão
+    return QUANTIZERS.get(quantizer, QUANTIZERS[DEFAULT_QUANTIZER])
+
+def _build_palette(
+    im: Image.Image,
+    *,
+    colors: int = 256,
+    quantizer: str = DEFAULT_QUANTIZER,
+    sample_side: Optional[int] = DEFAULT_PALETTE_SAMPLE_SIDE,
+) -> Image.Image:
+    """Imagem "P" cuja paleta representa `im` (calculada numa cópia reduzida)."""
+    rgb = im if im.mode == "RGB" else im.convert("RGB")
+    if sample_side and max(rgb.size) > sample_side:
+        rgb = rgb.reduce(-(-max(rgb.size) // sample_side))
+    return rgb.quantize(colors, method=_quantize_method(quantizer))
+
+def _quantize(
+    im: Image.Image,
+    *,
+    quantizer: str = DEFAULT_QUANTIZER,
+    dither: bool = False,
+    sample_side: Optional[int] = DEFAULT_PALETTE_SAMPLE_SIDE,
+    transparent_index: Optional[int] = None,
+) -> Image.Image:
+    """
+    Converte `im` para "P". Com `transparent_index`, pixels com alpha < 128
+    recebem esse índice (que fica fora da paleta) e ele vai em
+    info["transparency"].
+    """
+    colors = 256 if transparent_index is None else 255
+    rgb = im.convert("RGB") if im.mode != "RGB" else im
+    sampled = bool(sample_side) and max(rgb.size) > sample_side
+    if sampled or dither:
+        palette = _build_palette(rgb, colors=colors, quantizer=quantizer, sample_side=sample_side)
+        out = rgb.quantize(palette=palette, dither=Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE)
+    else:
+        # paleta da imagem inteira e sem dithering: o próprio quantize já mapeia
+        out = rgb.quantize(colors, method=_quantize_method(quantizer))
+    if transparent_index is not None and "A" in im.getbands():
+        out.paste(transparent_index, mask=im.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+        out.info["transparency"] = transparent_index
+    return out
+
 # ---------------------- Preparo de imagem por formato -------------------
+# Achatamento de alpha (JPEG/BMP/PCX). Antes: fundo novo + convert("RGBA")
+# (cópia mesmo se já era RGBA) + split() (4 canais) + paste = até 4 buffers
+# do tamanho da imagem. Agora só o canal alpha (1 byte/pixel) e o fundo; com
+# alpha todo 255 nem o fundo: só troca o modo. Mesmos pixels (medir com
+# manage.py images_bench --cases flatten).
+def _flatten_alpha(im: Image.Image, background_rgb: RGB) -> Image.Image:
+    """RGB com `im` composto sobre `background_rgb`."""
+    if im.mode not in ("RGBA", "LA"):
+        im = im.convert("RGBA")  # P/L/RGB com "transparency"
+    alpha = im.getchannel("A")
+    if alpha.getextrema()[0] == 255:
+        return im.convert("RGB")  # totalmente opaca: o fundo não aparece
+    bg = Image.new("RGB", im.size, background_rgb)
+    bg.paste(im, mask=alpha)  # RGBA/LA sobre RGB: o paste não converte a origem
+    return bg
+
+
 def _prepare_image_for_format(
     im: Image.Image,
     pil_fmt: str,
     *,
     background_rgb: RGB,
     requested_ext: str | None = None,  # para PPM/PGM/PBM
+    quantizer: str = DEFAULT_QUANTIZER,
+    dither: bool = False,
+    palette_sample_side: Optional[int] = DEFAULT_PALETTE_SAMPLE_SIDE,
 ) -> Image.Image:
     """
     Ajusta modo/canais e trata alpha conforme o formato de destino.
+    `quantizer`/`dither`/`palette_sample_side` valem para as saídas com paleta.
     """
     has_alpha = ("A" in im.getbands()) or ("transparency" in im.info)
 
     if pil_fmt == "JPEG":
         # JPEG não suporta alpha
         if has_alpha:
-            bg = Image.new("RGB", im.size, background_rgb)
-            im_rgba = im.convert("RGBA")
-            bg.paste(im_rgba, mask=im_rgba.split()[-1])
-            im = bg
+            im = _flatten_alpha(im, background_rgb)
         elif im.mode not in ("RGB", "L"):
             im = im.convert("RGB")
 
@@ -111,11 +511,14 @@ def _prepare_image_for_format(
 
     elif pil_fmt == "GIF":
         # GIF: paleta até 256 cores; pode ter transparência 1-bit
+        # (P e L já cabem no GIF sem perda)
         if im.mode not in ("P", "L"):
-            # se tem alpha, comece em RGBA → Pillow tratará ao quantizar
-            im = im.convert("RGBA" if has_alpha else "RGB")
-        # quantize ajuda a reduzir cores para GIF
-        im = im.convert("P", palette=Image.ADAPTIVE)
+            if has_alpha and im.mode != "RGBA":
+                im = im.convert("RGBA")
+            im = _quantize(
+                im, quantizer=quantizer, dither=dither, sample_side=palette_sample_side,
+                transparent_index=_GIF_TRANSPARENT_INDEX if has_alpha else None,
+            )
 
     elif pil_fmt == "TIFF":
         # TIFF aceita RGB/RGBA/L; evite CMYK por padrão (a não ser que deseje manter)
@@ -125,10 +528,7 @@ def _prepare_image_for_format(
     elif pil_fmt == "BMP":
         # BMP não suporta alpha: achatar
         if has_alpha:
-            bg = Image.new("RGB", im.size, background_rgb)
-            im_rgba = im.convert("RGBA")
-            bg.paste(im_rgba, mask=im_rgba.split()[-1])
-            im = bg
+            im = _flatten_alpha(im, background_rgb)
         elif im.mode not in ("RGB", "L"):
             im = im.convert("RGB")
 
@@ -157,10 +557,7 @@ def _prepare_image_for_format(
     elif pil_fmt == "PCX":
         # PCX não tem alpha; converta para RGB/L
         if has_alpha:
-            bg = Image.new("RGB", im.size, background_rgb)
-            im_rgba = im.convert("RGBA")
-            bg.paste(im_rgba, mask=im_rgba.split()[-1])
-            im = bg
+            im = _flatten_alpha(im, background_rgb)
         elif im.mode not in ("RGB", "L"):
             im = im.convert("RGB")
 
@@ -178,8 +575,7 @@ def _prepare_image_for_format(
     elif pil_fmt == "XPM":
         # XPM é paletizado
         if im.mode not in ("P", "L"):
-            im = im.convert("RGB")
-        im = im.convert("P", palette=Image.ADAPTIVE)
+            im = _quantize(im, quantizer=quantizer, dither=dither, sample_side=palette_sample_side)
 
     elif pil_fmt == "TGA":
         # TGA suporta alpha
@@ -199,15 +595,45 @@ def _prepare_image_for_format(
     else:
         # fallback seguro genérico
         if has_alpha:
-            im = im.convert("RGBA")
+            if im.mode != "RGBA":
+                im = im.convert("RGBA")
         elif im.mode not in ("RGB", "L", "1"):
             im = im.convert("RGB")
 
     return im
 
-def _save_with_params(
+# ------------------------- Presets de esforço do encoder -------------------
+# Troca tempo de codificação por tamanho. Só mexe em parâmetros sem perda:
+# qualidade (JPEG/WEBP) continua a do usuário, então os pixels são os mesmos
+# entre presets (exceto WEBP: `method` também muda a busca do encoder lossy).
+# São padrões: png_compress_level/optimize explícitos do usuário prevalecem.
+# JPEG e GIF quase não variam: o progressivo já otimiza o Huffman e o GIF
+# gasta o tempo na quantização. Comparar com manage.py images_bench --presets.
+ENCODER_PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "fast": {
+        "JPEG": {"optimize": False},
+        "PNG": {"optimize": False, "compress_level": 1},
+        "WEBP": {"method": 0},
+        "GIF": {"optimize": False},
+    },
+    "balanced": {
+        "JPEG": {"optimize": True},
+        "PNG": {"optimize": False, "compress_level": 6},  # padrão do zlib
+        "WEBP": {"method": 4},       # padrão do libwebp
+        "GIF": {"optimize": True},
+    },
+    # o máximo de cada encoder (padrão, como era antes dos presets)
+    "max-compression": {
+        "JPEG": {"optimize": True},
+        "PNG": {"optimize": True, "compress_level": 9},  # optimize já força o 9
+        "WEBP": {"method": 6},
+        "GIF": {"optimize": True},
+    },
+}
+DEFAULT_ENCODER_PRESET = "max-compression"
+
+def _encoder_kwargs(
     im: Image.Image,
-    dst_path: Path,
     pil_fmt: str,
     *,
     exif_bytes: Optional[bytes],
@@ -215,16 +641,17 @@ def _save_with_params(
     jpeg_quality: int,
     jpeg_progressive: bool,
     webp_quality: int,
-    png_compress_level: int,
+    png_compress_level: Optional[int],
     tiff_compression: Optional[str],
     requested_ext: str | None = None,
-) -> None:
+    encoder_preset: str = DEFAULT_ENCODER_PRESET,
+    optimize: Optional[bool] = None,
+) -> Dict[str, Any]:
     kwargs: Dict[str, Any] = {}
 
     if pil_fmt == "JPEG":
         kwargs.update(
             quality=jpeg_quality,
-            optimize=True,
             progressive=jpeg_progressive,
             subsampling="4:2:0",
         )
@@ -232,25 +659,20 @@ def _save_with_params(
         if icc_profile: kwargs["icc_profile"] = icc_profile
 
     elif pil_fmt == "PNG":
-        kwargs.update(
-            optimize=True,
-            compress_level=max(0, min(9, int(png_compress_level))),
-        )
+        if png_compress_level is not None:
+            kwargs["compress_level"] = max(0, min(9, int(png_compress_level)))
         if icc_profile: kwargs["icc_profile"] = icc_profile
 
     elif pil_fmt == "WEBP":
         kwargs.update(
             quality=webp_quality,
-            method=6,
         )
         if icc_profile: kwargs["icc_profile"] = icc_profile
 
     elif pil_fmt == "GIF":
-        kwargs.update(
-            optimize=True,
-            save_all=False,  # não estamos tratando animações aqui
-            # transparency: Pillow tenta inferir; manter simples
-        )
+        # transparency: Pillow tenta inferir; manter simples
+        # (animações não passam por aqui: ver _save_animation)
+        pass
 
     elif pil_fmt == "TIFF":
         if tiff_compression:
@@ -279,14 +701,302 @@ def _save_with_params(
         # Sem opções especiais aqui
         pass
 
-    im.save(dst_path, pil_fmt, **kwargs)
+    # optimize/method/compress_level não informados vêm do preset de esforço
+    preset = ENCODER_PRESETS.get(encoder_preset) or ENCODER_PRESETS[DEFAULT_ENCODER_PRESET]
+    defaults = preset.get(pil_fmt, {})
+    if optimize is not None and "optimize" in defaults:
+        kwargs["optimize"] = bool(optimize)
+    for key, value in defaults.items():
+        kwargs.setdefault(key, value)
+    return kwargs
+
+def _save_with_params(
+    im: Image.Image,
+    dst_path: Union[Path, BinaryIO],
+    pil_fmt: str,
+    **params: Any,
+) -> None:
+    im.save(dst_path, pil_fmt, **_encoder_kwargs(im, pil_fmt, **params))
+
+# ------------------------------ Animações --------------------------------
+# Saídas que gravamos com todos os quadros (PNG animado = APNG). Para os
+# demais formatos uma origem animada vira o primeiro quadro, como antes.
+#
+# Os quadros passam um de cada vez (decode → transpose → resize → modo →
+# encode): a memória fica proporcional a um quadro (dois no APNG/GIF, que
+# comparam com o anterior), não à animação inteira. Por isso GIF e APNG não
+# usam o save_all do Pillow, que junta todos os quadros numa lista antes de
+# gravar: cada quadro é codificado sozinho pelo encoder normal e os blocos
+# são remontados aqui. WEBP usa o WebPAnimEncoder do Pillow (só guarda os
+# quadros já comprimidos) e TIFF grava uma página por vez.
+ANIMATED_FORMATS = {"GIF", "PNG", "WEBP", "TIFF"}
+
+# Amostra para a paleta comum do GIF: até N quadros, reduzidos a este lado
+_PALETTE_SAMPLE_FRAMES = 64
+_PALETTE_SAMPLE_SIDE = 96
+
+Frame = Tuple[Image.Image, int]  # (quadro pronto, duração em ms)
+
+def _is_animated(im: Image.Image) -> bool:
+    try:
+        return getattr(im, "n_frames", 1) > 1  # GIF: percorre o arquivo para contar
+    except Exception:
+        return False  # arquivo truncado: segue como imagem estática (1º quadro)
+
+def _shared_palette(im: Image.Image, n_frames: int, *, transparent: bool, quantizer: str) -> Image.Image:
+    """
+    Paleta única para todos os quadros do GIF, quantizada de uma colagem de
+    miniaturas de quadros amostrados (em vez de um ADAPTIVE por quadro, que
+    faz as cores "piscarem" entre quadros e repete a tabela em cada um).
+    """
+    step = max(1, -(-n_frames // _PALETTE_SAMPLE_FRAMES))
+    thumbs: List[Image.Image] = []
+    for i in range(0, n_frames, step):
+        im.seek(i)
+        thumb = im.convert("RGB")
+        thumb.thumbnail((_PALETTE_SAMPLE_SIDE, _PALETTE_SAMPLE_SIDE), Image.Resampling.BOX)
+        thumbs.append(thumb)
+    im.seek(0)
+    montage = Image.new("RGB", (max(t.width for t in thumbs), sum(t.height for t in thumbs)))
+    y = 0
+    for t in thumbs:
+        montage.paste(t, (0, y))
+        y += t.height
+    # com transparência o índice 255 fica reservado
+    return _build_palette(montage, colors=255 if transparent else 256, quantizer=quantizer, sample_side=None)
+
+def _gif_image_block(data: bytes) -> bytes:
+    """Descritor + dados LZW do único quadro de um GIF gravado pelo Pillow (sem cabeçalho/extensões)."""
+    flags = data[10]
+    pos = 13 + ((3 << ((flags & 7) + 1)) if flags & 0x80 else 0)
+    while data[pos] == 0x21:  # extensões: a nossa GCE é escrita à parte
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    if data[pos] != 0x2C or data[-1] != 0x3B:
+        raise ValueError("GIF inesperado do encoder")
+    return data[pos:-1]
+
+def _write_gif_animation(
+    fp: BinaryIO,
+    frames: Iterable[Frame],
+    *,
+    palette: Image.Image,
+    transparent: bool,
+    loop: Optional[int],
+    dither: bool,
+) -> None:
+    mapping = Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE
+    pal = (palette.getpalette() or [])[: 256 * 3]
+    pal += [0] * (256 * 3 - len(pal))
+
+    prev: Optional[Image.Image] = None
+    for n, (frame, duration) in enumerate(frames):
+        size = frame.size
+        if n == 0:  # o tamanho final (após resize) só é conhecido no primeiro quadro
+            fp.write(b"GIF89a" + struct.pack("<HHBBB", size[0], size[1], 0xF7, 0, 0) + bytes(pal))
+            if loop is not None:
+                fp.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+        rgb = frame.convert("RGB")
+        box = (0, 0) + size
+        if transparent:
+            # sem "copiar por cima" no GIF: quadro inteiro, e o anterior é
+            # apagado (disposal 2) para a transparência não mostrar o que havia
+            q = rgb.quantize(palette=palette, dither=mapping)
+            q.paste(_GIF_TRANSPARENT_INDEX, mask=frame.getchannel("A").point(lambda a: 255 if a < 128 else 0))
+            disposal = 2
+        else:
+            # opaco: só o retângulo que mudou na origem, sobre o quadro anterior
+            # (disposal 1). A comparação é antes do dithering, cujo ruído faria
+            # o retângulo cobrir o quadro quase todo.
+            if prev is not None:
+                box = ImageChops.difference(prev, rgb).getbbox() or (0, 0, 1, 1)
+            q = rgb.crop(box).quantize(palette=palette, dither=mapping)
+            prev = rgb
+            disposal = 1
+        buf = io.BytesIO()
+        q.save(buf, "GIF", optimize=False)
+        block = bytearray(_gif_image_block(buf.getvalue()))
+        block[1:5] = struct.pack("<HH", box[0], box[1])
+        fp.write(
+            b"!\xf9\x04"
+            + bytes([(disposal << 2) | int(transparent)])
+            + struct.pack("<H", max(0, round(duration / 10)))
+            + bytes([_GIF_TRANSPARENT_INDEX if transparent else 0, 0])
+        )
+        fp.write(bytes(block))
+    fp.write(b";")
+
+def _png_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    pos = 8
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos:pos + 4])
+        yield data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+def _png_chunk(ctype: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + ctype + body + struct.pack(">I", zlib.crc32(ctype + body))
+
+def _write_apng(
+    fp: BinaryIO,
+    frames: Iterable[Frame],
+    *,
+    n_frames: int,
+    loop: Optional[int],
+    kwargs: Dict[str, Any],
+) -> None:
+    seq = 0
+    prev: Optional[Image.Image] = None
+    for frame, duration in frames:
+        box = (0, 0) + frame.size
+        if prev is not None:
+            # blend_op SOURCE substitui o retângulo (inclusive alpha): basta o que mudou
+            box = ImageChops.difference(prev, frame).getbbox(alpha_only=False) or (0, 0, 1, 1)
+        buf = io.BytesIO()
+        (frame if prev is None else frame.crop(box)).save(buf, "PNG", **kwargs)
+        chunks = list(_png_chunks(buf.getvalue()))
+        if prev is None:
+            fp.write(b"\x89PNG\r\n\x1a\n")
+            for ctype, body in chunks:
+                if ctype == b"IDAT":
+                    break
+                fp.write(_png_chunk(ctype, body))
+                if ctype == b"IHDR":
+                    fp.write(_png_chunk(b"acTL", struct.pack(">II", n_frames, 1 if loop is None else loop)))
+        fp.write(_png_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", seq, box[2] - box[0], box[3] - box[1], box[0], box[1],
+            min(0xFFFF, max(0, int(duration))), 1000, 0, 0,  # dispose NONE, blend SOURCE
+        )))
+        seq += 1
+        for ctype, body in chunks:
+            if ctype != b"IDAT":
+                continue
+            if prev is None:
+                fp.write(_png_chunk(b"IDAT", body))
+            else:
+                fp.write(_png_chunk(b"fdAT", struct.pack(">I", seq) + body))
+                seq += 1
+        prev = frame
+    fp.write(_png_chunk(b"IEND", b""))
+
+class _LazyFrames:
+    """
+    Quadros 2..N para o `append_images` do WEBP: o Pillow chama seek(i) e lê
+    o quadro atual, então cada seek puxa o próximo do iterador (um por vez).
+    As durações entram em `durations` antes de o encoder consultá-las.
+    """
+    def __init__(self, frames: Iterator[Frame], n_frames: int, durations: List[int]) -> None:
+        self._frames = frames
+        self._frame: Optional[Image.Image] = None
+        self._durations = durations
+        self.n_frames = n_frames
+
+    def seek(self, idx: int) -> None:
+        self._frame, duration = next(self._frames)
+        self._durations.append(duration)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._frame, name)
+
+def _save_animation(
+    frames: Callable[[], Iterator[Frame]],
+    dst: Union[Path, BinaryIO],
+    pil_fmt: str,
+    *,
+    source: Image.Image,
+    n_frames: int,
+    transparent: bool,
+    loop: Optional[int],
+    kwargs: Dict[str, Any],
+    quantizer: str = DEFAULT_QUANTIZER,
+    dither: bool = False,
+) -> None:
+    """Grava todos os quadros de `frames()` (quadros já no modo final) em `dst`."""
+    if isinstance(dst, Path):
+        with open(dst, "w+b") as fh:  # w+: o AppendingTiffWriter relê o que gravou
+            return _save_animation(
+                frames, fh, pil_fmt, source=source, n_frames=n_frames,
+                transparent=transparent, loop=loop, kwargs=kwargs, quantizer=quantizer, dither=dither,
+            )
+
+    if pil_fmt == "GIF":
+        palette = _shared_palette(source, n_frames, transparent=transparent, quantizer=quantizer)
+        _write_gif_animation(dst, frames(), palette=palette, transparent=transparent, loop=loop, dither=dither)
+
+    elif pil_fmt == "PNG":
+        kwargs = {k: v for k, v in kwargs.items() if k in ("compress_level", "optimize", "icc_profile")}
+        _write_apng(dst, frames(), n_frames=n_frames, loop=loop, kwargs=kwargs)
+
+    elif pil_fmt == "WEBP":
+        it = frames()
+        first, duration = next(it)
+        durations = [duration]
+        first.save(
+            dst, "WEBP", save_all=True,
+            append_images=[_LazyFrames(it, n_frames - 1, durations)],
+            duration=durations, loop=1 if loop is None else loop, background=(0, 0, 0, 0),
+            **kwargs,
+        )
+
+    elif pil_fmt == "TIFF":
+        from PIL import TiffImagePlugin
+
+        with TiffImagePlugin.AppendingTiffWriter(dst, new=True) as tf:
+            for frame, _ in frames():
+                frame.save(tf, "TIFF", **kwargs)
+                tf.newFrame()
+
+    else:
+        raise ValueError(f"Formato sem suporte a animação: {pil_fmt}")
 
 # ------------------------------ Conversor --------------------------------
+# A partir deste nº de pixels (sem redimensionar, sem rotação EXIF) a
+# conversão é feita em faixas quando origem e alvo permitem (ver strips).
+DEFAULT_STRIP_MIN_PIXELS = 32_000_000
+
 class ImagesConverter:
     """
     Converte N arquivos para um formato alvo, com fallback PNG apenas se o
     Pillow (neste ambiente) não suportar a gravação do formato escolhido.
+
+    `workers` > 1 ativa o modo paralelo de `convert_batch_to_zip` (pool de
+    processos: decode/transform/encode de arquivos distintos em paralelo).
+    `max_width`/`max_height` ativam o redimensionamento (`resize_mode`:
+    fit/fill/contain; `resample`: filtro do Pillow), feito antes do preparo
+    por formato. `encoder_preset` (ver ENCODER_PRESETS) escolhe entre
+    velocidade e tamanho na codificação; `png_compress_level` e `optimize`,
+    quando informados, valem sobre ele. `quantizer`, `dither` e
+    `palette_sample_side` controlam a redução a 256 cores (GIF/XPM, ver
+    QUANTIZERS). Com `cache`, resultados já gerados para a mesma origem +
+    parâmetros são reaproveitados sem passar pelo Pillow. Imagens com
+    `strip_min_pixels` ou mais são lidas e gravadas em faixas quando
+    possível (ver `streams`); os pixels de saída são os mesmos.
+
+    Os métodos de lote aceitam uma lista de extensões em `out_ext`: cada
+    origem é decodificada, orientada e redimensionada uma vez e depois
+    preparada/codificada para cada alvo, tudo no mesmo ZIP.
     """
+
+    # Parâmetros que alteram os bytes de saída (entram na chave do cache).
+    # brand_tag/name_style só mudam o nome, que é recalculado a cada uso.
+    _OUTPUT_PARAMS = (
+        "background_rgb",
+        "jpeg_quality",
+        "webp_quality",
+        "jpeg_progressive",
+        "png_compress_level",
+        "optimize",
+        "tiff_compression",
+        "max_width",
+        "max_height",
+        "resize_mode",
+        "resample",
+        "encoder_preset",
+        "quantizer",
+        "dither",
+        "palette_sample_side",
+    )
     def __init__(
         self,
         *,
@@ -297,8 +1007,20 @@ class ImagesConverter:
         jpeg_quality: int = 85,
         webp_quality: int = 85,
         jpeg_progressive: bool = True,
-        png_compress_level: int = 6,
+        png_compress_level: Optional[int] = None,
+        optimize: Optional[bool] = None,
         tiff_compression: Optional[str] = None,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        resize_mode: str = "fit",
+        resample: str = "lanczos",
+        encoder_preset: str = DEFAULT_ENCODER_PRESET,
+        quantizer: str = DEFAULT_QUANTIZER,
+        dither: bool = False,
+        palette_sample_side: Optional[int] = DEFAULT_PALETTE_SAMPLE_SIDE,
+        workers: int = 1,
+        cache: Optional[ResultCache] = None,
+        strip_min_pixels: Optional[int] = DEFAULT_STRIP_MIN_PIXELS,
     ) -> None:
         self.brand_tag = brand_tag
         self.name_style = name_style
@@ -308,94 +1030,911 @@ class ImagesConverter:
         self.webp_quality = webp_quality
         self.jpeg_progressive = jpeg_progressive
         self.png_compress_level = png_compress_level
+        self.optimize = optimize
         self.tiff_compression = tiff_compression
+        # Redimensionamento opcional (antes do preparo por formato)
+        self.max_width = int(max_width) if max_width else None
+        self.max_height = int(max_height) if max_height else None
+        self.resize_mode = resize_mode if resize_mode in RESIZE_MODES else "fit"
+        self.resample = resample if resample in RESAMPLE_FILTERS else "lanczos"
+        self.encoder_preset = encoder_preset if encoder_preset in ENCODER_PRESETS else DEFAULT_ENCODER_PRESET
+        self.quantizer = quantizer if quantizer in QUANTIZERS else DEFAULT_QUANTIZER
+        self.dither = bool(dither)
+        self.palette_sample_side = int(palette_sample_side) if palette_sample_side else None
+        # Nº de processos do lote (1 = sequencial, sem pool)
+        self.workers = max(1, int(workers or 1))
+        self.cache = cache
+        # Conversão em faixas (None/0 desliga); não muda os pixels, fica fora do cache
+        self.strip_min_pixels = int(strip_min_pixels) if strip_min_pixels else None
 
     def convert_one(self, src_path: Path, out_dir: Path, out_ext: str) -> ConvertResult:
-        out_ext_norm = out_ext.lower().lstrip(".")
-        pil_fmt = EXT_TO_PIL.get(out_ext_norm)
-        src = Path(src_path)
+        return self._convert(Path(src_path), [out_ext], out_dir=Path(out_dir))[0]
+
+    def convert_one_to_bytes(self, src_path: Path, out_ext: str) -> ConvertResult:
+        """
+        Igual a `convert_one`, mas codifica em memória: `dst` traz só o nome
+        de saída e `data` os bytes codificados (nada é gravado em disco).
+        """
+        return self._convert(Path(src_path), [out_ext], out_dir=None)[0]
+
+    def convert_many(self, src_path: Path, out_dir: Path, out_exts: Sequence[str]) -> List[ConvertResult]:
+        """Um resultado por extensão, na ordem de `out_exts`, decodificando a origem uma vez só."""
+        return self._convert(Path(src_path), _ext_list(out_exts), out_dir=Path(out_dir))
+
+    def convert_many_to_bytes(self, src_path: Path, out_exts: Sequence[str]) -> List[ConvertResult]:
+        """`convert_many` em memória (ver `convert_one_to_bytes`)."""
+        return self._convert(Path(src_path), _ext_list(out_exts), out_dir=None)
+
+    def _save_target(
+        self,
+        im: Optional[Image.Image],
+        pil_fmt: str,
+        dst_name: str,
+        out_dir: Optional[Path],
+        *,
+        exif_bytes: Optional[bytes],
+        icc_profile: Optional[bytes],
+        requested_ext: str,
+        keep_data: bool = False,
+        trace: Optional[_Trace] = None,
+        encode: Optional[Callable[[Union[Path, BinaryIO]], None]] = None,
+    ) -> Tuple[Path, Optional[bytes]]:
+        """
+        Grava em `out_dir` ou, se `out_dir` for None, só em memória. Com
+        `keep_data` os bytes codificados também são devolvidos (para o cache).
+        `encode` substitui a gravação de `im` (animações, faixas).
+        """
+        if encode is None:
+            params = self._encoder_params(exif_bytes, icc_profile, requested_ext)
+            encode = lambda dst: _save_with_params(im, dst, pil_fmt, **params)
+        trace = trace or _Trace()
+        if out_dir is None or keep_data:
+            buf = io.BytesIO()
+            with trace.stage("encode"):
+                encode(buf)
+            data = buf.getvalue()
+            if out_dir is None:
+                return Path(dst_name), data
+            dst_path = out_dir / dst_name
+            with trace.stage("write"):
+                dst_path.write_bytes(data)
+            return dst_path, data
+        dst_path = out_dir / dst_name
+        with trace.stage("encode"):  # codifica direto no arquivo: inclui a escrita
+            encode(dst_path)
+        return dst_path, None
+
+    def _encoder_params(self, exif_bytes: Optional[bytes], icc_profile: Optional[bytes], requested_ext: str) -> Dict[str, Any]:
+        return dict(
+            exif_bytes=exif_bytes, icc_profile=icc_profile,
+            jpeg_quality=self.jpeg_quality,
+            jpeg_progressive=self.jpeg_progressive,
+            webp_quality=self.webp_quality,
+            png_compress_level=self.png_compress_level,
+            tiff_compression=self.tiff_compression,
+            requested_ext=requested_ext,
+            encoder_preset=self.encoder_preset,
+            optimize=self.optimize,
+        )
+
+    @property
+    def resizes(self) -> bool:
+        return bool(self.max_width or self.max_height)
+
+    def _decode_min_size(self, pil_fmt: Optional[str], im: Image.Image) -> Optional[Tuple[int, int]]:
+        """
+        Menor resolução decodificada que ainda gera a mesma saída, se for
+        conhecida antes de decodificar (None = resolução total).
+        """
+        return self._min_size(pil_fmt, im.size, im.getexif().get(0x0112, 1))
+
+    def _min_size(self, pil_fmt: Optional[str], size: Tuple[int, int], orientation: int) -> Optional[Tuple[int, int]]:
+        if self.resizes:
+            w, h = size
+            box_w, box_h = self.max_width, self.max_height
+            if orientation in (5, 6, 7, 8):
+                # exif_transpose vai girar 90°: a caixa vale para a imagem já girada
+                box_w, box_h = box_h, box_w
+            target = _scaled_size(w, h, box_w, box_h, self.resize_mode)
+            if target is None:
+                return None
+            # mesma folga do Image.thumbnail: decodifica em >= 2x o tamanho final
+            return (int(target[0] * _REDUCING_GAP), int(target[1] * _REDUCING_GAP))
 
+        side = _MAX_SIDE_FOR_FORMAT.get(pil_fmt or "")
+        if side is None:
+            return None
+        # ICO/CUR geram quadrados até `side` e descartam os maiores que o lado menor
+        return (side, side)
+
+    def _decode_min_size_for(self, pil_fmts: Sequence[Optional[str]], im: Image.Image) -> Optional[Tuple[int, int]]:
+        """`_decode_min_size` que atende todos os alvos (o maior deles)."""
+        sizes = [self._decode_min_size(f, im) for f in pil_fmts]
+        if not sizes or any(s is None for s in sizes):
+            return None
+        return (max(s[0] for s in sizes), max(s[1] for s in sizes))
+
+    def _strips_apply(self, width: int, height: int, orientation: int) -> bool:
+        # redimensionar e girar precisam de linhas fora da faixa
+        return bool(self.strip_min_pixels) and width * height >= self.strip_min_pixels \
+            and not self.resizes and orientation == 1
+
+    def _strips_target(self, pil_fmt: Optional[str], out_ext_norm: str, has_exif: bool = False) -> bool:
+        # o caminho normal grava o EXIF no TIFF; o TIFF em faixas, não
+        if has_exif and pil_fmt == "TIFF":
+            return False
+        return strips.writable(pil_fmt, self.tiff_compression, out_ext_norm)
+
+    def streams(self, info: ImageProbe, out_ext: Union[str, Sequence[str], None] = None) -> bool:
+        """
+        Se a conversão de `info` sai em faixas para todos os alvos de
+        `out_ext` (pico de memória de uma faixa, ver admission.cost_of);
+        sem `out_ext`, só se a origem permite.
+        """
+        if not (info.ok and info.strips and info.frames == 1):
+            return False
+        if not self._strips_apply(info.width, info.height, info.orientation):
+            return False
+        return out_ext is None or all(self._strips_target(EXT_TO_PIL.get(e), e, info.has_exif) for e in _ext_list(out_ext))
+
+    def cost(self, info: ImageProbe, out_ext: Union[str, Sequence[str], None] = None) -> ImageCost:
+        """
+        `admission.cost_of` com as decisões da conversão para `out_ext`:
+        faixas (streams) e decodificação reduzida (_decode_reduced). Sem
+        `out_ext`, vale o melhor caso da origem.
+        """
+        if self.streams(info, out_ext):
+            return cost_of(info, streamed=True)
+        if not info.ok or info.animated:
+            return cost_of(info)
+        pil_fmts = [EXT_TO_PIL.get(e) for e in _ext_list(out_ext)] if out_ext is not None else [None]
+        sizes = [self._min_size(f, (info.width, info.height), info.orientation) for f in pil_fmts]
+        if any(s is None for s in sizes):
+            return cost_of(info)
+        min_size = (max(s[0] for s in sizes), max(s[1] for s in sizes))  # type: ignore[index]
+        return cost_of(info, reduced_to=_reduced_size(info.format, info.mode, (info.width, info.height), min_size))
+
+    def _resize(self, im: Image.Image) -> Image.Image:
+        if not self.resizes:
+            return im
+        return _resize_for_box(
+            im,
+            box_w=self.max_width,
+            box_h=self.max_height,
+            mode=self.resize_mode,
+            resample=self.resample,
+            background_rgb=self.background_rgb,
+        )
+
+    def _cache_params(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self._OUTPUT_PARAMS}
+
+    def _convert(self, src: Path, out_exts: List[str], *, out_dir: Optional[Path]) -> List[ConvertResult]:
+        traces = [_Trace() for _ in out_exts]
+        results = self._convert_traced(src, out_exts, out_dir=out_dir, traces=traces)
+        try:
+            src_bytes = src.stat().st_size
+        except OSError:
+            src_bytes = 0
+        for r, trace in zip(results, traces):
+            r.timings = trace.timings
+            r.src_format = r.src_format or trace.src_format
+            r.src_bytes = src_bytes
+            try:
+                if r.ok and r.dst is not None:
+                    r.out_bytes = len(r.data) if r.data is not None else r.dst.stat().st_size
+            except OSError:
+                pass
+        return results
+
+    def _convert_traced(self, src: Path, out_exts: List[str], *, out_dir: Optional[Path], traces: List[_Trace]) -> List[ConvertResult]:
         if not src.exists():
-            return ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason="Arquivo inexistente")
+            return [
+                ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason="Arquivo inexistente")
+                for _ in out_exts
+            ]
+
+        if self.cache is None:
+            return self._convert_pillow(src, out_exts, out_dir=out_dir, traces=traces)
+
+        # Alvos já no cache saem direto; os demais dividem uma só decodificação
+        results: List[Optional[ConvertResult]] = [None] * len(out_exts)
+        keys: List[str] = []
+        try:
+            with traces[0].stage("cache"):
+                digest = file_digest(src)
+            for i, ext in enumerate(out_exts):
+                with traces[i].stage("cache"):
+                    keys.append(self.cache.key_for(digest, ext.lower().lstrip("."), self._cache_params()))
+                    entry = self.cache.get(keys[i])
+                if entry is not None:
+                    with traces[i].stage("write"):
+                        results[i] = self._from_cache(src, entry, out_dir)
+        except OSError as e:
+            return [
+                ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason=str(e))
+                for _ in out_exts
+            ]
+
+        misses = [i for i, r in enumerate(results) if r is None]
+        if misses:
+            converted = self._convert_pillow(
+                src, [out_exts[i] for i in misses], out_dir=out_dir, keep_data=True, traces=[traces[i] for i in misses],
+            )
+            for i, r in zip(misses, converted):
+                if r.ok and r.dst is not None and r.data is not None:
+                    with traces[i].stage("cache"):
+                        self.cache.put(keys[i], r.data, {
+                            "ext": r.dst.suffix.lstrip("."),
+                            "dst_format": r.dst_format,
+                            "src_format": traces[i].src_format,
+                            "fallback_used": r.fallback_used,
+                            "reason": r.reason,
+                        })
+                    if out_dir is not None:
+                        r.data = None  # já está em disco
+                r.cache_hit = False
+                results[i] = r
+        return results  # type: ignore[return-value]
+
+    def _from_cache(self, src: Path, entry: CacheEntry, out_dir: Optional[Path]) -> ConvertResult:
+        meta = entry.meta
+        name = _brand_name(src.stem, meta["ext"], self.brand_tag, self.name_style)
+        base = dict(
+            src=src, ok=True, dst_format=meta["dst_format"], fallback_used=bool(meta["fallback_used"]),
+            cache_hit=True, src_format=meta.get("src_format"),
+        )
+        if out_dir is None:
+            return ConvertResult(dst=Path(name), reason=meta.get("reason"), data=entry.data, **base)
+        dst_path = out_dir / name
+        if not self.overwrite and dst_path.exists():
+            return ConvertResult(dst=dst_path, reason=meta.get("reason") or "Já existia", **base)
+        dst_path.write_bytes(entry.data)
+        return ConvertResult(dst=dst_path, reason=meta.get("reason"), **base)
+
+    def _convert_pillow(
+        self,
+        src: Path,
+        out_exts: List[str],
+        *,
+        out_dir: Optional[Path],
+        keep_data: bool = False,
+        traces: Optional[List[_Trace]] = None,
+    ) -> List[ConvertResult]:
+        """
+        Decodifica `src` uma vez e gera um resultado por extensão de
+        `out_exts`, na mesma ordem. Decode/transpose/resize contam no trace
+        do primeiro alvo estático; prepare/encode, no de cada alvo.
+        Animações são convertidas quadro a quadro, alvo a alvo.
+        """
+        traces = traces or [_Trace() for _ in out_exts]
+        exts = [ext.lower().lstrip(".") for ext in out_exts]
+        pil_fmts = [EXT_TO_PIL.get(ext) for ext in exts]
+        results: List[Optional[ConvertResult]] = [None] * len(exts)
+        load_plugins()
 
         try:
+            t0 = time.perf_counter()
             with Image.open(src) as im:
-                im = ImageOps.exif_transpose(im)
-                exif_bytes = im.info.get("exif")
-                icc_profile = im.info.get("icc_profile")
-
-                # 1) Tenta formato alvo (se suportado)
-                if pil_fmt:
-                    im_tgt = _prepare_image_for_format(
-                        im, pil_fmt,
-                        background_rgb=self.background_rgb,
-                        requested_ext=out_ext_norm
-                    )
-                    dst_name = _brand_name(src.stem, out_ext_norm, self.brand_tag, self.name_style)
-                    dst_path = out_dir / dst_name
+                for trace in traces:
+                    trace.src_format = im.format
+                if any(f in ANIMATED_FORMATS for f in pil_fmts) and _is_animated(im):
+                    for i, pil_fmt in enumerate(pil_fmts):
+                        if pil_fmt not in ANIMATED_FORMATS:
+                            continue
+                        try:
+                            results[i] = self._convert_animation(
+                                im, src, pil_fmt, exts[i], out_dir=out_dir, keep_data=keep_data, trace=traces[i],
+                            )
+                        except _CODEC_ERRORS:
+                            # quadro corrompido no meio da animação: segue como imagem estática
+                            logger.warning("Animação de %s falhou em %s; gravando só o 1º quadro", src.name, pil_fmt, exc_info=True)
+                    im.seek(0)
+                    t0 = time.perf_counter()
+                pending = [i for i, r in enumerate(results) if r is None]
+                if not pending:
+                    return results  # type: ignore[return-value]
+
+                has_exif = bool(im.info.get("exif"))
+                banded = [i for i in pending if self._strips_target(pil_fmts[i], exts[i], has_exif)]
+                reader = None
+                if banded and self._strips_apply(im.width, im.height, exif_orientation(im)):
+                    reader = strips.open_reader(src, im)
+                for i in banded if reader is not None else []:
+                    try:
+                        results[i] = self._convert_strips(
+                            reader, src, exts[i], pil_fmts[i], out_dir=out_dir, keep_data=keep_data, trace=traces[i],
+                        )
+                    except _CODEC_ERRORS:
+                        # segue pelo caminho normal, com a imagem inteira
+                        logger.warning("Conversão em faixas de %s para %s falhou; usando a imagem inteira", src.name, exts[i], exc_info=True)
+                pending = [i for i in pending if results[i] is None]
+                if not pending:
+                    return results  # type: ignore[return-value]
+                t0 = time.perf_counter()
+
+                shared = traces[pending[0]]
+                # Image.open só lê o cabeçalho; load() força a decodificação aqui
+                im, reduced = _decode_reduced(im, self._decode_min_size_for([pil_fmts[i] for i in pending], im))
+                im.load()
+                shared.add("decode", time.perf_counter() - t0)
+                with shared.stage("transpose"):
+                    im = ImageOps.exif_transpose(im)
+                with shared.stage("resize"):
+                    im = self._resize(im)
 
-                    if not self.overwrite and dst_path.exists():
-                        return ConvertResult(src=src, ok=True, dst=dst_path, dst_format=pil_fmt, fallback_used=False, reason="Já existia")
+                full: List[Image.Image] = []
 
+                def full_image() -> Image.Image:
+                    # a redução valia para os alvos; o fallback PNG sai na resolução original
+                    if not reduced:
+                        return im
+                    if not full:
+                        with shared.stage("decode"), Image.open(src) as f:
+                            full.append(self._resize(ImageOps.exif_transpose(f)))
+                    return full[0]
+
+                for i in pending:
                     try:
-                        _save_with_params(
-                            im_tgt, dst_path, pil_fmt,
-                            exif_bytes=exif_bytes, icc_profile=icc_profile,
-                            jpeg_quality=self.jpeg_quality,
-                            jpeg_progressive=self.jpeg_progressive,
-                            webp_quality=self.webp_quality,
-                            png_compress_level=self.png_compress_level,
-                            tiff_compression=self.tiff_compression,
-                            requested_ext=out_ext_norm,
+                        results[i] = self._convert_static(
+                            im, src, exts[i], pil_fmts[i],
+                            out_dir=out_dir, keep_data=keep_data, trace=traces[i], full_image=full_image,
                         )
-                        return ConvertResult(src=src, ok=True, dst=dst_path, dst_format=pil_fmt, fallback_used=False)
                     except Exception as e:
-                        fail_reason = f"Falha no formato alvo ({pil_fmt}): {e}"
-                else:
-                    fail_reason = f"Formato de saída não suportado: {out_ext}"
+                        results[i] = ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason=str(e))
+                return results  # type: ignore[return-value]
+
+        except UnidentifiedImageError:
+            reason = "Arquivo não reconhecido"
+        except Exception as e:
+            reason = str(e)
+        return [
+            r or ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason=reason)
+            for r in results
+        ]
 
-                # 2) Fallback → PNG (último recurso)
-                im_png = _prepare_image_for_format(im, "PNG", background_rgb=self.background_rgb)
-                png_name = _brand_name(src.stem, "png", self.brand_tag, self.name_style)
-                png_path = out_dir / png_name
+    def _convert_static(
+        self,
+        im: Image.Image,
+        src: Path,
+        out_ext_norm: str,
+        pil_fmt: Optional[str],
+        *,
+        out_dir: Optional[Path],
+        keep_data: bool,
+        trace: _Trace,
+        full_image: Callable[[], Image.Image],
+    ) -> ConvertResult:
+        """Prepara e grava a imagem já decodificada em um alvo (fallback PNG)."""
+        exif_bytes = im.info.get("exif")
+        icc_profile = im.info.get("icc_profile")
+
+        # 1) Tenta formato alvo (se suportado)
+        if pil_fmt and pil_can_save(pil_fmt):
+            with trace.stage("prepare"):
+                im_tgt = _prepare_image_for_format(
+                    im, pil_fmt,
+                    background_rgb=self.background_rgb,
+                    requested_ext=out_ext_norm,
+                    quantizer=self.quantizer,
+                    dither=self.dither,
+                    palette_sample_side=self.palette_sample_side,
+                )
+            dst_name = _brand_name(src.stem, out_ext_norm, self.brand_tag, self.name_style)
 
-                if not self.overwrite and png_path.exists():
-                    return ConvertResult(src=src, ok=True, dst=png_path, dst_format="PNG", fallback_used=True, reason=fail_reason)
+            if out_dir is not None and not self.overwrite and (out_dir / dst_name).exists():
+                return ConvertResult(src=src, ok=True, dst=out_dir / dst_name, dst_format=pil_fmt, fallback_used=False, reason="Já existia")
 
-                _save_with_params(
-                    im_png, png_path, "PNG",
+            try:
+                dst, data = self._save_target(
+                    im_tgt, pil_fmt, dst_name, out_dir,
                     exif_bytes=exif_bytes, icc_profile=icc_profile,
-                    jpeg_quality=self.jpeg_quality,
-                    jpeg_progressive=self.jpeg_progressive,
-                    webp_quality=self.webp_quality,
-                    png_compress_level=self.png_compress_level,
-                    tiff_compression=self.tiff_compression,
-                    requested_ext="png",
+                    requested_ext=out_ext_norm, keep_data=keep_data, trace=trace,
                 )
-                return ConvertResult(src=src, ok=True, dst=png_path, dst_format="PNG", fallback_used=True, reason=fail_reason)
+                return ConvertResult(src=src, ok=True, dst=dst, dst_format=pil_fmt, fallback_used=False, data=data)
+            except Exception as e:
+                fail_reason = f"Falha no formato alvo ({pil_fmt}): {e}"
+        elif pil_fmt:
+            # sem plugin de escrita: nem prepara (a quantização do XPM seria perdida)
+            fail_reason = f"Formato sem gravação neste ambiente ({pil_fmt})"
+        else:
+            fail_reason = f"Formato de saída não suportado: {out_ext_norm}"
 
-        except UnidentifiedImageError:
-            return ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason="Arquivo não reconhecido")
-        except Exception as e:
-            return ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason=str(e))
+        # 2) Fallback → PNG (último recurso)
+        im = full_image()
+        with trace.stage("prepare"):
+            im_png = _prepare_image_for_format(im, "PNG", background_rgb=self.background_rgb)
+        png_name = _brand_name(src.stem, "png", self.brand_tag, self.name_style)
+
+        if out_dir is not None and not self.overwrite and (out_dir / png_name).exists():
+            return ConvertResult(src=src, ok=True, dst=out_dir / png_name, dst_format="PNG", fallback_used=True, reason=fail_reason)
+
+        dst, data = self._save_target(
+            im_png, "PNG", png_name, out_dir,
+            exif_bytes=exif_bytes, icc_profile=icc_profile,
+            requested_ext="png", keep_data=keep_data, trace=trace,
+        )
+        return ConvertResult(src=src, ok=True, dst=dst, dst_format="PNG", fallback_used=True, reason=fail_reason, data=data)
+
+    def _convert_strips(
+        self,
+        reader: strips.StripReader,
+        src: Path,
+        out_ext_norm: str,
+        pil_fmt: str,
+        *,
+        out_dir: Optional[Path],
+        keep_data: bool,
+        trace: _Trace,
+    ) -> ConvertResult:
+        """Lê, prepara e grava uma faixa por vez (ver strips); nunca a imagem inteira."""
+        dst_name = _brand_name(src.stem, out_ext_norm, self.brand_tag, self.name_style)
+        if out_dir is not None and not self.overwrite and (out_dir / dst_name).exists():
+            return ConvertResult(src=src, ok=True, dst=out_dir / dst_name, dst_format=pil_fmt, fallback_used=False, reason="Já existia")
+
+        icc_profile = reader.info.get("icc_profile")
+        params = self._encoder_params(None, icc_profile, out_ext_norm)
+        png = _encoder_kwargs(Image.new("L", (1, 1)), "PNG", **params)
+        band_time = 0.0  # leitura/preparo das faixas, descontado do "encode"
+
+        def bands() -> Iterator[Image.Image]:
+            nonlocal band_time
+            it = reader.bands(strips.band_rows(*reader.size))
+            while True:
+                t0 = time.perf_counter()
+                band = next(it, None)
+                if band is None:
+                    return
+                trace.add("decode", time.perf_counter() - t0)
+                with trace.stage("prepare"):
+                    band = _prepare_image_for_format(
+                        band, pil_fmt, background_rgb=self.background_rgb, requested_ext=out_ext_norm,
+                    )
+                band_time += time.perf_counter() - t0
+                yield band
+
+        encode = lambda dst: strips.write(
+            bands(), dst, pil_fmt, size=reader.size,
+            compress_level=png["compress_level"], optimize=bool(png.get("optimize")), tiff_compression=self.tiff_compression, icc_profile=icc_profile,
+        )
+        try:
+            dst, data = self._save_target(
+                None, pil_fmt, dst_name, out_dir,
+                exif_bytes=None, icc_profile=icc_profile,
+                requested_ext=out_ext_norm, keep_data=keep_data, trace=trace, encode=encode,
+            )
+        except Exception:
+            if out_dir is not None:
+                (out_dir / dst_name).unlink(missing_ok=True)
+            raise
+        trace.timings["encode"] = max(0.0, trace.timings.get("encode", 0.0) - band_time)
+        return ConvertResult(src=src, ok=True, dst=dst, dst_format=pil_fmt, fallback_used=False, data=data)
+
+    def _convert_animation(
+        self,
+        im: Image.Image,
+        src: Path,
+        pil_fmt: str,
+        out_ext_norm: str,
+        *,
+        out_dir: Optional[Path],
+        keep_data: bool,
+        trace: _Trace,
+    ) -> ConvertResult:
+        """Converte todos os quadros de `im` (ver ANIMATED_FORMATS), um por vez."""
+        dst_name = _brand_name(src.stem, out_ext_norm, self.brand_tag, self.name_style)
+        if out_dir is not None and not self.overwrite and (out_dir / dst_name).exists():
+            return ConvertResult(src=src, ok=True, dst=out_dir / dst_name, dst_format=pil_fmt, fallback_used=False, reason="Já existia")
+
+        n_frames = im.n_frames
+        loop = im.info.get("loop")
+        transparent = im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info
+        mode = "RGBA" if transparent else "RGB"
+        exif_bytes = im.info.get("exif")
+        icc_profile = im.info.get("icc_profile")
+        frame_time = 0.0  # decode/transform dos quadros, descontado do "encode"
+
+        def frames() -> Iterator[Frame]:
+            nonlocal frame_time
+            for i in range(n_frames):
+                t0 = time.perf_counter()
+                im.seek(i)
+                im.load()
+                t1 = time.perf_counter()
+                trace.add("decode", t1 - t0)
+                with trace.stage("transpose"):
+                    frame = ImageOps.exif_transpose(im)
+                with trace.stage("resize"):
+                    frame = self._resize(frame)
+                with trace.stage("prepare"):
+                    # mesmo modo em todos os quadros; sempre uma cópia, pois o
+                    # próximo seek() reescreve o buffer de `im`
+                    frame = frame.convert(mode)
+                frame_time += time.perf_counter() - t0
+                yield frame, int(im.info.get("duration") or 100)
+
+        kwargs = _encoder_kwargs(im, pil_fmt, **self._encoder_params(exif_bytes, icc_profile, out_ext_norm))
+        encode = lambda dst: _save_animation(
+            frames, dst, pil_fmt, source=im, n_frames=n_frames,
+            transparent=transparent, loop=loop, kwargs=kwargs, quantizer=self.quantizer, dither=self.dither,
+        )
+        try:
+            dst, data = self._save_target(
+                im, pil_fmt, dst_name, out_dir,
+                exif_bytes=exif_bytes, icc_profile=icc_profile,
+                requested_ext=out_ext_norm, keep_data=keep_data, trace=trace, encode=encode,
+            )
+        except Exception:
+            if out_dir is not None:
+                (out_dir / dst_name).unlink(missing_ok=True)  # não deixa animação pela metade
+            raise
+        trace.timings["encode"] = max(0.0, trace.timings.get("encode", 0.0) - frame_time)
+        return ConvertResult(src=src, ok=True, dst=dst, dst_format=pil_fmt, fallback_used=False, data=data)
+
+    def _iter_batch(
+        self,
+        files: Iterable[Path],
+        task: Callable[..., List[ConvertResult]],
+        *args: Any,
+        on_complete: Optional[Callable[[int, Path, List[ConvertResult]], None]] = None,
+        memory_budget: Optional[MemoryBudget] = None,
+        costs: Optional[Dict[str, int]] = None,
+        out_exts: Optional[List[str]] = None,
+    ) -> Iterator[Tuple[int, Path, List[ConvertResult]]]:
+        """
+        Executa `task(src, *args)` (um resultado por alvo) para cada arquivo
+        e produz (índice, src, resultados) na ordem de entrada; `on_complete`
+        é chamado na ordem de conclusão (útil para progresso).
+
+        Com `workers > 1` usa um pool de processos limitado: tarefas pendentes
+        + resultados aguardando a vez somam no máximo 2×workers, então lotes
+        grandes não acumulam milhares de futures (nem seus bytes) de uma vez.
+
+        Com `memory_budget`, cada arquivo reserva a memória estimada pelo
+        cabeçalho antes de começar e devolve ao terminar. `costs` (nome do
+        arquivo -> pico em bytes, do probe feito no upload) evita reabrir
+        os cabeçalhos; sem ele, `out_exts` diz se o arquivo sai em faixas.
+
+        `files` pode ser um iterador que só entrega o próximo arquivo quando
+        ele existe (upload em partes): o laço espera nele como esperaria por
+        um resultado.
+        """
+        def file_cost(src: Path) -> int:
+            if memory_budget is None:
+                return 0
+            if costs and src.name in costs:
+                return int(costs[src.name])
+            return self.cost(probe(src), out_exts).peak_bytes
+
+        workers = min(self.workers, len(files)) if isinstance(files, Sized) else self.workers
+        if workers <= 1:
+            for i, src in enumerate(files):
+                cost = file_cost(src)
+                if memory_budget is not None:
+                    memory_budget.acquire(cost)
+                try:
+                    rs = task(src, *args)
+                finally:
+                    if memory_budget is not None:
+                        memory_budget.release(cost)
+                if on_complete:
+                    on_complete(i, src, rs)
+                yield i, src, rs
+            return
+
+        # "spawn" evita herdar threads/locks do servidor (uvicorn/gunicorn) via fork
+        ctx = multiprocessing.get_context("spawn")
+        window = workers * 2
+        pending: Dict[Any, Tuple[int, Path, int]] = {}
+        ready: Dict[int, Tuple[Path, List[ConvertResult]]] = {}
+        queue = iter(enumerate(files))
+        held: Optional[Tuple[int, Path, int]] = None  # próximo arquivo, à espera de memória
+        next_idx = 0
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            def submit_next() -> bool:
+                nonlocal held
+                nxt = held
+                if nxt is None:
+                    item = next(queue, None)
+                    if item is None:
+                        return False
+                    nxt = (item[0], item[1], file_cost(item[1]))
+                i, src, cost = nxt
+                if memory_budget is not None:
+                    # Sem tarefas nossas em andamento, espera outras conversões
+                    # do processo liberarem; com tarefas, só tenta (a liberação
+                    # depende deste laço — bloquear aqui travaria o lote).
+                    got = memory_budget.try_acquire(cost) if pending else memory_budget.acquire(cost)
+                    if not got:
+                        held = nxt
+                        return False
+                held = None
+                try:
+                    fut = pool.submit(task, src, *args)
+                except Exception as e:  # pool quebrado: falha só este arquivo
+                    fut = Future()
+                    fut.set_exception(e)
+                pending[fut] = (i, src, cost)
+                return True
+
+            def fill() -> None:
+                while len(pending) + len(ready) < window and submit_next():
+                    pass
+
+            try:
+                fill()
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        i, src, cost = pending.pop(fut)
+                        if memory_budget is not None:
+                            memory_budget.release(cost)
+                        try:
+                            rs = fut.result()
+                        except Exception as e:  # processo morto, erro de pickle etc.
+                            rs = [ConvertResult(src=src, ok=False, dst=None, dst_format=None, fallback_used=False, reason=str(e))]
+                        if self.cache is not None:
+                            # o processo usou uma cópia do cache: contagens e gravações voltam por aqui
+                            self.cache.record_remote(
+                                hits=sum(1 for r in rs if r.cache_hit is True),
+                                misses=sum(1 for r in rs if r.cache_hit is False),
+                                stored_bytes=sum(r.out_bytes for r in rs if r.cache_hit is False and r.ok),
+                            )
+                        if on_complete:
+                            on_complete(i, src, rs)
+                        ready[i] = (src, rs)
+                    while next_idx in ready:
+                        src, rs = ready.pop(next_idx)
+                        yield next_idx, src, rs
+                        next_idx += 1
+                    fill()
+            finally:
+                # consumidor parou no meio (ex.: download em streaming cancelado)
+                for fut, (_, _, cost) in pending.items():
+                    fut.cancel()
+                    if memory_budget is not None:
+                        memory_budget.release(cost)
+
+    def _iter_dedup(
+        self,
+        files: Iterable[Path],
+        task: Callable[..., List[ConvertResult]],
+        *args: Any,
+        digests: Optional[Dict[str, str]] = None,
+        on_complete: Optional[Callable[[int, Path, List[ConvertResult]], None]] = None,
+        **kwargs: Any,
+    ) -> Iterator[Tuple[int, Path, List[ConvertResult]]]:
+        """
+        `_iter_batch` convertendo cada conteúdo uma vez só: as cópias (ver
+        `_duplicate_map`) saem logo depois da original, com os resultados dela
+        renomeados (`_duplicate_result`). Um iterador (upload em partes) não
+        é comparado: as cópias que chegam depois vêm do cache de resultados.
+        """
+        copies = _duplicate_map(files, digests) if isinstance(files, list) else {}
+        if not copies:
+            yield from self._iter_batch(files, task, *args, on_complete=on_complete, **kwargs)
+            return
+
+        copies_of: Dict[int, List[int]] = {}
+        for dup, orig in copies.items():
+            copies_of.setdefault(orig, []).append(dup)
+        unique = [i for i in range(len(files)) if i not in copies]
+
+        def completed(j: int, src: Path, rs: List[ConvertResult]) -> None:
+            if on_complete:
+                for i in [unique[j], *copies_of.get(unique[j], ())]:
+                    on_complete(i, files[i], rs)
+
+        for j, src, rs in self._iter_batch([files[i] for i in unique], task, *args, on_complete=completed, **kwargs):
+            # as cópias antes de entregar a original: quem consome pode soltar r.data
+            dups = [(d, files[d], [self._duplicate_result(r, files[d]) for r in rs]) for d in copies_of.get(unique[j], ())]
+            yield unique[j], src, rs
+            yield from dups
+
+    def _duplicate_result(self, r: ConvertResult, src: Path) -> ConvertResult:
+        """Resultado de `src` (mesmo conteúdo de r.src) reaproveitando a saída de `r`."""
+        dup = replace(r, src=src, duplicate_of=r.src, timings={}, cache_hit=None)
+        if not r.ok or r.dst is None:
+            return dup
+        dup.dst = r.dst.with_name(_brand_name(src.stem, r.dst.suffix, self.brand_tag, self.name_style))
+        if r.data is None and r.dst.is_file():  # saída em disco (convert_many): link, sem copiar
+            if dup.dst.exists() and not self.overwrite:
+                dup.reason = dup.reason or "Já existia"
+                return dup
+            dup.dst.unlink(missing_ok=True)
+            try:
+                os.link(r.dst, dup.dst)
+            except OSError:
+                shutil.copyfile(r.dst, dup.dst)
+        return dup
+
+    def _zip_entries(
+        self,
+        zf: zipfile.ZipFile,
+        files: Iterable[Path],
+        out_exts: List[str],
+        *,
+        results: List[ConvertResult],
+        written: set,
+        zip_time: _Trace,
+        on_complete: Optional[Callable[[int, Path, List[ConvertResult]], None]],
+        memory_budget: Optional[MemoryBudget],
+        costs: Optional[Dict[str, int]] = None,
+        digests: Optional[Dict[str, str]] = None,
+    ) -> Iterator[ConvertResult]:
+        """Converte em memória e grava cada resultado no ZIP, na ordem de entrada."""
+        for _, _, rs in self._iter_dedup(
+            files, self.convert_many_to_bytes, out_exts, digests=digests,
+            on_complete=on_complete, memory_budget=memory_budget, costs=costs, out_exts=out_exts,
+        ):
+            for r in rs:
+                if r.ok and r.dst is not None and r.data is not None:
+                    arcname = r.dst.name
+                    if arcname in written:
+                        # mesmo nome de saída (ex.: a.png e a.jpg → a--tag.webp): mantém o primeiro
+                        r.reason = r.reason or "Já existia"
+                    else:
+                        with zip_time.stage("zip"):
+                            zf.writestr(arcname, r.data, compress_type=_zip_compression_for(r.dst_format))
+                        written.add(arcname)
+                r.data = None  # libera os bytes assim que vão para o ZIP
+                results.append(r)
+                yield r
+
+    def _finish_batch(
+        self,
+        batch: BatchResult,
+        *,
+        started: float,
+        zip_time: _Trace,
+        out_ext: Union[str, Sequence[str]],
+        metrics: Optional[MetricsSink],
+        zip_bytes: Optional[int] = None,
+    ) -> BatchResult:
+        results = batch.results
+        batch.timings = _sum_timings(results)
+        batch.timings.update(zip_time.timings)
+        batch.timings["total"] = time.perf_counter() - started
+        # com vários alvos a mesma origem aparece uma vez por alvo
+        batch.src_bytes = sum({r.src: r.src_bytes for r in results}.values())
+        batch.out_bytes = sum(r.out_bytes for r in results)
+        spent: Dict[Path, float] = {}
+        for r in results:
+            if r.duplicate_of is None:
+                spent[r.src] = spent.get(r.src, 0.0) + sum(r.timings.values())
+        copies = {r.src: r.duplicate_of for r in results if r.duplicate_of is not None}
+        batch.duplicates = len(copies)
+        batch.dedup_saved_seconds = sum(spent.get(orig, 0.0) for orig in copies.values())
+        if zip_bytes is not None:
+            batch.zip_bytes = zip_bytes
+        elif batch.zip_path is not None:
+            batch.zip_bytes = batch.zip_path.stat().st_size
+        if metrics is not None:
+            metrics.observe_batch(batch, out_ext=ext_label(out_ext))
+        return batch
+
+    def iter_zip(
+        self,
+        src_files: Iterable[Path],
+        *,
+        out_ext: Union[str, Sequence[str]],
+        progress: Optional[ProgressCB] = None,
+        memory_budget: Optional[MemoryBudget] = None,
+        costs: Optional[Dict[str, int]] = None,
+        metrics: Optional[MetricsSink] = None,
+        on_finish: Optional[Callable[[BatchResult], None]] = None,
+        digests: Optional[Dict[str, str]] = None,
+    ) -> Iterator[bytes]:
+        """
+        ZIP do lote gerado sob demanda: produz os bytes de cada entrada assim
+        que a imagem correspondente fica pronta (para StreamingHttpResponse).
+        O arquivo nunca existe inteiro, nem em disco nem em memória — no
+        máximo a saída de uma imagem por vez.
+
+        `on_finish` recebe o BatchResult (zip_path=None) depois do último byte.
+        Se o consumidor parar antes, nada é chamado.
+        """
+        started = time.perf_counter()
+        files = [Path(p) for p in src_files]
+        total = len(files)
+
+        def emit(pct: int, label: str) -> None:
+            if progress:
+                progress(max(0, min(100, int(pct))), label)
+
+        done = 0
+
+        def on_complete(i: int, src: Path, rs: List[ConvertResult]) -> None:
+            nonlocal done
+            done += 1
+            emit(int((done / max(1, total)) * 95), f"Convertido: {src.name}")
+
+        sink = _ChunkSink()
+        results: List[ConvertResult] = []
+        written: set = set()
+        zip_time = _Trace()
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+            for _ in self._zip_entries(
+                zf, files, _ext_list(out_ext), results=results, written=written, zip_time=zip_time,
+                on_complete=on_complete, memory_budget=memory_budget, costs=costs, digests=digests,
+            ):
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+            emit(95, "Finalizando ZIP…")
+        yield sink.drain()  # diretório central
+
+        errors = [r for r in results if not r.ok]
+        batch = self._finish_batch(
+            BatchResult(
+                ok=bool(written),
+                zip_path=None,
+                converted=sum(1 for r in results if r.ok),
+                fallback_count=sum(1 for r in results if r.fallback_used),
+                errors=errors,
+                results=results,
+                cache_hits=sum(1 for r in results if r.cache_hit is True),
+                cache_misses=sum(1 for r in results if r.cache_hit is False),
+            ),
+            started=started, zip_time=zip_time, out_ext=out_ext, metrics=metrics, zip_bytes=sink.total,
+        )
+        emit(100, "Concluído")
+        if on_finish:
+            on_finish(batch)
 
     def convert_batch_to_zip(
         self,
         src_files: Iterable[Path],
         *,
-        out_ext: str,
+        out_ext: Union[str, Sequence[str]],
         work_dir: Path,
         progress: Optional[ProgressCB] = None,
         zip_basename: Optional[str] = None,
         keep_outputs: bool = False,
+        pipeline: bool = True,
+        memory_budget: Optional[MemoryBudget] = None,
+        costs: Optional[Dict[str, int]] = None,
+        metrics: Optional[MetricsSink] = None,
+        digests: Optional[Dict[str, str]] = None,
+        expected: Optional[int] = None,
     ) -> BatchResult:
+        """
+        Converte o lote e gera o ZIP em `work_dir`. `out_ext` pode ser uma
+        lista: cada origem sai em todos os formatos, decodificada uma vez.
+
+        No modo pipeline (padrão quando `keep_outputs=False`) cada imagem é
+        codificada em memória e gravada no ZIP assim que fica pronta, sem
+        passar por `work_dir/out`. Com `keep_outputs=True` (ou
+        `pipeline=False`) os arquivos convertidos são gravados em `out/` e
+        zipados ao final.
+
+        `memory_budget` (semáforo do processo) limita a memória de pixels em
+        uso somando todas as conversões concorrentes; `costs` traz o pico
+        estimado de cada arquivo (por nome), se já conhecido.
+
+        `metrics` recebe o lote pronto (tempos por etapa e bytes de cada
+        arquivo); é chamado aqui, no processo que chamou, nunca no pool.
 
+        Origens com conteúdo idêntico são convertidas uma vez; as cópias
+        entram no ZIP com o próprio nome e os bytes já codificados
+        (BatchResult.duplicates). `digests` (nome -> sha256, do upload)
+        poupa a leitura para comparar.
+
+        Com `expected`, `src_files` é consumido aos poucos, sem virar lista:
+        um iterador que entrega cada arquivo quando o upload dele termina
+        (jobs.run_job com upload em partes). `expected` é o total previsto,
+        só para o progresso.
+        """
+        started = time.perf_counter()
         work_dir = Path(work_dir)
-        out_dir = work_dir / "out"
-        out_dir.mkdir(parents=True, exist_ok=True)
+        work_dir.mkdir(parents=True, exist_ok=True)
 
-        files = [Path(p) for p in src_files]
-        total = len(files)
+        if expected is None:
+            files: Iterable[Path] = [Path(p) for p in src_files]
+            total = len(files)
+        else:
+            files, total = (Path(p) for p in src_files), int(expected)
         if total == 0:
             return BatchResult(ok=False, zip_path=None, converted=0, fallback_count=0, errors=[], results=[])
 
@@ -403,49 +1942,80 @@ class ImagesConverter:
             if progress:
                 progress(max(0, min(100, int(pct))), label)
 
+        zip_path = work_dir / (zip_basename or zip_name_for(out_ext))
+
+        use_pipeline = pipeline and not keep_outputs
+        done = 0
+        conv_share = 95 if use_pipeline else 80  # no pipeline a compactação acontece junto
+
+        def on_complete(i: int, src: Path, rs: List[ConvertResult]) -> None:
+            nonlocal done
+            done += 1
+            emit(int((min(done, total) / total) * conv_share), f"Convertido: {src.name}")
+
         results: List[ConvertResult] = []
-        errors: List[ConvertResult] = []
-        fallback_count = 0
-
-        for i, src in enumerate(files):
-            emit(int((i / total) * 80), f"Convertendo: {src.name}")
-            r = self.convert_one(src, out_dir, out_ext)
-            results.append(r)
-            if not r.ok:
-                errors.append(r)
-            if r.fallback_used:
-                fallback_count += 1
-
-        emit(80, "Compactando…")
-
-        stamp = datetime.utcnow().isoformat().replace(":", "").replace(".", "")[:15]
-        target_ext_for_name = out_ext.lower().lstrip(".") if out_ext.lower().lstrip(".") in EXT_TO_PIL else "png"
-        base = zip_basename or f"imagens-{target_ext_for_name}-converte-tudo-{stamp}.zip"
-        zip_path = work_dir / base
-
-        out_files = [r.dst for r in results if r.ok and r.dst]
-        if not out_files:
-            return BatchResult(ok=False, zip_path=None, converted=0, fallback_count=fallback_count, errors=errors, results=results)
-
-        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
-            n = len(out_files)
-            for j, f in enumerate(out_files):
-                arcname = os.path.basename(str(f))
-                zf.write(str(f), arcname=arcname)
-                emit(80 + int(((j + 1) / n) * 20), "Compactando…")
-
-        if not keep_outputs:
-            for f in out_files:
-                try: Path(f).unlink(missing_ok=True)
-                except Exception: pass
+        zip_time = _Trace()
+
+        def finish(batch: BatchResult) -> BatchResult:
+            return self._finish_batch(batch, started=started, zip_time=zip_time, out_ext=out_ext, metrics=metrics)
+
+        if use_pipeline:
+            written: set = set()
+            with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+                for _ in self._zip_entries(
+                    zf, files, _ext_list(out_ext), results=results, written=written, zip_time=zip_time,
+                    on_complete=on_complete, memory_budget=memory_budget, costs=costs, digests=digests,
+                ):
+                    pass
+                emit(conv_share, "Finalizando ZIP…")
+                t_close = time.perf_counter()
+            zip_time.add("zip", time.perf_counter() - t_close)  # diretório central
+
+            errors = [r for r in results if not r.ok]
+            fallback_count = sum(1 for r in results if r.fallback_used)
+            if not written:
+                zip_path.unlink(missing_ok=True)
+                return finish(BatchResult(ok=False, zip_path=None, converted=0, fallback_count=fallback_count, errors=errors, results=results))
+            emit(100, "Concluído")
+
+        else:
+            out_dir = work_dir / "out"
+            out_dir.mkdir(parents=True, exist_ok=True)
+            for _, _, rs in self._iter_dedup(
+                files, self.convert_many, out_dir, _ext_list(out_ext), digests=digests,
+                on_complete=on_complete, memory_budget=memory_budget, costs=costs, out_exts=_ext_list(out_ext),
+            ):
+                results.extend(rs)
+
+            errors = [r for r in results if not r.ok]
+            fallback_count = sum(1 for r in results if r.fallback_used)
+
+            emit(80, "Compactando…")
+
+            outs = [r for r in results if r.ok and r.dst]
+            if not outs:
+                return finish(BatchResult(ok=False, zip_path=None, converted=0, fallback_count=fallback_count, errors=errors, results=results))
+
+            with zip_time.stage("zip"), zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+                n = len(outs)
+                for j, r in enumerate(outs):
+                    arcname = os.path.basename(str(r.dst))
+                    zf.write(str(r.dst), arcname=arcname, compress_type=_zip_compression_for(r.dst_format))
+                    emit(80 + int(((j + 1) / n) * 20), "Compactando…")
+
+            if not keep_outputs:
+                for r in outs:
+                    try: Path(r.dst).unlink(missing_ok=True)
+                    except Exception: pass
 
         converted_ok = sum(1 for r in results if r.ok)
-        return BatchResult(
+        return finish(BatchResult(
             ok=True,
             zip_path=zip_path,
             converted=converted_ok,
             fallback_count=fallback_count,
             errors=errors,
             results=results,
-        )
-    
\ No newline at end of file
+            cache_hits=sum(1 for r in results if r.cache_hit is True),
+            cache_misses=sum(1 for r in results if r.cache_hit is False),
+        ))
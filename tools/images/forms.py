@@ -1,7 +1,7 @@
 # tools/images/forms.py
 from django import forms
 from django.forms.widgets import ClearableFileInput
-from .models import ImageFormat
+from . import registry
 
 
 class MultiFileInput(ClearableFileInput):
@@ -10,6 +10,28 @@ class MultiFileInput(ClearableFileInput):
 
 
 NAME_STYLE_CHOICES = (("suffix", "suffix"), ("prefix", "prefix"))
+RESIZE_MODE_CHOICES = (("fit", "fit"), ("fill", "fill"), ("contain", "contain"))
+RESAMPLE_CHOICES = (
+    ("lanczos", "Lanczos"),
+    ("bicubic", "Bicubic"),
+    ("hamming", "Hamming"),
+    ("bilinear", "Bilinear"),
+    ("box", "Box"),
+    ("nearest", "Nearest"),
+)
+ENCODER_PRESET_CHOICES = (
+    ("fast", "Rápido"),
+    ("balanced", "Equilibrado"),
+    ("max-compression", "Compressão máxima"),
+)
+QUANTIZER_CHOICES = (
+    ("mediancut", "Median cut"),
+    ("fastoctree", "Fast octree"),
+    ("libimagequant", "libimagequant"),
+)
+DELIVERY_CHOICES = (("queue", "queue"), ("stream", "stream"))
+# Formatos de saída por lote (cada origem é decodificada uma vez para todos)
+MAX_OUT_EXTS = 5
 TIFF_COMP_CHOICES = (
     ("tiff_lzw", "TIFF LZW"),
     ("tiff_deflate", "TIFF Deflate"),
@@ -25,14 +47,29 @@ class ImageConvertForm(forms.Form):
         required=False,
     )
 
-    # Carregado dinamicamente no __init__ a partir de ImageFormat
-    out_ext = forms.ChoiceField(choices=(), required=True)
+    # Carregado dinamicamente no __init__ a partir do registry (ImageFormat + Pillow).
+    # Aceita vários valores (out_ext=png&out_ext=webp): um ZIP com todos.
+    out_ext = forms.MultipleChoiceField(choices=(), required=True)
 
     jpeg_quality = forms.IntegerField(min_value=1, max_value=95, required=False, initial=85)
     jpeg_progressive = forms.BooleanField(required=False, initial=True)
     webp_quality = forms.IntegerField(min_value=0, max_value=100, required=False, initial=85)
     png_compress_level = forms.IntegerField(min_value=0, max_value=9, required=False, initial=6)
     tiff_compression = forms.ChoiceField(choices=TIFF_COMP_CHOICES, required=False)
+    # Velocidade x tamanho na codificação; vazio = padrão do plano (IMAGES_ENCODER_PRESETS)
+    encoder_preset = forms.ChoiceField(choices=ENCODER_PRESET_CHOICES, required=False)
+    # Redução a 256 cores (GIF/XPM); vazio = padrões do conversor
+    quantizer = forms.ChoiceField(choices=QUANTIZER_CHOICES, required=False)
+    dither = forms.NullBooleanField(required=False)
+    palette_sample_side = forms.IntegerField(min_value=64, max_value=4096, required=False)
+    # "stream": ZIP gerado durante o download; vazio = settings.IMAGES_DEFAULT_DELIVERY
+    delivery = forms.ChoiceField(choices=DELIVERY_CHOICES, required=False)
+
+    # Redimensionamento opcional (sem valores = mantém o tamanho original)
+    max_width = forms.IntegerField(min_value=1, max_value=20000, required=False)
+    max_height = forms.IntegerField(min_value=1, max_value=20000, required=False)
+    resize_mode = forms.ChoiceField(choices=RESIZE_MODE_CHOICES, required=False, initial="fit")
+    resample = forms.ChoiceField(choices=RESAMPLE_CHOICES, required=False, initial="lanczos")
 
     background_hex = forms.RegexField(regex=r"^#[A-Fa-f0-9]{6}$", required=False, initial="#FFFFFF")
     brand_tag = forms.CharField(required=False, initial="ConverteTudo")
@@ -41,6 +78,11 @@ class ImageConvertForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Carrega formatos a partir do banco (mesmo comportamento que você já tinha)
-        qs = ImageFormat.objects.all().only("acronym").order_by("acronym")
-        self.fields["out_ext"].choices = [(f.acronym.lower(), f.acronym.upper()) for f in qs]
+        # Formatos do banco que o Pillow grava de fato (cache do processo, ver registry)
+        self.fields["out_ext"].choices = registry.choices()
+
+    def clean_out_ext(self):
+        exts = list(dict.fromkeys(self.cleaned_data.get("out_ext") or []))
+        if len(exts) > MAX_OUT_EXTS:
+            raise forms.ValidationError(f"Escolha no máximo {MAX_OUT_EXTS} formatos de saída por vez.")
+        return exts
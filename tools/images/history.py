@@ -0,0 +1,173 @@
+# tools/images/history.py
+"""
+Histórico das conversões no banco.
+
+`DatabaseSink` (sink "db" de IMAGES_METRICS) grava, ao fim de cada lote e
+numa transação só, um ConversionJob e os incrementos dos ConversionRollup:
+para cada período (hora, dia local, total) uma linha por par de formatos,
+por formato de origem, por formato de destino e a soma geral ("" = todos).
+Os agregados custam três consultas por lote, qualquer que seja o número de
+linhas: um INSERT em lote que ignora as chaves já existentes, um SELECT FOR
+UPDATE das linhas e um bulk_update com os contadores somados.
+
+`stats()` responde /api/conversions/stats lendo só as linhas agregadas do
+total, do dia e da hora corrente: o custo não cresce com o histórico.
+`cached_stats()` guarda a resposta no cache do Django por
+IMAGES_STATS_CACHE_SECONDS.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .metrics import MetricsSink, format_label
+
+if TYPE_CHECKING:
+    from .converter import BatchResult
+
+logger = logging.getLogger("tools.images.history")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)  # bucket do período ALL
+_COUNTERS = ("jobs", "files", "converted", "fallback_count", "errors", "cache_hits", "src_bytes", "out_bytes", "seconds")
+_STATS_CACHE_KEY = "images:conversion_stats"
+_DEFAULT_STATS_TTL_SECONDS = 10
+
+
+def _buckets(now: datetime) -> Tuple[datetime, datetime]:
+    """Início da hora (UTC) e do dia no fuso do site."""
+    hour = now.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    day = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return hour, day
+
+
+def _rollup_deltas(batch: "BatchResult") -> Dict[Tuple[str, str], Dict[str, float]]:
+    """(origem, destino) -> incrementos, já com as linhas de soma ("")."""
+    deltas: Dict[Tuple[str, str], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(_COUNTERS, 0))
+    for r in batch.results:
+        src, dst = format_label(r.src_format), format_label(r.dst_format)
+        for key in {(src, dst), (src, ""), ("", dst), ("", "")}:
+            d = deltas[key]
+            d["files"] += 1
+            d["converted"] += bool(r.ok)
+            d["fallback_count"] += bool(r.fallback_used)
+            d["errors"] += not r.ok
+            d["cache_hits"] += bool(r.cache_hit)
+            d["src_bytes"] += r.src_bytes
+            d["out_bytes"] += r.out_bytes
+            d["seconds"] += sum(r.timings.values())
+    for d in deltas.values():
+        d["jobs"] = 1
+    return deltas
+
+
+def _bump_all(buckets: Dict[str, datetime], deltas: Dict[Tuple[str, str], Dict[str, float]]) -> None:
+    """Soma `deltas` nas linhas de cada período (chamar dentro de transaction.atomic)."""
+    from .models import ConversionRollup
+
+    keys = [(period, bucket, src, dst) for period, bucket in buckets.items() for src, dst in deltas]
+    # garante que todas as linhas existem; as que outro processo já criou ficam como estão
+    ConversionRollup.objects.bulk_create(
+        [ConversionRollup(period=p, bucket=b, src_format=s, dst_format=d) for p, b, s, d in keys],
+        ignore_conflicts=True,
+    )
+    wanted = set(keys)
+    rows = [
+        row for row in ConversionRollup.objects.select_for_update().filter(
+            period__in=list(buckets),
+            bucket__in=list(buckets.values()),
+            src_format__in={s for s, _ in deltas},
+            dst_format__in={d for _, d in deltas},
+        )
+        if (row.period, row.bucket, row.src_format, row.dst_format) in wanted
+    ]
+    for row in rows:
+        for field, value in deltas[(row.src_format, row.dst_format)].items():
+            setattr(row, field, getattr(row, field) + value)
+    ConversionRollup.objects.bulk_update(rows, _COUNTERS)
+
+
+def record(batch: "BatchResult", *, out_ext: str, now: Optional[datetime] = None) -> None:
+    """Grava o lote e atualiza os agregados (uma transação)."""
+    from .models import ConversionJob, ConversionRollup
+
+    if not batch.results:
+        return
+    now = now or timezone.now()
+    hour, day = _buckets(now)
+    deltas = _rollup_deltas(batch)
+    with transaction.atomic():
+        ConversionJob.objects.create(
+            finished_at=now,
+            out_ext=out_ext[:60],
+            src_formats=",".join(sorted({s for s, d in deltas if s and not d}))[:120],
+            dst_formats=",".join(sorted({d for s, d in deltas if d and not s}))[:120],
+            ok=bool(batch.ok),
+            files=len(batch.results),
+            converted=int(batch.converted),
+            fallback_count=int(batch.fallback_count),
+            errors=len(batch.errors),
+            cache_hits=int(batch.cache_hits),
+            src_bytes=int(batch.src_bytes),
+            out_bytes=int(batch.out_bytes),
+            zip_bytes=int(batch.zip_bytes),
+            timings_ms={k: round(v * 1000, 1) for k, v in batch.timings.items()},
+        )
+        _bump_all({ConversionRollup.HOUR: hour, ConversionRollup.DAY: day, ConversionRollup.ALL: _EPOCH}, deltas)
+
+
+class DatabaseSink(MetricsSink):
+    """Grava cada lote com `record`; falha no banco vira log, não derruba a conversão."""
+
+    def observe_batch(self, batch: "BatchResult", *, out_ext: str) -> None:
+        close_old_connections()  # o images_worker vive mais que CONN_MAX_AGE
+        try:
+            record(batch, out_ext=out_ext)
+        except DatabaseError:
+            logger.exception("Falha ao gravar o histórico do lote (%s)", out_ext)
+
+
+# ------------------------------ Leitura --------------------------------
+def stats(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Totais de conversões concluídas: desde sempre, hoje, nesta hora e por formato hoje."""
+    from .models import ConversionRollup
+
+    now = now or timezone.now()
+    hour, day = _buckets(now)
+    rows = list(
+        ConversionRollup.objects.filter(src_format="").filter(
+            Q(period=ConversionRollup.ALL, bucket=_EPOCH, dst_format="")
+            | Q(period=ConversionRollup.DAY, bucket=day)
+            | Q(period=ConversionRollup.HOUR, bucket=hour, dst_format="")
+        ).only("period", "dst_format", "converted")
+    )
+    by_period: Dict[str, List[Any]] = defaultdict(list)
+    for row in rows:
+        by_period[row.period].append(row)
+    today = Counter({row.dst_format: row.converted for row in by_period[ConversionRollup.DAY]})
+    return {
+        "total": sum(r.converted for r in by_period[ConversionRollup.ALL]),
+        "today": today.pop("", 0),
+        "this_hour": sum(r.converted for r in by_period[ConversionRollup.HOUR]),
+        "formats_today": [{"format": fmt, "converted": n} for fmt, n in today.most_common(5) if n],
+        "updated_at": now.isoformat(),
+    }
+
+
+def stats_ttl() -> int:
+    return int(getattr(settings, "IMAGES_STATS_CACHE_SECONDS", _DEFAULT_STATS_TTL_SECONDS))
+
+
+def cached_stats() -> Dict[str, Any]:
+    """`stats()` com cache de IMAGES_STATS_CACHE_SECONDS (0 = sem cache)."""
+    ttl = stats_ttl()
+    if ttl <= 0:
+        return stats()
+    return cache.get_or_set(_STATS_CACHE_KEY, stats, ttl)
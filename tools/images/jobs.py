@@ -0,0 +1,471 @@
+# tools/images/jobs.py
+"""
+Fila local de conversões (sem broker externo), baseada no sistema de arquivos.
+
+Cada job usa o próprio diretório criado pela view em
+MEDIA_ROOT/tmp_uploads/<job_id>/:
+
+    src/          uploads originais
+    job.json      parâmetros da conversão (gravado uma vez, no enqueue)
+    status.json   estado / progresso / resultado (reescrito atomicamente)
+
+A fila em si são arquivos-marcador em MEDIA_ROOT/_jobs/queue/<ns>-<job_id>.
+O worker reivindica um job movendo o marcador para _jobs/running/ com
+os.rename, que é atômico: se dois workers disputarem o mesmo job, só um vence.
+
+Jobs com entrega em streaming ficam em _jobs/deferred/: quem os reivindica é
+o download (`claim_deferred` + `stream_job`), que gera o ZIP enquanto envia.
+Se ninguém baixar em IMAGES_STREAM_CLAIM_SECONDS, `claim_next` os promove
+para a fila normal e o worker grava o ZIP em disco como nos demais.
+
+Jobs com upload em partes (ver uploads) entram na fila quando o primeiro
+arquivo termina de chegar; o worker converte os arquivos à medida que eles
+chegam. Sem pedaço novo por IMAGES_UPLOAD["IDLE_SECONDS"] o job sai da fila
+(UPLOADING) até o próximo arquivo ou o finalizar.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Estados possíveis em status.json
+UPLOADING = "uploading"  # upload em partes ainda sem arquivo completo (ou parado)
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+# ================== Caminhos ==================
+
+def jobs_root() -> Path:
+    return Path(settings.MEDIA_ROOT) / "tmp_uploads"
+
+def _spool(name: str) -> Path:
+    d = Path(settings.MEDIA_ROOT) / "_jobs" / name
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+def job_dir(job_id: str) -> Optional[Path]:
+    """Diretório do job, ou None se o id for inválido/inexistente."""
+    if not _JOB_ID_RE.match(job_id or ""):
+        return None
+    d = jobs_root() / job_id
+    return d if d.is_dir() else None
+
+
+# ================== Leitura / escrita ==================
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def read_spec(job_base: Path) -> Optional[Dict[str, Any]]:
+    return _read_json(Path(job_base) / "job.json")
+
+def read_status(job_base: Path) -> Optional[Dict[str, Any]]:
+    return _read_json(Path(job_base) / "status.json")
+
+def write_status(job_base: Path, **fields: Any) -> Dict[str, Any]:
+    """Mescla `fields` no status.json do job (escrita atômica)."""
+    path = Path(job_base) / "status.json"
+    status = _read_json(path) or {}
+    status.update(fields)
+    status["updated_at"] = time.time()
+    _write_json(path, status)
+    return status
+
+
+# ================== Fila ==================
+
+def enqueue(job_base: Path, spec: Dict[str, Any], *, deferred: bool = False) -> str:
+    """
+    Registra o job (parâmetros + arquivos já salvos em src/) e o coloca na fila.
+    Com `deferred=True` o job espera o download em streaming (ver `claim_deferred`).
+    Retorna o job_id.
+    """
+    job_base = Path(job_base)
+    job_id = job_base.name
+    _write_json(job_base / "job.json", spec)
+    write_status(job_base, job_id=job_id, state=QUEUED, progress=0, label="Na fila…", created_at=time.time())
+    marker = _spool("deferred" if deferred else "queue") / f"{time.time_ns()}-{job_id}"
+    marker.touch()
+    return job_id
+
+def submit(job_base: Path) -> None:
+    """Coloca na fila um job cujo job.json já foi gravado (upload em partes)."""
+    job_base = Path(job_base)
+    write_status(job_base, state=QUEUED, progress=0, label="Na fila…")
+    (_spool("queue") / f"{time.time_ns()}-{job_base.name}").touch()
+
+def _find_marker(spool: Path, job_id: str) -> Optional[str]:
+    suffix = f"-{job_id}"
+    for name in os.listdir(spool):
+        if name.endswith(suffix):
+            return name
+    return None
+
+def claim_deferred(job_base: Path) -> bool:
+    """Reivindica um job em _jobs/deferred/ para convertê-lo no download."""
+    deferred, running = _spool("deferred"), _spool("running")
+    name = _find_marker(deferred, Path(job_base).name)
+    if name is None:
+        return False
+    try:
+        os.rename(deferred / name, running / name)
+    except FileNotFoundError:
+        return False  # outro download (ou o worker) pegou antes
+    (running / name).write_text(str(os.getpid()))
+    return True
+
+def defer(job_base: Path) -> None:
+    """Download interrompido: o job volta a esperar um novo download (ou o worker)."""
+    deferred, running = _spool("deferred"), _spool("running")
+    name = _find_marker(running, Path(job_base).name)
+    write_status(job_base, state=QUEUED, progress=0, label="Na fila…")
+    if name is not None:
+        # marcador com horário novo: o prazo de promoção recomeça
+        job_id = name.split("-", 1)[-1]
+        try:
+            os.rename(running / name, deferred / f"{time.time_ns()}-{job_id}")
+        except FileNotFoundError:
+            pass
+
+def promote_deferred(max_age_seconds: float) -> int:
+    """Move para a fila normal os jobs em streaming que ninguém baixou a tempo."""
+    deferred, queue = _spool("deferred"), _spool("queue")
+    limit = time.time_ns() - int(max_age_seconds * 1e9)
+    n = 0
+    for name in os.listdir(deferred):
+        try:
+            queued_at = int(name.split("-", 1)[0])
+        except ValueError:
+            queued_at = 0
+        if queued_at > limit:
+            continue
+        try:
+            os.rename(deferred / name, queue / name)
+            n += 1
+        except FileNotFoundError:
+            pass
+    return n
+
+def claim_next() -> Optional[Path]:
+    """Reivindica o job mais antigo da fila; retorna seu diretório ou None."""
+    promote_deferred(float(getattr(settings, "IMAGES_STREAM_CLAIM_SECONDS", 30.0)))
+    queue, running = _spool("queue"), _spool("running")
+    for name in sorted(os.listdir(queue)):
+        try:
+            os.rename(queue / name, running / name)
+        except FileNotFoundError:
+            continue  # outro worker pegou antes
+        (running / name).write_text(str(os.getpid()))
+        job_id = name.split("-", 1)[-1]
+        base = job_dir(job_id)
+        if base is None:
+            (running / name).unlink(missing_ok=True)
+            continue
+        return base
+    return None
+
+def release(job_base: Path) -> None:
+    """Remove o marcador de execução do job."""
+    running = _spool("running")
+    for name in os.listdir(running):
+        if name.endswith(f"-{Path(job_base).name}"):
+            (running / name).unlink(missing_ok=True)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+def requeue_stale() -> int:
+    """
+    Devolve à fila jobs cujo worker morreu no meio da execução
+    (marcador em running/ com PID que não existe mais).
+    """
+    queue, running = _spool("queue"), _spool("running")
+    n = 0
+    for name in os.listdir(running):
+        marker = running / name
+        try:
+            pid = int(marker.read_text().strip() or 0)
+        except (OSError, ValueError):
+            pid = 0
+        if pid and _pid_alive(pid):
+            continue
+        try:
+            os.rename(marker, queue / name)
+            n += 1
+        except FileNotFoundError:
+            pass
+    return n
+
+
+# ================== Sinal de vida do worker ==================
+
+def _heartbeat_path() -> Path:
+    return _spool("workers") / "heartbeat"
+
+def heartbeat() -> None:
+    """Registra que há um images_worker vivo (chamado periodicamente por ele)."""
+    _heartbeat_path().touch()
+
+def worker_last_seen() -> Optional[float]:
+    """Horário (epoch) do último sinal de vida de algum worker, ou None."""
+    try:
+        return _heartbeat_path().stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+def worker_stale_seconds() -> float:
+    return float(getattr(settings, "IMAGES_WORKER_STALE_SECONDS", 60.0))
+
+def is_stranded(status: Dict[str, Any]) -> bool:
+    """
+    Job parado na fila sem worker: QUEUED há mais de IMAGES_WORKER_STALE_SECONDS
+    e nenhum worker deu sinal de vida nesse intervalo (worker não iniciado,
+    morto, ou sem acesso ao mesmo MEDIA_ROOT).
+    """
+    if status.get("state") != QUEUED:
+        return False
+    max_age = worker_stale_seconds()
+    now = time.time()
+    if now - float(status.get("updated_at") or now) < max_age:
+        return False
+    seen = worker_last_seen()
+    return seen is None or now - seen > max_age
+
+
+# ================== Execução ==================
+
+def result_cache():
+    """ResultCache configurado em settings.IMAGES_RESULT_CACHE (ou None)."""
+    from .cache import ResultCache
+
+    cfg = getattr(settings, "IMAGES_RESULT_CACHE", None) or {}
+    if not cfg.get("DIR"):
+        return None
+    return ResultCache(Path(cfg["DIR"]), max_bytes=int(cfg.get("MAX_BYTES", 512 * 1024 * 1024)))
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def memory_budget():
+    """MemoryBudget único do processo (settings.IMAGES_MEMORY)."""
+    global _budget
+    from .admission import MemoryBudget
+
+    with _budget_lock:
+        if _budget is None:
+            cfg = getattr(settings, "IMAGES_MEMORY", None) or {}
+            _budget = MemoryBudget(int(cfg.get("PROCESS_BUDGET_BYTES", 384 * 1024 * 1024)))
+        return _budget
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def metrics_sink():
+    """
+    Sink de métricas único do processo (settings.IMAGES_METRICS["SINKS"]):
+    "log", "prometheus", "db" ou caminho pontilhado de uma classe MetricsSink.
+    """
+    global _metrics
+    from django.utils.module_loading import import_string
+    from . import metrics
+
+    with _metrics_lock:
+        if _metrics is None:
+            cfg = getattr(settings, "IMAGES_METRICS", None) or {}
+            sinks = []
+            for name in cfg.get("SINKS", ()):
+                if name == "log":
+                    sinks.append(metrics.LoggingSink())
+                elif name == "prometheus":
+                    sinks.append(metrics.PrometheusSink(Path(cfg["DIR"])))
+                elif name == "db":
+                    from .history import DatabaseSink
+
+                    sinks.append(DatabaseSink())
+                else:
+                    sinks.append(import_string(name)())
+            _metrics = metrics.CompositeSink(sinks)
+        return _metrics
+
+def _converter_for(spec: Dict[str, Any]):
+    from .converter import DEFAULT_STRIP_MIN_PIXELS, ImagesConverter
+
+    options = dict(spec.get("options") or {})
+    if "background_rgb" in options:
+        options["background_rgb"] = tuple(options["background_rgb"])
+    return ImagesConverter(
+        **options,
+        workers=int(getattr(settings, "IMAGES_CONVERTER_WORKERS", 1)),
+        cache=result_cache(),
+        strip_min_pixels=getattr(settings, "IMAGES_STRIP_MIN_PIXELS", DEFAULT_STRIP_MIN_PIXELS),
+    )
+
+def _write_result(job_base: Path, batch, rejected: Sequence[Dict[str, Any]] = (), **extra: Any) -> Dict[str, Any]:
+    """Grava em status.json o resultado de um lote (DONE ou FAILED)."""
+    errors = [{"src": r["name"], "reason": r["reason"]} for r in rejected]
+    errors += [{"src": e.src.name, "reason": e.reason} for e in batch.errors]
+    if not batch.ok:
+        return write_status(
+            job_base,
+            state=FAILED,
+            label="Falha ao converter",
+            errors=errors or [{"reason": "Falha ao converter"}],
+            finished_at=time.time(),
+        )
+
+    return write_status(
+        job_base,
+        state=DONE,
+        progress=100,
+        label="Concluído",
+        converted=int(batch.converted),
+        fallback_count=int(batch.fallback_count),
+        cache_hits=int(batch.cache_hits),
+        duplicates=int(batch.duplicates),
+        timings_ms={k: round(v * 1000, 1) for k, v in batch.timings.items()},
+        errors=errors,
+        finished_at=time.time(),
+        **extra,
+    )
+
+def _upload_idle_seconds() -> float:
+    return float((getattr(settings, "IMAGES_UPLOAD", None) or {}).get("IDLE_SECONDS", 120))
+
+def _park_upload(job_base: Path, zip_path: Path) -> Dict[str, Any]:
+    """O upload parou no meio: descarta o ZIP parcial e devolve o job à espera."""
+    from . import uploads
+
+    zip_path.unlink(missing_ok=True)  # o que já converteu fica no cache de resultados
+    status = write_status(job_base, state=UPLOADING, progress=0, label="Aguardando o envio…")
+    uploads.park(job_base)
+    return status
+
+def run_job(job_base: Path) -> Dict[str, Any]:
+    """Executa um job já reivindicado e grava o resultado em status.json."""
+    from . import uploads
+    from .converter import zip_name_for
+
+    job_base = Path(job_base)
+    spec = read_spec(job_base)
+    if not spec:
+        return write_status(job_base, state=FAILED, label="Job inválido", errors=[{"reason": "job.json ausente ou corrompido"}])
+
+    write_status(job_base, state=RUNNING, progress=0, label="Iniciando…", started_at=time.time())
+    conv = _converter_for(spec)
+
+    def on_progress(pct: int, label: str) -> None:
+        write_status(job_base, progress=pct, label=label)
+
+    src_dir = job_base / "src"
+    if spec.get("upload"):
+        # upload em partes: converte cada arquivo assim que ele termina de chegar
+        src_files = uploads.arrivals(
+            job_base, idle_seconds=_upload_idle_seconds(),
+            poll_seconds=float(getattr(settings, "IMAGES_JOBS_POLL_SECONDS", 1.0)),
+        )
+        expected = len(spec.get("files", []))
+    else:
+        src_files, expected = [src_dir / name for name in spec.get("files", [])], None
+    # nome decidido uma vez: o mesmo caminho serve para limpar o ZIP parcial se o upload parar
+    zip_name = zip_name_for(spec["out_ext"])
+    try:
+        batch = conv.convert_batch_to_zip(
+            src_files=src_files,
+            expected=expected,
+            out_ext=spec["out_ext"],
+            work_dir=job_base,
+            zip_basename=zip_name,
+            progress=on_progress,
+            keep_outputs=False,  # mantemos só o ZIP final
+            memory_budget=memory_budget(),
+            costs=spec.get("costs"),
+            digests=spec.get("digests"),
+            metrics=metrics_sink(),
+        )
+    except uploads.UploadStalled as e:
+        logger.info("Job %s aguardando o upload: %s", job_base.name, e)
+        return _park_upload(job_base, job_base / zip_name)
+    except Exception as e:
+        logger.exception("Falha no job %s", job_base.name)
+        return write_status(job_base, state=FAILED, label="Falha ao converter", errors=[{"reason": str(e)}], finished_at=time.time())
+
+    rejected = uploads.rejected(job_base) if spec.get("upload") else []
+    if not batch.zip_path:
+        batch.ok = False
+        return _write_result(job_base, batch, rejected)
+    return _write_result(job_base, batch, rejected, zip_name=batch.zip_path.name)
+
+def stream_job(job_base: Path) -> Iterator[bytes]:
+    """
+    Converte um job reivindicado com `claim_deferred` produzindo o ZIP em
+    pedaços, para a resposta do download. O status.json recebe o progresso
+    como no worker; no fim o job fica DONE com `streamed=True` (não há ZIP
+    em disco). Se o gerador for fechado antes do fim (cliente desconectou)
+    ou falhar, o job volta para _jobs/deferred/.
+    """
+    job_base = Path(job_base)
+    spec = read_spec(job_base)
+    if not spec:
+        release(job_base)
+        write_status(job_base, state=FAILED, label="Job inválido", errors=[{"reason": "job.json ausente ou corrompido"}])
+        return
+
+    write_status(job_base, state=RUNNING, progress=0, label="Iniciando…", started_at=time.time())
+    conv = _converter_for(spec)
+    src_dir = job_base / "src"
+    finished = []
+
+    def on_progress(pct: int, label: str) -> None:
+        write_status(job_base, progress=pct, label=label)
+
+    try:
+        yield from conv.iter_zip(
+            [src_dir / name for name in spec.get("files", [])],
+            out_ext=spec["out_ext"],
+            progress=on_progress,
+            memory_budget=memory_budget(),
+            costs=spec.get("costs"),
+            digests=spec.get("digests"),
+            metrics=metrics_sink(),
+            on_finish=finished.append,
+        )
+    except Exception:
+        logger.exception("Falha no download em streaming do job %s", job_base.name)
+        defer(job_base)
+        raise
+    finally:
+        if not finished and (read_status(job_base) or {}).get("state") == RUNNING:
+            defer(job_base)  # GeneratorExit: cliente foi embora no meio
+    release(job_base)
+    _write_result(job_base, finished[0], streamed=True)
@@ -0,0 +1,116 @@
+# tools/images/management/commands/images_bench.py
+import itertools
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tools.images import bench
+from tools.images.converter import ENCODER_PRESETS, EXT_TO_PIL, QUANTIZERS
+
+
+def _size(value):
+    try:
+        w, h = value.lower().split("x")
+        return int(w), int(h)
+    except ValueError:
+        raise CommandError(f"Tamanho inválido: {value!r} (use LARGURAxALTURA, ex.: 1920x1080)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark do conversor de imagens em um corpus sintético: imagens/s, MP/s, "
+        "latência p50/p95 e pico de RSS por formato de saída, em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", help="Arquivo JSON de saída (padrão: só imprime o resumo).")
+        parser.add_argument("--compare", help="Relatório JSON anterior para comparar (ex.: do commit base).")
+        parser.add_argument(
+            "--corpus-dir",
+            help="Onde gerar/reaproveitar o corpus (padrão: diretório temporário do sistema).",
+        )
+        parser.add_argument(
+            "--sizes", nargs="+", type=_size, default=None,
+            help="Tamanhos do corpus, ex.: 640x480 1920x1080.",
+        )
+        parser.add_argument("--quick", action="store_true", help="Corpus pequeno, para rodar rápido.")
+        parser.add_argument(
+            "--targets", nargs="+", default=None,
+            help=f"Extensões de saída (padrão: todas de EXT_TO_PIL: {', '.join(EXT_TO_PIL)}).",
+        )
+        parser.add_argument(
+            "--cases", nargs="+", choices=bench.CASES, default=list(bench.CASES),
+            help="Quais medições rodar.",
+        )
+        parser.add_argument(
+            "--presets", nargs="+", choices=list(ENCODER_PRESETS), default=None,
+            help="Roda os casos uma vez por preset de esforço do encoder.",
+        )
+        parser.add_argument(
+            "--quantizers", nargs="+", choices=list(QUANTIZERS), default=None,
+            help="Roda os casos uma vez por backend de quantização (saídas GIF/XPM).",
+        )
+        parser.add_argument(
+            "--palette-sample", nargs="+", type=int, default=None, metavar="LADO",
+            help="Lados da cópia reduzida usada para calcular a paleta (0 = imagem inteira).",
+        )
+        parser.add_argument("--dither", action="store_true", help="Liga o dithering nas saídas com paleta.")
+        parser.add_argument("--repeat", type=int, default=1, help="Repetições do corpus em convert_one.")
+        parser.add_argument("--workers", type=int, default=1, help="Processos em convert_batch_to_zip.")
+
+    def handle(self, *args, **opts):
+        unknown = [t for t in opts["targets"] or [] if t not in EXT_TO_PIL]
+        if unknown:
+            raise CommandError(f"Extensões desconhecidas: {', '.join(unknown)}")
+
+        sizes = opts["sizes"] or (bench.QUICK_SIZES if opts["quick"] else bench.DEFAULT_SIZES)
+        corpus_dir = Path(opts["corpus_dir"] or Path(tempfile.gettempdir()) / "images-bench-corpus")
+
+        data = bench.run(
+            corpus_dir=corpus_dir,
+            sizes=sizes,
+            targets=opts["targets"],
+            repeat=max(1, opts["repeat"]),
+            workers=max(1, opts["workers"]),
+            cases=opts["cases"],
+            variants=self._variants(opts),
+            log=self.stdout.write,
+        )
+
+        if opts["out"]:
+            bench.dump(data, Path(opts["out"]))
+            self.stdout.write(self.style.SUCCESS(f"Relatório gravado em {opts['out']}"))
+
+        if opts["compare"]:
+            try:
+                old = json.loads(Path(opts["compare"]).read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Não foi possível ler {opts['compare']}: {e}")
+            self.stdout.write(f"\nComparação com {old.get('meta', {}).get('commit') or opts['compare']}:")
+            for line in bench.compare(old, data):
+                self.stdout.write(line)
+
+    @staticmethod
+    def _variants(opts):
+        """Produto cartesiano das opções com vários valores; rótulo "a/b/c"."""
+        axes = []
+        if opts["presets"]:
+            axes.append([(p, {"encoder_preset": p}) for p in opts["presets"]])
+        if opts["quantizers"]:
+            axes.append([(q, {"quantizer": q}) for q in opts["quantizers"]])
+        if opts["palette_sample"]:
+            axes.append([
+                (f"amostra-{side}" if side else "amostra-total", {"palette_sample_side": side or None})
+                for side in opts["palette_sample"]
+            ])
+        if not axes:
+            return {"": {"dither": True}} if opts["dither"] else None
+        variants = {}
+        for combo in itertools.product(*axes):
+            options = {"dither": opts["dither"]}
+            for _, o in combo:
+                options.update(o)
+            variants["/".join(label for label, _ in combo)] = options
+        return variants
@@ -0,0 +1,118 @@
+# tools/images/management/commands/images_boot_profile.py
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Roda num interpretador novo (o boot deste processo já aconteceu): o mesmo
+# caminho de um worker do gunicorn -- convert_all.asgi e depois as URLs --,
+# opcionalmente seguido do aquecimento do preload.
+_CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import convert_all.asgi
+t1 = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+t2 = time.perf_counter()
+stages = {"asgi": t1 - t0, "urls": t2 - t1}
+if WARM:
+    from tools.images.preload import warm_up
+    stages.update({"warm_up." + k: v for k, v in warm_up().items()})
+plugins = sorted(m[4:] for m in sys.modules if m.startswith("PIL.") and m.endswith("Plugin"))
+print(json.dumps({"stages": stages, "pil_plugins": plugins, "modules": len(sys.modules)}))
+"""
+
+
+def _run_child(warm: bool):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "convert_all.settings")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD.replace("WARM", repr(warm))],
+        cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise CommandError(f"Boot falhou:\n{proc.stderr[-2000:]}")
+    imports = {}
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except (IndexError, ValueError):
+            continue  # cabeçalho
+        imports[parts[2].strip()] = (self_us, cumulative_us)
+    return json.loads(proc.stdout.strip().splitlines()[-1]), imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Perfil de importação do boot de um worker web (python -X importtime): tempo por "
+        "etapa, módulos mais caros, tempo por pacote e plugins do Pillow carregados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3, help="Boots medidos (vale a mediana).")
+        parser.add_argument("--top", type=int, default=15, help="Quantos módulos listar.")
+        parser.add_argument(
+            "--warm", action="store_true",
+            help="Inclui o aquecimento do preload (tools.images.preload.warm_up).",
+        )
+        parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON.")
+
+    def handle(self, *args, **opts):
+        runs = [_run_child(opts["warm"]) for _ in range(max(1, opts["runs"]))]
+
+        stages = {
+            name: statistics.median(r[0]["stages"][name] for r in runs) * 1000
+            for name in runs[0][0]["stages"]
+        }
+        self_ms, cumulative_ms = defaultdict(list), defaultdict(list)
+        for _, imports in runs:
+            for name, (s, c) in imports.items():
+                self_ms[name].append(s / 1000)
+                cumulative_ms[name].append(c / 1000)
+        modules = sorted(
+            ({"module": name, "self_ms": statistics.median(self_ms[name]),
+              "cumulative_ms": statistics.median(cumulative_ms[name])} for name in self_ms),
+            key=lambda m: m["self_ms"], reverse=True,
+        )
+        packages = defaultdict(float)
+        for m in modules:
+            packages[m["module"].split(".")[0]] += m["self_ms"]
+
+        report = {
+            "runs": len(runs),
+            "stages_ms": {k: round(v, 1) for k, v in stages.items()},
+            "modules_loaded": runs[-1][0]["modules"],
+            "pil_plugins": runs[-1][0]["pil_plugins"],
+            "top_modules": [
+                {**m, "self_ms": round(m["self_ms"], 2), "cumulative_ms": round(m["cumulative_ms"], 2)}
+                for m in modules[:opts["top"]]
+            ],
+            "packages_ms": {
+                k: round(v, 1) for k, v in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:opts["top"]]
+            },
+        }
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+
+        w = self.stdout.write
+        w(f"Boot (mediana de {report['runs']}): " + "  ".join(f"{k} {v:.0f} ms" for k, v in report["stages_ms"].items()))
+        w(f"Módulos carregados: {report['modules_loaded']}  plugins do Pillow: "
+          + (", ".join(report["pil_plugins"]) or "nenhum"))
+        w("\nMódulos mais caros (self / cumulativo, ms):")
+        for m in report["top_modules"]:
+            w(f"  {m['self_ms']:8.2f} {m['cumulative_ms']:9.2f}  {m['module']}")
+        w("\nPor pacote (self, ms):")
+        for name, ms in report["packages_ms"].items():
+            w(f"  {ms:8.1f}  {name}")
@@ -0,0 +1,39 @@
+# tools/images/management/commands/images_cleanup.py
+from django.core.management.base import BaseCommand
+
+from tools.images import retention
+
+
+def _mb(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove diretórios de job expirados de MEDIA_ROOT/tmp_uploads "
+        "(TTL, jobs abandonados e limite de uso de disco; ver IMAGES_RETENTION)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria removido.")
+        parser.add_argument("--ttl", type=float, default=None, help="TTL (s) de jobs terminados.")
+        parser.add_argument(
+            "--high-water", type=int, default=None,
+            help="Limite (bytes) de tmp_uploads; acima dele os jobs terminados mais antigos saem antes do TTL.",
+        )
+
+    def handle(self, *args, **opts):
+        result = retention.sweep_from_settings(
+            dry_run=opts["dry_run"],
+            ttl_seconds=opts["ttl"],
+            high_water_bytes=opts["high_water"],
+        )
+        verb = "seriam removidos" if opts["dry_run"] else "removidos"
+        reasons = ", ".join(f"{k}: {v}" for k, v in sorted(result.by_reason.items())) or "nenhum"
+        self.stdout.write(
+            f"{result.scanned} job(s) verificados, {result.removed} {verb} ({reasons}), "
+            f"{_mb(result.reclaimed_bytes)} liberados; {result.kept_active} ativo(s) mantido(s). "
+            f"tmp_uploads: {_mb(result.total_bytes_before)} → {_mb(result.total_bytes_after)}."
+        )
+        for err in result.errors:
+            self.stderr.write(err)
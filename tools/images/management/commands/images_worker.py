@@ -0,0 +1,98 @@
+# tools/images/management/commands/images_worker.py
+import logging
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tools.images import jobs, retention
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Processa a fila local de conversões de imagens (tools.images.jobs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Processa os jobs pendentes e sai (útil em cron/testes).",
+        )
+        parser.add_argument(
+            "--poll", type=float, default=None,
+            help="Intervalo (s) entre verificações da fila vazia.",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=None,
+            help="Jobs simultâneos neste processo (limitados pelo orçamento de memória).",
+        )
+        parser.add_argument(
+            "--no-sweep", action="store_true",
+            help="Não roda a limpeza periódica de tmp_uploads neste worker.",
+        )
+
+    def handle(self, *args, **opts):
+        poll = opts["poll"] or float(getattr(settings, "IMAGES_JOBS_POLL_SECONDS", 1.0))
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            stopping.set()  # termina o job atual antes de sair
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        jobs.heartbeat()
+        n = jobs.requeue_stale()
+        if n:
+            self.stdout.write(f"{n} job(s) interrompido(s) devolvido(s) à fila.")
+
+        def loop():
+            while not stopping.is_set():
+                job_base = jobs.claim_next()
+                if job_base is None:
+                    if opts["once"]:
+                        break
+                    stopping.wait(poll)
+                    continue
+                try:
+                    status = jobs.run_job(job_base)
+                    self.stdout.write(f"Job {job_base.name}: {status.get('state')}")
+                finally:
+                    jobs.release(job_base)
+
+        def sweeper(interval):
+            # limpeza de tmp_uploads (TTL/high-water) ao lado da fila; a primeira já na partida
+            while not stopping.is_set():
+                try:
+                    r = retention.sweep_from_settings()
+                    if r.removed:
+                        self.stdout.write(f"Limpeza: {r.removed} job(s) removido(s), {r.reclaimed_bytes} bytes liberados.")
+                except Exception:
+                    logger.exception("Falha na limpeza de tmp_uploads")
+                stopping.wait(interval)
+
+        def beat(interval):
+            # sinal de vida em thread própria: um job longo não faz a fila parecer abandonada
+            while not stopping.wait(interval):
+                try:
+                    jobs.heartbeat()
+                except OSError:
+                    logger.exception("Falha ao registrar o sinal de vida do worker")
+
+        if not opts["once"]:
+            threading.Thread(target=beat, args=(jobs.worker_stale_seconds() / 4,), daemon=True).start()
+
+        interval = float((getattr(settings, "IMAGES_RETENTION", None) or {}).get("SWEEP_INTERVAL_SECONDS") or 0)
+        if interval > 0 and not opts["once"] and not opts["no_sweep"]:
+            threading.Thread(target=sweeper, args=(interval,), daemon=True).start()
+
+        # Jobs concorrentes dividem o mesmo MemoryBudget (jobs.memory_budget)
+        concurrency = max(1, opts["concurrency"] or int(getattr(settings, "IMAGES_JOBS_CONCURRENCY", 1)))
+        self.stdout.write(f"Worker de conversão iniciado ({concurrency} job(s) por vez).")
+        threads = [threading.Thread(target=loop, daemon=True) for _ in range(concurrency - 1)]
+        for t in threads:
+            t.start()
+        loop()
+        for t in threads:
+            t.join()
@@ -0,0 +1,258 @@
+# tools/images/metrics.py
+"""
+Métricas das conversões: tempos por etapa (ConvertResult.timings) e bytes,
+agregados por formato de origem e de destino.
+
+Sinks plugáveis, chamados por `convert_batch_to_zip(metrics=...)` ao fim de
+cada lote:
+
+    LoggingSink     uma linha estruturada por lote no logger "tools.images.metrics"
+                    (formatação/destino ficam a cargo de settings.LOGGING)
+    PrometheusSink  contadores acumulados no processo e gravados em
+                    <dir>/<host>-<pid>.json; `collect(dir)` soma os arquivos de
+                    todos os processos (worker, web) e `render_prometheus` os
+                    expõe no formato texto do Prometheus
+    DatabaseSink    (tools.images.history) ConversionJob + agregados por hora/dia,
+                    lidos por /api/conversions/stats
+
+Qualquer objeto com `observe_batch(batch, out_ext=...)` e
+`observe_sweep(result)` (limpeza de tools.images.retention) serve de sink.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .converter import BatchResult, ConvertResult
+    from .retention import SweepResult
+
+# (nome da métrica, labels ordenados) -> valor
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_HELP = {
+    "images_conversions_total": ("counter", "Arquivos convertidos, por formato e resultado (ok/fallback/error)."),
+    "images_cache_hits_total": ("counter", "Arquivos servidos do cache de resultados."),
+    "images_duplicates_total": ("counter", "Arquivos repetidos no lote, entregues sem converter de novo."),
+    "images_stage_seconds": ("summary", "Tempo por etapa da conversão (decode, transpose, resize, prepare, encode...)."),
+    "images_input_bytes_total": ("counter", "Bytes das origens."),
+    "images_output_bytes_total": ("counter", "Bytes gerados."),
+    "images_batches_total": ("counter", "Lotes processados, por formato de destino."),
+    "images_batch_seconds": ("summary", "Tempo de parede dos lotes (etapa total) e da compactação (etapa zip)."),
+    "images_zip_bytes_total": ("counter", "Bytes dos ZIPs gerados."),
+    "images_retention_sweeps_total": ("counter", "Varreduras de limpeza de tmp_uploads."),
+    "images_retention_removed_jobs_total": ("counter", "Diretórios de job removidos, por motivo (ttl/abandoned/high_water)."),
+    "images_retention_reclaimed_bytes_total": ("counter", "Bytes liberados pela limpeza, por motivo."),
+    "images_retention_seconds": ("summary", "Duração das varreduras de limpeza."),
+}
+
+
+def _outcome(r: "ConvertResult") -> str:
+    if not r.ok:
+        return "error"
+    return "fallback" if r.fallback_used else "ok"
+
+
+def format_label(value: Optional[str]) -> str:
+    """Rótulo de formato das métricas e do histórico (None -> "UNKNOWN")."""
+    return (value or "unknown").upper()
+
+
+class MetricsSink:
+    """Base: repassa cada arquivo do lote para `observe`."""
+
+    def observe(self, result: "ConvertResult", *, out_ext: str) -> None:
+        pass
+
+    def observe_batch(self, batch: "BatchResult", *, out_ext: str) -> None:
+        for r in batch.results:
+            self.observe(r, out_ext=out_ext)
+
+    def observe_sweep(self, result: "SweepResult") -> None:
+        pass
+
+
+class CompositeSink(MetricsSink):
+    def __init__(self, sinks: Sequence[MetricsSink]) -> None:
+        self.sinks = list(sinks)
+
+    def observe_batch(self, batch: "BatchResult", *, out_ext: str) -> None:
+        for sink in self.sinks:
+            sink.observe_batch(batch, out_ext=out_ext)
+
+    def observe_sweep(self, result: "SweepResult") -> None:
+        for sink in self.sinks:
+            sink.observe_sweep(result)
+
+
+class LoggingSink(MetricsSink):
+    """
+    Uma linha por lote (JSON no `extra["metrics"]` e na mensagem), e uma por
+    arquivo em DEBUG.
+    """
+    def __init__(self, logger: Optional[logging.Logger] = None) -> None:
+        self.logger = logger or logging.getLogger("tools.images.metrics")
+
+    def observe(self, result: "ConvertResult", *, out_ext: str) -> None:
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        payload = {
+            "event": "image_converted",
+            "src": result.src.name,
+            "src_format": result.src_format,
+            "dst_format": result.dst_format,
+            "out_ext": out_ext,
+            "outcome": _outcome(result),
+            "cache_hit": result.cache_hit,
+            "src_bytes": result.src_bytes,
+            "out_bytes": result.out_bytes,
+            "timings_ms": {k: round(v * 1000, 2) for k, v in result.timings.items()},
+        }
+        self.logger.debug(json.dumps(payload, ensure_ascii=False), extra={"metrics": payload})
+
+    def observe_batch(self, batch: "BatchResult", *, out_ext: str) -> None:
+        super().observe_batch(batch, out_ext=out_ext)
+        payload = {
+            "event": "batch_converted",
+            "out_ext": out_ext,
+            "files": len(batch.results),
+            "converted": batch.converted,
+            "fallbacks": batch.fallback_count,
+            "errors": len(batch.errors),
+            "cache_hits": batch.cache_hits,
+            "duplicates": batch.duplicates,
+            "dedup_saved_ms": round(batch.dedup_saved_seconds * 1000, 2),
+            "src_bytes": batch.src_bytes,
+            "out_bytes": batch.out_bytes,
+            "zip_bytes": batch.zip_bytes,
+            "timings_ms": {k: round(v * 1000, 2) for k, v in batch.timings.items()},
+        }
+        self.logger.info(json.dumps(payload, ensure_ascii=False), extra={"metrics": payload})
+
+    def observe_sweep(self, result: "SweepResult") -> None:
+        payload = {
+            "event": "retention_sweep",
+            "scanned": result.scanned,
+            "removed": result.removed,
+            "reclaimed_bytes": result.reclaimed_bytes,
+            "kept_active": result.kept_active,
+            "total_bytes_after": result.total_bytes_after,
+            "by_reason": result.by_reason,
+            "errors": len(result.errors),
+            "ms": round(result.seconds * 1000, 1),
+        }
+        level = logging.INFO if result.removed or result.errors else logging.DEBUG
+        self.logger.log(level, json.dumps(payload, ensure_ascii=False), extra={"metrics": payload})
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Contadores do processo, persistidos em `<dir>/<host>-<pid>.json` a cada lote.
+    Os arquivos de processos encerrados ficam (contadores são acumulados).
+    """
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self._values: Dict[_Key, float] = {}
+        self._lock = threading.Lock()
+
+    def _inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self._values[key] = self._values.get(key, 0.0) + value
+
+    def observe(self, result: "ConvertResult", *, out_ext: str) -> None:
+        lbl = {"src_format": format_label(result.src_format), "dst_format": format_label(result.dst_format)}
+        self._inc("images_conversions_total", outcome=_outcome(result), **lbl)
+        if result.cache_hit:
+            self._inc("images_cache_hits_total", **lbl)
+        if result.duplicate_of is not None:
+            self._inc("images_duplicates_total", **lbl)
+        for stage, secs in result.timings.items():
+            self._inc("images_stage_seconds_sum", secs, stage=stage, **lbl)
+            self._inc("images_stage_seconds_count", 1, stage=stage, **lbl)
+        self._inc("images_input_bytes_total", result.src_bytes, **lbl)
+        self._inc("images_output_bytes_total", result.out_bytes, **lbl)
+
+    def observe_batch(self, batch: "BatchResult", *, out_ext: str) -> None:
+        with self._lock:
+            super().observe_batch(batch, out_ext=out_ext)
+            lbl = {"out_ext": out_ext, "ok": str(batch.ok).lower()}
+            self._inc("images_batches_total", **lbl)
+            for stage in ("total", "zip"):
+                if stage in batch.timings:
+                    self._inc("images_batch_seconds_sum", batch.timings[stage], stage=stage, out_ext=out_ext)
+                    self._inc("images_batch_seconds_count", 1, stage=stage, out_ext=out_ext)
+            self._inc("images_zip_bytes_total", batch.zip_bytes, out_ext=out_ext)
+            self._flush()
+
+    def observe_sweep(self, result: "SweepResult") -> None:
+        with self._lock:
+            self._inc("images_retention_sweeps_total")
+            self._inc("images_retention_seconds_sum", result.seconds)
+            self._inc("images_retention_seconds_count", 1)
+            for reason, n in result.by_reason.items():
+                self._inc("images_retention_removed_jobs_total", n, reason=reason)
+                self._inc("images_retention_reclaimed_bytes_total", result.reclaimed_by_reason.get(reason, 0), reason=reason)
+            self._flush()
+
+    def _flush(self) -> None:
+        rows = [[name, dict(labels), value] for (name, labels), value in self._values.items()]
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{socket.gethostname()}-{os.getpid()}.json"
+            tmp = path.with_name(f".{path.name}.tmp")
+            tmp.write_text(json.dumps(rows), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            pass  # métrica perdida não derruba a conversão
+
+
+# ------------------------------ Exposição ------------------------------
+def collect(directory: Path) -> Dict[_Key, float]:
+    """Soma os contadores gravados por todos os processos."""
+    total: Dict[_Key, float] = {}
+    directory = Path(directory)
+    if not directory.is_dir():
+        return total
+    for f in directory.glob("*.json"):
+        try:
+            rows = json.loads(f.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in rows:
+            key = (name, tuple(sorted(labels.items())))
+            total[key] = total.get(key, 0.0) + float(value)
+    return total
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _family(name: str) -> str:
+    for suffix in ("_sum", "_count"):
+        if name.endswith(suffix) and name[: -len(suffix)] in _HELP:
+            return name[: -len(suffix)]
+    return name
+
+
+def render_prometheus(values: Dict[_Key, float]) -> str:
+    """Formato texto de exposição do Prometheus (0.0.4)."""
+    lines: List[str] = []
+    by_family: Dict[str, List[Tuple[_Key, float]]] = {}
+    for key, value in values.items():
+        by_family.setdefault(_family(key[0]), []).append((key, value))
+    for family in sorted(by_family):
+        kind, help_text = _HELP.get(family, ("untyped", ""))
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for (name, labels), value in sorted(by_family[family]):
+            lbl = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            num = str(int(value)) if float(value).is_integer() else repr(value)
+            lines.append(f"{name}{{{lbl}}} {num}" if lbl else f"{name} {num}")
+    return "\n".join(lines) + "\n"
+
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_alter_imageformat_file_extension'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finished_at', models.DateTimeField(db_index=True)),
+                ('out_ext', models.CharField(max_length=60)),
+                ('src_formats', models.CharField(blank=True, max_length=120)),
+                ('dst_formats', models.CharField(blank=True, max_length=120)),
+                ('ok', models.BooleanField(default=True)),
+                ('files', models.PositiveIntegerField(default=0)),
+                ('converted', models.PositiveIntegerField(default=0)),
+                ('fallback_count', models.PositiveIntegerField(default=0)),
+                ('errors', models.PositiveIntegerField(default=0)),
+                ('cache_hits', models.PositiveIntegerField(default=0)),
+                ('src_bytes', models.PositiveBigIntegerField(default=0)),
+                ('out_bytes', models.PositiveBigIntegerField(default=0)),
+                ('zip_bytes', models.PositiveBigIntegerField(default=0)),
+                ('timings_ms', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'verbose_name': 'Conversão',
+                'verbose_name_plural': 'Conversões',
+                'ordering': ['-finished_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ConversionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('hour', 'Hora'), ('day', 'Dia'), ('all', 'Total')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('src_format', models.CharField(blank=True, max_length=16)),
+                ('dst_format', models.CharField(blank=True, max_length=16)),
+                ('jobs', models.PositiveIntegerField(default=0)),
+                ('files', models.PositiveBigIntegerField(default=0)),
+                ('converted', models.PositiveBigIntegerField(default=0)),
+                ('fallback_count', models.PositiveBigIntegerField(default=0)),
+                ('errors', models.PositiveBigIntegerField(default=0)),
+                ('cache_hits', models.PositiveBigIntegerField(default=0)),
+                ('src_bytes', models.PositiveBigIntegerField(default=0)),
+                ('out_bytes', models.PositiveBigIntegerField(default=0)),
+                ('seconds', models.FloatField(default=0.0)),
+            ],
+            options={
+                'verbose_name': 'Agregado de conversões',
+                'verbose_name_plural': 'Agregados de conversões',
+                'indexes': [models.Index(fields=['period', 'dst_format', 'bucket'], name='images_rollup_dst')],
+                'constraints': [models.UniqueConstraint(fields=('period', 'bucket', 'src_format', 'dst_format'), name='images_rollup_key')],
+            },
+        ),
+    ]
@@ -12,3 +12,60 @@ class ImageFormat(models.Model):
         verbose_name_plural = "Formatos de Imagem"
 
 
+class ConversionJob(models.Model):
+    """Um lote convertido (gravado ao fim de convert_batch_to_zip; ver tools.images.history)."""
+    finished_at = models.DateTimeField(db_index=True)
+    out_ext = models.CharField(max_length=60)  # alvo pedido, ex.: "jpeg" ou "png+webp"
+    src_formats = models.CharField(max_length=120, blank=True)  # formatos de origem, ex.: "JPEG,PNG"
+    dst_formats = models.CharField(max_length=120, blank=True)
+    ok = models.BooleanField(default=True)
+    files = models.PositiveIntegerField(default=0)
+    converted = models.PositiveIntegerField(default=0)
+    fallback_count = models.PositiveIntegerField(default=0)
+    errors = models.PositiveIntegerField(default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    src_bytes = models.PositiveBigIntegerField(default=0)
+    out_bytes = models.PositiveBigIntegerField(default=0)
+    zip_bytes = models.PositiveBigIntegerField(default=0)
+    timings_ms = models.JSONField(default=dict, blank=True)  # etapa -> ms somados do lote, + "total"/"zip"
+
+    class Meta:
+        verbose_name = "Conversão"
+        verbose_name_plural = "Conversões"
+        ordering = ["-finished_at"]
+
+
+class ConversionRollup(models.Model):
+    """
+    Contadores pré-agregados por período (hora, dia, desde sempre) e par de
+    formatos; "" num formato soma todos. As estatísticas leem algumas linhas
+    daqui em vez de varrer ConversionJob.
+    """
+    HOUR, DAY, ALL = "hour", "day", "all"
+    PERIODS = [(HOUR, "Hora"), (DAY, "Dia"), (ALL, "Total")]
+
+    period = models.CharField(max_length=4, choices=PERIODS)
+    bucket = models.DateTimeField()  # início da hora/dia; ALL usa uma data fixa
+    src_format = models.CharField(max_length=16, blank=True)
+    dst_format = models.CharField(max_length=16, blank=True)
+    jobs = models.PositiveIntegerField(default=0)
+    files = models.PositiveBigIntegerField(default=0)
+    converted = models.PositiveBigIntegerField(default=0)
+    fallback_count = models.PositiveBigIntegerField(default=0)
+    errors = models.PositiveBigIntegerField(default=0)
+    cache_hits = models.PositiveBigIntegerField(default=0)
+    src_bytes = models.PositiveBigIntegerField(default=0)
+    out_bytes = models.PositiveBigIntegerField(default=0)
+    seconds = models.FloatField(default=0.0)  # soma das etapas dos arquivos
+
+    class Meta:
+        verbose_name = "Agregado de conversões"
+        verbose_name_plural = "Agregados de conversões"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "bucket", "src_format", "dst_format"], name="images_rollup_key",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["period", "dst_format", "bucket"], name="images_rollup_dst"),
+        ]
@@ -0,0 +1,37 @@
+# tools/images/preload.py
+"""
+Aquecimento do processo do servidor web.
+
+As URLs não importam o conversor nem o Pillow (ver views); quem paga por
+eles é a primeira conversão de cada worker. `warm_up()` antecipa esse custo:
+carrega as URLs, o conversor, o controle de admissão e só os plugins do
+Pillow dos formatos de EXT_TO_PIL. Chamado pelo gunicorn.conf.py no mestre,
+antes do fork (preload), os workers herdam tudo copy-on-write; sem preload,
+cada worker aquece ao iniciar.
+
+Não toca no banco: uma conexão aberta no mestre seria compartilhada pelos
+workers depois do fork.
+"""
+from __future__ import annotations
+
+import time
+from typing import Dict
+
+
+def warm_up() -> Dict[str, float]:
+    """Importa o que a primeira requisição importaria. Devolve etapa -> segundos."""
+    from django.urls import get_resolver
+
+    timings: Dict[str, float] = {}
+    t0 = time.perf_counter()
+    get_resolver().url_patterns
+    t1 = time.perf_counter()
+    timings["urls"] = t1 - t0
+
+    from . import admission, converter  # noqa: F401
+
+    t2 = time.perf_counter()
+    timings["converter"] = t2 - t1
+    converter.load_plugins()
+    timings["plugins"] = time.perf_counter() - t2
+    return timings
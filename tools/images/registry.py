@@ -0,0 +1,116 @@
+# tools/images/registry.py
+"""
+Registro dos formatos de saída: linhas de ImageFormat + EXT_TO_PIL + o que
+o Pillow deste ambiente realmente abre/grava, montado na primeira consulta
+e mantido em memória no processo.
+
+Serve o <select> do template, as choices do formulário e a validação de
+/processar/ com uma só consulta ao banco por processo. Salvar/apagar um
+ImageFormat invalida o cache (sinais ligados em ImagesConfig.ready); os
+demais processos (workers do servidor) recarregam em até
+IMAGES_FORMAT_REGISTRY_TTL_SECONDS.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+
+_DEFAULT_TTL_SECONDS = 300.0
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    value: str              # valor de out_ext / <option value> (ex.: "jpeg", "tga")
+    acronym: str            # como no banco (ex.: "JPEG", "TGA (TPIC)")
+    file_extension: str
+    format_name: str
+    description: str
+    pil_format: Optional[str] = None  # EXT_TO_PIL[value]
+    can_open: bool = False
+    can_save: bool = False
+
+    @property
+    def writable(self) -> bool:
+        """Sai no próprio formato (sem fallback PNG)."""
+        return self.can_save
+
+
+_lock = threading.Lock()
+_cache: Optional[Tuple[float, Tuple[OutputFormat, ...]]] = None  # (expira em, formatos)
+
+
+def _value_for(acronym: str, file_extension: str, known: Any) -> str:
+    # A sigla em minúsculas é o valor histórico do <select>; siglas como
+    # "TGA (TPIC)" caem na primeira extensão conhecida (".tga").
+    value = acronym.strip().lower()
+    if value in known:
+        return value
+    for ext in file_extension.replace(";", ",").split(","):
+        ext = ext.strip().lower().lstrip(".")
+        if ext in known:
+            return ext
+    return value
+
+
+def _build() -> Tuple[OutputFormat, ...]:
+    from .converter import EXT_TO_PIL, pil_can_open, pil_can_save
+    from .models import ImageFormat
+
+    out: List[OutputFormat] = []
+    seen = set()
+    for row in ImageFormat.objects.all().order_by("acronym"):
+        value = _value_for(row.acronym, row.file_extension, EXT_TO_PIL)
+        if value in seen:
+            continue
+        seen.add(value)
+        pil_fmt = EXT_TO_PIL.get(value)
+        out.append(OutputFormat(
+            value=value,
+            acronym=row.acronym,
+            file_extension=row.file_extension,
+            format_name=row.format_name,
+            description=row.description,
+            pil_format=pil_fmt,
+            can_open=pil_can_open(pil_fmt),
+            can_save=pil_can_save(pil_fmt),
+        ))
+    return tuple(out)
+
+
+def all_formats() -> Tuple[OutputFormat, ...]:
+    """Todos os formatos cadastrados, com as capacidades do Pillow (cache do processo)."""
+    global _cache
+    now = time.monotonic()
+    cached = _cache
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    with _lock:
+        if _cache is None or _cache[0] <= now:
+            ttl = float(getattr(settings, "IMAGES_FORMAT_REGISTRY_TTL_SECONDS", _DEFAULT_TTL_SECONDS))
+            _cache = (now + ttl, _build())
+        return _cache[1]
+
+
+def output_formats() -> Tuple[OutputFormat, ...]:
+    """Só os que o conversor grava de fato (os demais virariam PNG)."""
+    return tuple(f for f in all_formats() if f.writable)
+
+
+def choices() -> List[Tuple[str, str]]:
+    return [(f.value, f.acronym.upper()) for f in output_formats()]
+
+
+def get(value: str) -> Optional[OutputFormat]:
+    value = (value or "").strip().lower().lstrip(".")
+    return next((f for f in all_formats() if f.value == value), None)
+
+
+def invalidate(*args: Any, **kwargs: Any) -> None:
+    """Descarta o cache (receptor de post_save/post_delete do ImageFormat)."""
+    global _cache
+    with _lock:
+        _cache = None
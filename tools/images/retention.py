@@ -0,0 +1,211 @@
+# tools/images/retention.py
+"""
+Retenção dos diretórios de job em MEDIA_ROOT/tmp_uploads/<job_id>/.
+
+Cada job guarda os uploads (src/) e o ZIP até o usuário baixar; sem limpeza
+isso cresce sem fim (bytes e inodes). `sweep()` remove, em lote:
+
+    ttl         jobs terminados (done/failed) há mais de `ttl_seconds`
+    abandoned   jobs "ativos" (queued/running/sem status) parados há mais de
+                `active_max_age_seconds` (worker morto, upload interrompido)
+    high_water  se tmp_uploads passar de `high_water_bytes` ou o disco passar
+                de `disk_high_water_percent`, os jobs terminados mais antigos
+                saem mesmo antes do TTL, até `low_water_ratio` do limite
+
+Jobs na fila ou em execução nunca são removidos por TTL/high_water.
+Cada diretório é primeiro renomeado para `.trash-<job_id>` (atômico): quem
+consultar o job durante a remoção vê "não encontrado", nunca meio apagado.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+_TRASH_PREFIX = ".trash-"
+
+
+@dataclass
+class JobEntry:
+    path: Path
+    state: Optional[str]
+    last_activity: float  # epoch: fim do job, última atualização ou mtime do diretório
+    size_bytes: int
+
+    @property
+    def active(self) -> bool:
+        return self.state not in (jobs.DONE, jobs.FAILED)
+
+
+@dataclass
+class SweepResult:
+    scanned: int = 0
+    removed: int = 0
+    reclaimed_bytes: int = 0
+    kept_active: int = 0
+    total_bytes_before: int = 0
+    total_bytes_after: int = 0
+    by_reason: Dict[str, int] = field(default_factory=dict)          # motivo -> jobs removidos
+    reclaimed_by_reason: Dict[str, int] = field(default_factory=dict)  # motivo -> bytes
+    errors: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False):
+                            stack.append(Path(e.path))
+                        else:
+                            total += e.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def scan(root: Path) -> List[JobEntry]:
+    """Lista os diretórios de job em `root` (ignora lixo de remoções anteriores)."""
+    entries: List[JobEntry] = []
+    try:
+        it = os.scandir(root)
+    except FileNotFoundError:
+        return entries
+    with it:
+        for e in it:
+            if e.name.startswith(".") or not e.is_dir(follow_symlinks=False):
+                continue
+            path = Path(e.path)
+            status = jobs.read_status(path) or {}
+            try:
+                mtime = e.stat(follow_symlinks=False).st_mtime
+            except OSError:
+                continue
+            last = status.get("finished_at") or status.get("updated_at") or mtime
+            entries.append(JobEntry(path=path, state=status.get("state"), last_activity=float(last), size_bytes=_dir_size(path)))
+    return entries
+
+
+def _remove(entry: JobEntry) -> None:
+    trash = entry.path.with_name(_TRASH_PREFIX + entry.path.name)
+    os.rename(entry.path, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def _purge_trash(root: Path) -> None:
+    """Restos de remoções interrompidas (processo morto no meio do rmtree)."""
+    try:
+        names = [n for n in os.listdir(root) if n.startswith(_TRASH_PREFIX)]
+    except FileNotFoundError:
+        return
+    for name in names:
+        shutil.rmtree(root / name, ignore_errors=True)
+
+
+def _disk_percent(root: Path) -> float:
+    usage = shutil.disk_usage(root)
+    return usage.used / usage.total * 100 if usage.total else 0.0
+
+
+def sweep(
+    root: Path,
+    *,
+    ttl_seconds: float,
+    active_max_age_seconds: Optional[float] = None,
+    high_water_bytes: Optional[int] = None,
+    disk_high_water_percent: Optional[float] = None,
+    low_water_ratio: float = 0.8,
+    dry_run: bool = False,
+    now: Optional[float] = None,
+) -> SweepResult:
+    started = time.perf_counter()
+    root = Path(root)
+    now = time.time() if now is None else now
+    result = SweepResult()
+    if not dry_run:
+        _purge_trash(root)
+
+    entries = scan(root)
+    result.scanned = len(entries)
+    total = result.total_bytes_before = sum(e.size_bytes for e in entries)
+
+    def drop(entry: JobEntry, reason: str) -> bool:
+        nonlocal total
+        try:
+            if not dry_run:
+                _remove(entry)
+        except FileNotFoundError:
+            return False  # removido por outro processo
+        except OSError as e:
+            result.errors.append(f"{entry.path.name}: {e}")
+            return False
+        total -= entry.size_bytes
+        result.removed += 1
+        result.reclaimed_bytes += entry.size_bytes
+        result.by_reason[reason] = result.by_reason.get(reason, 0) + 1
+        result.reclaimed_by_reason[reason] = result.reclaimed_by_reason.get(reason, 0) + entry.size_bytes
+        return True
+
+    finished: List[JobEntry] = []
+    for entry in entries:
+        age = now - entry.last_activity
+        if entry.active:
+            if active_max_age_seconds and age > active_max_age_seconds:
+                drop(entry, "abandoned")
+            else:
+                result.kept_active += 1
+        elif age > ttl_seconds:
+            drop(entry, "ttl")
+        else:
+            finished.append(entry)
+
+    # High-water: remove os terminados mais antigos até voltar ao low-water
+    def over(ratio: float) -> bool:
+        if high_water_bytes and total > high_water_bytes * ratio:
+            return True
+        if disk_high_water_percent and not dry_run:
+            return _disk_percent(root) > disk_high_water_percent * ratio
+        return False
+
+    if over(1.0):
+        for entry in sorted(finished, key=lambda e: e.last_activity):
+            if not over(low_water_ratio):
+                break
+            drop(entry, "high_water")
+
+    result.total_bytes_after = total
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def sweep_from_settings(*, dry_run: bool = False, **overrides) -> SweepResult:
+    """`sweep()` em jobs_root() com settings.IMAGES_RETENTION (+ overrides)."""
+    from django.conf import settings
+
+    cfg = dict(getattr(settings, "IMAGES_RETENTION", None) or {})
+    params = dict(
+        ttl_seconds=float(cfg.get("TTL_SECONDS", 6 * 3600)),
+        active_max_age_seconds=cfg.get("ACTIVE_MAX_AGE_SECONDS"),
+        high_water_bytes=cfg.get("HIGH_WATER_BYTES"),
+        disk_high_water_percent=cfg.get("DISK_HIGH_WATER_PERCENT"),
+        low_water_ratio=float(cfg.get("LOW_WATER_RATIO", 0.8)),
+    )
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    result = sweep(jobs.jobs_root(), dry_run=dry_run, **params)
+    if not dry_run:
+        jobs.metrics_sink().observe_sweep(result)
+    return result
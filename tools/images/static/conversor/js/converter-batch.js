@@ -1,6 +1,8 @@
 /* conversor/js/converter-batch.js (backend/Pillow + limites + modal via styles.css)
- * - Barra de progresso (0–80 conversão, 80–100 compactação)
- * - Conversão no servidor em /processar/
+ * - Barra de progresso (0–60 envio, 60–80 conversão real do job, 80–100 download)
+ * - Conversão no servidor: /processar/ enfileira; andamento via SSE (/jobs/<id>/eventos/) ou polling
+ * - Lotes grandes (>= CT_CHUNKED_MIN_BYTES) vão em partes por /envios/: retomáveis
+ *   (inclusive depois de recarregar a página) e convertidos enquanto o resto chega
  * - Pré-checagem de limites (arquivos e bytes)
  * - Tratamento 413 e 400 (incl. TooManyFilesSent) com popup elegante
  */
@@ -24,6 +26,10 @@
   const LIMIT_BYTES = Number(window.CT_LIMIT_BYTES || 0) || 0;  // 0 = ilimitado
   const LIMIT_FILES = Number(window.CT_LIMIT_FILES || 0) || 0;  // 0 = ilimitado
   const UPGRADE_URL = String(window.CT_UPGRADE_URL || '/premium');
+  const UPLOAD_URL  = window.CT_UPLOAD_URL || '';                           // upload em partes
+  const CHUNKED_MIN_BYTES = Number(window.CT_CHUNKED_MIN_BYTES || 0) || 0;  // 0 = sempre em partes
+  const UPLOAD_PARALLEL = 3;                                                // arquivos enviados ao mesmo tempo
+  const RESUME_KEY = 'ct:upload';
 
   // ===== Popup (usa classes definidas em styles.css)
   function buildPopup({ title='Aviso', html='', showCta=false, ctaUrl=UPGRADE_URL } = {}){
@@ -217,6 +223,24 @@
       const raw  = xhr.responseText || '';
       const rawLower = raw.toLowerCase();
 
+      // 413 -> resolução grande demais (orçamento de memória de pixels)
+      if (status === 413 && data && (data.code === 'IMAGE_TOO_LARGE' || data.code === 'BATCH_TOO_LARGE')) {
+        const items = (data.files || []).map(f => `<li><strong>${f.name}</strong> (${f.width}×${f.height} px)</li>`);
+        showErrorModal('Imagem grande demais',
+          `<p>${data.message || 'A resolução das imagens excede o limite de memória do conversor.'}</p>${items.length ? `<ul>${items.join('')}</ul>` : ''}`);
+        onDone && onDone({ ok:false }, status);
+        return;
+      }
+
+      // 415 -> arquivos que não são imagem / corrompidos (cabeçalho ilegível)
+      if (status === 415) {
+        const names = ((data && data.files) || []).map(f => `<li>${String(f.name).replace(/[&<>"']/g, '')}</li>`);
+        showErrorModal('Arquivos inválidos',
+          `<p>${(data && data.message) || 'Alguns arquivos não são imagens válidas.'}</p>${names.length ? `<ul>${names.join('')}</ul>` : ''}<p>Remova-os da lista e tente novamente.</p>`);
+        onDone && onDone({ ok:false }, status);
+        return;
+      }
+
       // 413 -> limite de bytes (plano)
       if (status === 413) {
         const allowed = (data && +data.allowed_bytes) || LIMIT_BYTES;
@@ -292,6 +316,176 @@
     });
   }
 
+  // ===== Job assíncrono: /processar/ só enfileira; o progresso vem de /jobs/<id>/
+  function sleep(ms){ return new Promise(r => setTimeout(r, ms)); }
+
+  async function pollJob(statusUrl, onTick){
+    let failures = 0;
+    for (;;){
+      let data = null;
+      try{
+        const r = await fetch(statusUrl, { credentials:'same-origin', headers:{ 'Accept':'application/json' } });
+        data = await r.json();
+        failures = 0;
+      }catch(err){
+        if (++failures >= 5) throw new Error('Falha ao consultar o andamento da conversão');
+      }
+      if (data){
+        if (typeof onTick === 'function') onTick(data);
+        if (data.state === 'done' || data.state === 'failed') return data;
+        if (data.code === 'JOB_NOT_FOUND') throw new Error(data.message || 'Job não encontrado');
+      }
+      await sleep(1000);
+    }
+  }
+
+  // SSE (/jobs/<id>/eventos/) com progresso real por arquivo; se o navegador
+  // não suportar ou a conexão cair antes do fim, volta para o polling.
+  function watchJob(job, onTick){
+    if (!window.EventSource || !job.events_url) return pollJob(job.status_url, onTick);
+    return new Promise((resolve, reject) => {
+      const es = new EventSource(job.events_url);
+      let finished = false;
+      es.addEventListener('progress', (ev) => {
+        try{ onTick(JSON.parse(ev.data)); }catch{}
+      });
+      es.addEventListener('end', (ev) => {
+        finished = true; es.close();
+        try{ const data = JSON.parse(ev.data); onTick(data); resolve(data); }
+        catch(err){ reject(err); }
+      });
+      es.addEventListener('error', () => {
+        if (finished) return;
+        es.close();
+        pollJob(job.status_url, onTick).then(resolve, reject);
+      });
+    });
+  }
+
+  // ===== Upload em partes (/envios/): init -> PUT de cada pedaço com Upload-Offset -> finalizar
+  function batchSignature(files, fmts){
+    return files.map(f => `${f.name}:${f.size}:${f.lastModified || 0}`).join('|') + '>' + fmts.join('+');
+  }
+
+  function loadResume(sig){
+    try{
+      const saved = JSON.parse(localStorage.getItem(RESUME_KEY) || 'null');
+      return saved && saved.sig === sig ? saved : null;
+    }catch{ return null; }
+  }
+  function saveResume(entry){ try{ localStorage.setItem(RESUME_KEY, JSON.stringify(entry)); }catch{} }
+  function clearResume(){ try{ localStorage.removeItem(RESUME_KEY); }catch{} }
+
+  async function fetchJSON(url, opts = {}){
+    const headers = { 'Accept':'application/json', 'X-Requested-With':'XMLHttpRequest', ...(opts.headers || {}) };
+    const csrf = getCsrfToken(); if (csrf && opts.method && opts.method !== 'GET') headers['X-CSRFToken'] = csrf;
+    const r = await fetch(url, { credentials:'same-origin', ...opts, headers });
+    let data = null; try{ data = await r.json(); }catch{}
+    return { status: r.status, data };
+  }
+
+  // Abre o envio com os mesmos campos de /processar/ (erros de limite/formulário viram popup)
+  function initUpload(files, fmts){
+    const fd = new FormData();
+    const csrf = getCsrfToken(); if (csrf) fd.append('csrfmiddlewaretoken', csrf);
+    fmts.forEach(f => fd.append('out_ext', f));
+    files.forEach(f => { fd.append('nomes', f.name); fd.append('tamanhos', String(f.size || 0)); });
+    return new Promise((resolve, reject) => {
+      postWithProgress(UPLOAD_URL, fd, null, (data) => resolve(data), ({ data, raw, error }) => {
+        reject(Object.assign(error || new Error('Falha ao iniciar o envio'), { data, raw }));
+      });
+    });
+  }
+
+  // Envio já aberto para este mesmo lote (ex.: página recarregada no meio)?
+  async function resumeUpload(sig){
+    const saved = loadResume(sig);
+    if (!saved) return null;
+    try{
+      const { status, data } = await fetchJSON(saved.upload_url);
+      if (status === 200 && data && data.ok && !data.finalized) return data;
+    }catch{}
+    clearResume();
+    return null;
+  }
+
+  // Manda o que falta de um arquivo a partir do offset conhecido; falhas consultam o
+  // servidor (GET upload_url) e continuam de onde ele parou.
+  async function sendFile(upload, file, entry, onBytes){
+    let offset = Number(entry.offset || 0), tries = 0;
+    const url = `${upload.upload_url}${entry.index}/`;
+    const moveTo = (next) => { onBytes(next - offset); offset = next; };
+    while (offset < entry.size){
+      const end = Math.min(entry.size, offset + upload.chunk_bytes);
+      let res = null;
+      try{
+        res = await fetchJSON(url, {
+          method:'PUT', body:file.slice(offset, end),
+          headers:{ 'Upload-Offset': String(offset), 'Content-Type':'application/octet-stream' },
+        });
+      }catch{ res = null; }
+      const data = res && res.data;
+      if (res && res.status === 200 && data){
+        moveTo(Number(data.offset)); tries = 0;
+        if (data.state !== 'uploading') return data;
+        continue;
+      }
+      if (data && (data.code === 'OFFSET_MISMATCH' || data.code === 'FILE_COMPLETE')){
+        moveTo(Number(data.offset));
+        if (data.code === 'FILE_COMPLETE') return { ...entry, state:'done' };
+        continue;
+      }
+      if (res && res.status === 404) throw new Error('O envio expirou. Selecione os arquivos e tente novamente.');
+      if (res && res.status >= 400 && res.status < 500 && data && data.code !== 'UPLOAD_BUSY'){
+        throw new Error(data.message || 'O servidor recusou o envio');
+      }
+      if (++tries > 5) throw new Error('Falha de rede ao enviar arquivos');
+      await sleep(1000 * tries);
+      try{
+        const st = await fetchJSON(upload.upload_url);
+        const f = st.data && st.data.files && st.data.files[entry.index];
+        if (f){
+          moveTo(Number(f.offset));
+          if (f.state === 'done' || f.state === 'rejected') return f;
+        }
+      }catch{}
+    }
+    return { ...entry, state:'done' };
+  }
+
+  // Envia o lote em partes; resolve com a resposta de /finalizar/ (mesmo formato de
+  // /processar/) ou com { ok:false } quando o init foi recusado (popup já exibido).
+  async function uploadInParts(files, fmts, onProgress){
+    const sig = batchSignature(files, fmts);
+    let upload = await resumeUpload(sig);
+    if (!upload){
+      upload = await initUpload(files, fmts);
+      if (!upload || upload.ok === false) return { ok:false };
+      saveResume({ sig, upload_url: upload.upload_url });
+    }
+
+    const total = upload.files.reduce((a, f) => a + f.size, 0) || 1;
+    let sent = upload.files.reduce((a, f) => a + Number(f.offset || 0), 0);
+    onProgress(sent / total);
+    const onBytes = (n) => { sent += n; onProgress(sent / total); };
+
+    const queue = upload.files.filter(f => f.state === 'pending' || f.state === 'uploading');
+    const rejected = upload.files.filter(f => f.state === 'rejected');
+    async function lane(){
+      for (let entry = queue.shift(); entry; entry = queue.shift()){
+        const res = await sendFile(upload, files[entry.index], entry, onBytes);
+        if (res.state === 'rejected') rejected.push(res);
+      }
+    }
+    await Promise.all(Array.from({ length: Math.min(UPLOAD_PARALLEL, queue.length) }, lane));
+    if (rejected.length) console.warn('Arquivos recusados:', rejected);
+
+    const { status, data } = await fetchJSON(upload.finalize_url, { method:'POST' });
+    if (status !== 202 || !data) throw new Error((data && data.message) || 'Falha ao finalizar o envio');
+    clearResume();
+    return data;
+  }
+
   // ===== Submit
   form.addEventListener('submit', (e) => {
     e.preventDefault();
@@ -300,7 +494,8 @@
     const files = fromBridge.length ? fromBridge : Array.from(inputFile.files || []);
 
     if (!files.length) { showErrorModal('Nenhum arquivo selecionado','<p>Selecione ao menos uma imagem para converter.</p>'); return; }
-    const fmtRaw = (formatSel.value || '').trim();
+    const fmts = Array.from(formatSel.selectedOptions || []).map(o => (o.value || '').trim()).filter(Boolean);
+    const fmtRaw = fmts.join('-');
     if (!fmtRaw) { showErrorModal('Formato de saída ausente','<p>Escolha o formato desejado antes de converter.</p>'); return; }
 
     if (LIMIT_FILES && files.length > LIMIT_FILES) {
@@ -321,16 +516,89 @@
     }
 
     const ui = showProgressUI();
-    const niceFormat = fmtRaw.toUpperCase();
+    const niceFormat = fmts.map(f => f.toUpperCase()).join(' + ');
+
+    const setProgressSafe = (p) => ui.setProgress(Math.max(0, Math.min(100, p)));
+
+    // Depois do envio (POST único ou em partes): acompanha o job e baixa o ZIP
+    async function finishJob(data){
+      if (!data || data.ok === false) { ui.remove(); return; }
+
+      setProgressSafe(60); ui.setFileName('Na fila…');
+
+      try{
+        if (!data.status_url) throw new Error('Resposta inválida do servidor');
+
+        // Entrega em streaming: o ZIP é gerado durante o próprio download, então
+        // o download começa já e a barra (60–100) segue o progresso do job.
+        // Se o download cair, o job volta para a fila e termina pelo worker
+        // (ZIP em disco, baixado abaixo).
+        const streaming = data.delivery === 'stream' && !!data.download_url;
+        let blob = null;
+        const download = streaming
+          ? getBlobWithProgress(data.download_url).then(b => { blob = b; }, (err) => console.warn(err))
+          : Promise.resolve();
+        const share = streaming ? 40 : 20;
+
+        // progresso real do job (0–100) mapeado para 60–80 da barra (60–100 em streaming)
+        data = await watchJob(data, (job) => {
+          setProgressSafe(60 + Math.round((Number(job.progress || 0) / 100) * share));
+          if (job.label) ui.setFileName(job.label);
+        });
+        await download;
+        const zipUrl = data.download_url || data.zip_url;
+        if (!data.ok || (!blob && !zipUrl)){
+          ui.remove(); restoreUI();
+          const errs = (data.errors || []).map(e => `<li>${e.src ? `<strong>${e.src}:</strong> ` : ''}${e.reason || ''}</li>`);
+          showErrorModal('Não foi possível converter', errs.length ? `<ul>${errs.join('')}</ul>` : '<p>Tente novamente mais tarde.</p>');
+          return;
+        }
+        if (!blob){
+          setProgressSafe(80); ui.setFileName('Baixando…');
+          blob = await getBlobWithProgress(
+            zipUrl,
+            (loaded, total) => { if (total>0) setProgressSafe(Math.min(100, 80 + Math.round((loaded/total)*20))); }
+          );
+        }
+        setProgressSafe(100);
+
+        const converted = Number(data.converted || 0);
+        const failed    = Number(data.fallback_count || 0);
+        const zipName   = data.zip_name || `imagens-${fmtRaw}-converte-tudo.zip`;
+        showResultUI(blob, zipName, converted, failed, niceFormat, ui);
+        // live-stats soma na hora, antes do próximo polling
+        document.dispatchEvent(new CustomEvent('conversions:completed', { detail:{ count: converted } }));
+      }catch(err){
+        console.error(err); ui.setFileName('Ocorreu um erro na conversão/compactação.');
+      }
+    }
+
+    const showStartError = ({ status, data, raw, error }) => {
+      console.error(error || raw || data);
+      const msg = (data && (data.message || data.detail)) || '';
+      showErrorModal('Não foi possível iniciar a conversão', `<p>${msg || 'Tente novamente. Se o problema persistir, reduza a quantidade de arquivos.'}</p>`);
+    };
+
+    // Lote grande: em partes, retomável e convertido enquanto chega
+    if (UPLOAD_URL && window.fetch && totalBytes >= CHUNKED_MIN_BYTES) {
+      ui.setFileName('Enviando arquivos…');
+      uploadInParts(files, fmts, (frac) => setProgressSafe(Math.round(frac*60)))
+        .then(finishJob, (err) => {
+          ui.remove(); restoreUI();
+          showStartError({ data: err && err.data, raw: err && err.raw, error: err });
+        });
+      return;
+    }
 
     const fd = new FormData();
     const csrf = getCsrfToken(); if (csrf) fd.append('csrfmiddlewaretoken', csrf);
-    fd.append('out_ext', fmtRaw);
+    fmts.forEach(f => fd.append('out_ext', f));
+    // Entrega em streaming só quando pedida (campo "delivery" no formulário ou
+    // CT_DELIVERY); sem isso vale IMAGES_DEFAULT_DELIVERY do servidor (fila/worker)
+    const delivery = (form.elements.namedItem('delivery')?.value || window.CT_DELIVERY || '').trim();
+    if (delivery) fd.append('delivery', delivery);
     files.forEach(f => fd.append('arquivos', f, f.name));
 
-    let animTimer = null;
-    const setProgressSafe = (p) => ui.setProgress(Math.max(0, Math.min(100, p)));
-
     postWithProgress(
       PROCESS_URL,
       fd,
@@ -338,37 +606,8 @@
         const frac = total>0 ? (loaded/total) : (totalBytes ? loaded/totalBytes : 0);
         setProgressSafe(Math.round(frac*60)); ui.setFileName('Enviando arquivos…');
       },
-      async (data, status) => {
-        if (!data || data.ok === false) { ui.remove(); return; }
-
-        let current = 60; ui.setFileName('Convertendo…');
-        animTimer = setInterval(()=>{ current = Math.min(80, current+1); setProgressSafe(current); }, 150);
-
-        try{
-          if (!data || !data.ok || !data.zip_url) throw new Error('Resposta inválida do servidor');
-          clearInterval(animTimer); animTimer=null; setProgressSafe(80); ui.setFileName('Compactando…');
-
-          const blob = await getBlobWithProgress(
-            data.zip_url,
-            (loaded, total) => { if (total>0) setProgressSafe(Math.min(100, 80 + Math.round((loaded/total)*20))); }
-          );
-          setProgressSafe(100);
-
-          const converted = Number(data.converted || 0);
-          const failed    = Number(data.fallback_count || 0);
-          const zipName   = data.zip_name || `imagens-${fmtRaw}-converte-tudo.zip`;
-          showResultUI(blob, zipName, converted, failed, niceFormat, ui);
-        }catch(err){
-          if (animTimer){ clearInterval(animTimer); animTimer=null; }
-          console.error(err); ui.setFileName('Ocorreu um erro na conversão/compactação.');
-        }
-      },
-      ({ status, data, raw, error }) => {
-        if (animTimer){ clearInterval(animTimer); animTimer=null; }
-        console.error(error || raw || data);
-        const msg = (data && (data.message || data.detail)) || '';
-        showErrorModal('Não foi possível iniciar a conversão', `<p>${msg || 'Tente novamente. Se o problema persistir, reduza a quantidade de arquivos.'}</p>`);
-      }
+      finishJob,
+      showStartError
     );
   });
 })();
\ No newline at end of file
@@ -33,7 +33,9 @@ document.querySelectorAll('.select-wrapper').forEach((wrap) => {
   });
 
   // Valor inicial (placeholder se nada selecionado)
-  if (!native.value) {
+  if (native.multiple) {
+    native.addEventListener('change', syncMultiple);
+  } else if (!native.value) {
     valueEl.textContent = native.options[0]?.textContent?.trim() || 'Selecione...';
   }
 
@@ -44,11 +46,36 @@ document.querySelectorAll('.select-wrapper').forEach((wrap) => {
     if (isOpen) menu.focus({ preventScroll: true });
   });
 
+  // <select multiple>: cada clique liga/desliga um formato e o menu fica aberto
+  const placeholder = native.options[0]?.value === '' ? native.options[0].textContent.trim() : 'Selecione...';
+  if (native.multiple) menu.setAttribute('aria-multiselectable', 'true');
+
+  function syncMultiple(){
+    const chosen = Array.from(native.selectedOptions).filter(o => o.value);
+    menu.querySelectorAll('[role="option"]').forEach(li => {
+      const opt = Array.from(native.options).find(o => o.value === li.dataset.value);
+      if (opt && opt.selected && opt.value) li.setAttribute('aria-selected', 'true');
+      else li.removeAttribute('aria-selected');
+    });
+    valueEl.textContent = chosen.length ? chosen.map(o => o.value.toUpperCase()).join(' + ') : placeholder;
+  }
+
   // Seleciona opção
   menu.addEventListener('click', (e) => {
     const li = e.target.closest('[role="option"]');
     if (!li) return;
 
+    if (native.multiple) {
+      Array.from(native.options).forEach(o => {
+        if (!li.dataset.value) o.selected = false;            // placeholder limpa a seleção
+        else if (o.value === li.dataset.value) o.selected = !o.selected;
+        else if (!o.value) o.selected = false;
+      });
+      syncMultiple();
+      native.dispatchEvent(new Event('change', { bubbles: true }));
+      return;
+    }
+
     // visual
     menu.querySelectorAll('[aria-selected="true"]').forEach(n => n.removeAttribute('aria-selected'));
     li.setAttribute('aria-selected', 'true');
@@ -40,49 +40,42 @@
     });
   }
 
-  async function realMode(root){
-    // Remove aviso “exemplo”
+  function realMode(root){
+    // Remove aviso “exemplo” (se o template ainda tiver)
     const note = $('#statsNote'); if (note) note.remove();
 
-    // 1) Tenta SSE (Server-Sent Events)
-    const useSSE = !!window.EventSource;
-    let fallbackPolling = false;
+    const url   = root.getAttribute('data-endpoint') || '/api/conversions/stats';
+    const every = Math.max(5, parseInt(root.getAttribute('data-interval') || '15', 10) || 15) * 1000;
+    let server  = Math.max(0, parseInt(root.getAttribute('data-start') || '0', 10) || 0);
+    let shown   = server;   // inclui as conversões desta página ainda não contadas pelo servidor
+    updateUI(shown, 'ao vivo');
 
-    if (useSSE){
-      try{
-        const es = new EventSource('/api/conversions/stream');
-        es.addEventListener('message', (ev)=>{
-          try{
-            const data = JSON.parse(ev.data);
-            updateUI(data.total ?? 0, data.delta ? `+${data.delta} agora` : 'ao vivo');
-          }catch{}
-        });
-        es.addEventListener('error', ()=>{ es.close(); fallbackPolling = true; });
-        // Se SSE não conectar em 3s, cai para polling
-        setTimeout(()=>{ if (es.readyState !== 1){ try{es.close();}catch{}; fallbackPolling = true; } }, 3000);
-      }catch{ fallbackPolling = true; }
-    }else{
-      fallbackPolling = true;
-    }
-
-    // 2) Polling a cada 10s
-    if (fallbackPolling){
-      async function poll(){
+    // Polling (o endpoint responde de agregados em cache; aba oculta não consulta)
+    async function poll(){
+      if (!document.hidden){
         try{
-          const r = await fetch('/api/conversions/stats', { credentials:'same-origin' });
-          const j = await r.json();
-          updateUI(j.total ?? 0, 'ao vivo');
+          const r = await fetch(url, { credentials:'same-origin', headers:{ 'Accept':'application/json' } });
+          if (r.ok){
+            const j = await r.json();
+            const total = Math.max(0, Number(j.total) || 0);
+            const delta = total - server;
+            server = total;
+            if (total > shown){
+              shown = total;
+              updateUI(shown, delta > 0 ? `+${nf.format(delta)} agora` : 'ao vivo');
+            }
+          }
         }catch{}
-        setTimeout(poll, 10000);
       }
-      poll();
+      setTimeout(poll, every);
     }
+    setTimeout(poll, every);
 
     // Soma imediata após conversões locais concluídas
     document.addEventListener('conversions:completed', (e)=>{
       const n = Math.max(1, e?.detail?.count || 0);
-      const current = parseInt(($('#convTotal')?.textContent || '0').replace(/[.\s]/g,''), 10) || 0;
-      updateUI(current + n, `+${n} agora`);
+      shown += n;
+      updateUI(shown, `+${nf.format(n)} agora`);
     });
   }
 
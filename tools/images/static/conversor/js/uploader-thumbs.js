@@ -2,6 +2,9 @@
  * Upload por botão e drag&drop, miniaturas e card “+N” na 6ª posição.
  * Verificação incremental de limites com ACEITAÇÃO PARCIAL do lote.
  * Sempre notifica quando houver recusas: quantidade, bytes, tipo não suportado, duplicados.
+ * Depois de aceitos, os arquivos passam pelo probe do servidor (CT_PROBE_URL), que lê só
+ * os cabeçalhos: arquivos corrompidos/que não são imagem ou com resolução acima do limite
+ * saem da lista antes do upload.
  *
  * Bridge global:
  *   - ConverteTudo.getFiles()      -> File[]
@@ -13,6 +16,7 @@
  *   - 'ct:files-changed' { count, totalBytes }
  *   - 'ct:limit-hit'     { reason:'files'|'bytes'|'both', limitFiles, limitBytes, currentCount, currentBytes, rejectedByFiles, rejectedByBytes }
  *   - 'ct:rejections'    { rejectedByFiles, rejectedByBytes, rejectedByType, rejectedByDup }
+ *   - 'ct:probe-rejections' { rejectedByInvalid, rejectedByResolution, names }
  */
 (() => {
   'use strict';
@@ -36,6 +40,8 @@
   // Config
   const MAX_VISIBLE = 6; // exatamente 6 slots; se total > 6, o 6º é “+N”
   const ACCEPT_EXT = new Set(['png','jpg','jpeg','webp','tif','tiff','gif','bmp','ico','heic','heif']);
+  const PROBE_BYTES = 256 * 1024; // só o começo de cada arquivo vai para o probe
+  const PROBE_BATCH = 50;         // arquivos por requisição de probe
 
   // Estado
   /** @type {File[]} */
@@ -44,12 +50,25 @@
   const urlMap = new Map();
   /** Tamanho acumulado dos arquivos aceitos */
   let totalBytes = 0;
+  /** @type {Map<string,object>} key -> cabeçalho lido pelo servidor */
+  const probeMap = new Map();
 
   // ===== Utils / UI
   const extOf = (name) => (name.split('.').pop() || '').toLowerCase();
   const isImage = (f) => (f.type && f.type.startsWith('image/')) || ACCEPT_EXT.has(extOf(f.name));
   const uniqueKey = (f) => [f.name, f.size, f.lastModified].join('::');
 
+  const escapeHtml = (s) => String(s).replace(/[&<>"']/g, (c) => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+
+  function getCookie(name){
+    const m = document.cookie.match(new RegExp('(^|; )' + name + '=([^;]*)'));
+    return m ? decodeURIComponent(m[2]) : '';
+  }
+  function getCsrfToken(){
+    const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+    return (input && input.value) || getCookie('csrftoken') || '';
+  }
+
   function bytesToHuman(b){
     const u=['B','KB','MB','GB','TB']; let i=0, n=Number(b||0);
     while(n>=1024 && i<u.length-1){ n/=1024; i++; }
@@ -138,6 +157,7 @@
     files.splice(0, files.length);
     for (const url of urlMap.values()) { try { URL.revokeObjectURL(url); } catch{} }
     urlMap.clear();
+    probeMap.clear();
     totalBytes = 0;
     try {
       if (window.DataTransfer) inputFile.files = new DataTransfer().files;
@@ -162,9 +182,15 @@
     dims.className = 'thumb-dims';
     dims.textContent = '…';
 
-    const probe = new Image();
-    probe.onload = () => { dims.textContent = `${probe.naturalWidth}×${probe.naturalHeight}`; };
-    probe.src = url;
+    const info = probeMap.get(key);
+    if (info && info.width) {
+      // dimensões já orientadas pelo EXIF, como sairão na conversão
+      dims.textContent = `${info.width}×${info.height}` + (info.frames > 1 ? ` · ${info.frames} quadros` : '');
+    } else {
+      const probe = new Image();
+      probe.onload = () => { dims.textContent = `${probe.naturalWidth}×${probe.naturalHeight}`; };
+      probe.src = url;
+    }
 
     const removeBtn = document.createElement('button');
     removeBtn.type = 'button';
@@ -172,12 +198,7 @@
     removeBtn.setAttribute('aria-label', `Remover ${file.name}`);
     removeBtn.textContent = '×';
     removeBtn.addEventListener('click', () => {
-      const i = files.indexOf(file);
-      if (i > -1){
-        files.splice(i,1);
-        totalBytes = Math.max(0, totalBytes - (file.size || 0));
-        try{ URL.revokeObjectURL(urlMap.get(key)); }catch{}
-        urlMap.delete(key);
+      if (dropFile(file)){
         syncInputFiles();
         renderThumbs();
         updateFilesInfo();
@@ -223,6 +244,18 @@
     }
   }
 
+  function dropFile(file){
+    const i = files.indexOf(file);
+    if (i < 0) return false;
+    const key = uniqueKey(file);
+    files.splice(i,1);
+    totalBytes = Math.max(0, totalBytes - (file.size || 0));
+    try{ URL.revokeObjectURL(urlMap.get(key)); }catch{}
+    urlMap.delete(key);
+    probeMap.delete(key);
+    return true;
+  }
+
   // ===== Input sync
   function syncInputFiles(){
     let ok = false;
@@ -238,6 +271,69 @@
     return ok;
   }
 
+  // ===== Probe no servidor (só cabeçalhos; ver views.probe)
+  async function probeFiles(list){
+    const url = String(window.CT_PROBE_URL || '');
+    if (!url || !list.length || !window.fetch) return;
+
+    const bad = [];
+    for (let i = 0; i < list.length; i += PROBE_BATCH){
+      const chunk = list.slice(i, i + PROBE_BATCH);
+      const fd = new FormData();
+      for (const f of chunk){
+        fd.append('arquivos', f.size > PROBE_BYTES ? f.slice(0, PROBE_BYTES) : f, f.name);
+        fd.append('tamanhos', String(f.size || 0));
+      }
+      let data;
+      try {
+        const resp = await fetch(url, {
+          method: 'POST',
+          body: fd,
+          credentials: 'same-origin',
+          headers: { 'X-CSRFToken': getCsrfToken() }
+        });
+        if (!resp.ok) return; // probe indisponível não bloqueia: /processar/ valida de novo
+        data = await resp.json();
+      } catch { return; }
+
+      (data.files || []).forEach((info, j) => {
+        const f = chunk[j];
+        if (!f || !files.includes(f)) return; // removido enquanto o probe rodava
+        if (info.ok) probeMap.set(uniqueKey(f), info);
+        else bad.push({ file: f, info });
+      });
+    }
+
+    bad.forEach(({ file }) => dropFile(file));
+    if (bad.length) syncInputFiles();
+    renderThumbs();
+    updateFilesInfo();
+    updateBridge();
+    if (!bad.length) return;
+
+    const tooLarge = bad.filter(b => b.info.code === 'IMAGE_TOO_LARGE');
+    const invalid  = bad.filter(b => b.info.code !== 'IMAGE_TOO_LARGE');
+    try {
+      window.dispatchEvent(new CustomEvent('ct:probe-rejections', {
+        detail: {
+          rejectedByInvalid: invalid.length,
+          rejectedByResolution: tooLarge.length,
+          names: bad.map(b => b.file.name)
+        }
+      }));
+    } catch {}
+
+    const nameList = (items) => `<ul>${items.slice(0, 10).map(b => `<li>${escapeHtml(b.file.name)}</li>`).join('')}${items.length > 10 ? `<li>… e mais ${items.length - 10}</li>` : ''}</ul>`;
+    const parts = [];
+    if (invalid.length) {
+      parts.push(`<p><strong>${invalid.length}</strong> arquivo${invalid.length>1?'s':''} não ${invalid.length>1?'são imagens válidas':'é uma imagem válida'} ou est${invalid.length>1?'ão':'á'} <strong>corrompido${invalid.length>1?'s':''}</strong>:</p>`, nameList(invalid));
+    }
+    if (tooLarge.length) {
+      parts.push(`<p><strong>${tooLarge.length}</strong> arquivo${tooLarge.length>1?'s':''} com <strong>resolução</strong> acima do limite de conversão:</p>`, nameList(tooLarge));
+    }
+    showInfoModal({ title: 'Alguns arquivos foram removidos', html: parts.join('') });
+  }
+
   // ===== Entrada de arquivos (ACEITAÇÃO PARCIAL por capacidade)
   function addFiles(fileList){
     const arr = Array.from(fileList || []);
@@ -249,6 +345,7 @@
 
     let added = 0;
     let addedBytes = 0;
+    const accepted = [];
     let rejectedByFiles = 0;
     let rejectedByBytes = 0;
     let rejectedByType  = 0;
@@ -274,6 +371,7 @@
       // Aceita
       files.push(f);
       urlMap.set(key, URL.createObjectURL(f));
+      accepted.push(f);
       added++;
       addedBytes += size;
 
@@ -287,6 +385,7 @@
       syncInputFiles();
       renderThumbs();
       updateFilesInfo();
+      probeFiles(accepted);
     }
 
     // Notificação: QUALQUER limitação gera feedback
@@ -0,0 +1,494 @@
+# tools/images/strips.py
+"""
+Conversão em faixas (strips) para imagens muito grandes.
+
+O caminho normal decodifica a imagem inteira e, no preparo por formato,
+cria cópias do mesmo tamanho (conversão de modo, achatamento de alpha...).
+Aqui a origem é lida em faixas de linhas e cada faixa é preparada e gravada
+antes da próxima: o pico de memória depende da altura da faixa
+(`STRIP_BYTES`), não da imagem.
+
+Origens (sem decodificar o resto do arquivo):
+    raw   tiles "raw" do Pillow (PPM/PGM, BMP sem RLE, TIFF sem compressão,
+          TGA/SGI/IM sem RLE): cada faixa vira um tile com offset ajustado
+    PNG   não entrelaçado, 8 bits: o IDAT é descomprimido em fluxo e cada
+          faixa vira um PNG pequeno, precedido da última linha da faixa
+          anterior (os filtros Up/Avg/Paeth dependem dela)
+
+Destinos: PNG (filtros escolhidos pelo encoder do Pillow, faixa a faixa,
+num único fluxo zlib), TIFF (sem compressão ou deflate, uma strip por
+faixa), BMP (RGB/L) e PPM/PGM/PBM.
+
+Só usado sem redimensionamento e sem rotação EXIF (as duas precisam de
+linhas fora da faixa); ver ImagesConverter.streams().
+"""
+from __future__ import annotations
+
+import io
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image, ImageFile
+
+# Tamanho-alvo de cada faixa, contando 4 bytes/pixel (RGBA)
+STRIP_BYTES = 16 * 1024 * 1024
+# Cópias de uma faixa vivas ao mesmo tempo: dados filtrados/comprimidos,
+# faixa decodificada, recorte, preparo e a linha de contexto do PNG
+STRIP_COPIES = 5
+
+# Bits por pixel dos rawmodes dos tiles "raw" que sabemos fatiar
+_RAW_BITS = {
+    "1": 1, "1;I": 1,
+    "L": 8, "P": 8, "R": 8, "G": 8, "B": 8, "A": 8,
+    "LA": 16, "I;16": 16, "I;16B": 16, "I;16L": 16,
+    "RGB": 24, "BGR": 24, "RGB;L": 24,
+    "RGBA": 32, "BGRA": 32, "RGBX": 32, "BGRX": 32, "RGBA;L": 32,
+}
+# rawmode do tile "zip" do PNG -> modo do Pillow (8 bits por amostra)
+_PNG_MODES = {"L": "L", "LA": "LA", "RGB": "RGB", "RGBA": "RGBA", "P": "P"}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_READ_BYTES = 1 << 20
+
+# tiff_compression do formulário -> tag Compression (só as que o zlib faz)
+TIFF_COMPRESSIONS = {None: 1, "raw": 1, "tiff_deflate": 32946, "tiff_adobe_deflate": 8}
+WRITABLE_FORMATS = {"PNG", "TIFF", "BMP", "PPM"}
+
+
+def band_rows(width: int, height: int) -> int:
+    """Linhas por faixa para a largura dada (ao menos 1)."""
+    return max(1, min(height, STRIP_BYTES // max(1, width * 4)))
+
+
+def peak_bytes(width: int, height: int) -> int:
+    """Pico estimado da conversão em faixas."""
+    return band_rows(width, height) * width * 4 * STRIP_COPIES
+
+
+def writable(pil_fmt: Optional[str], tiff_compression: Optional[str] = None, requested_ext: str = "") -> bool:
+    """Se o alvo tem escrita em faixas com os mesmos pixels do caminho normal."""
+    if requested_ext == "pbm":
+        return False  # convert("1") difunde o erro entre linhas (Floyd-Steinberg)
+    if pil_fmt == "TIFF":
+        return tiff_compression in TIFF_COMPRESSIONS
+    return pil_fmt in WRITABLE_FORMATS
+
+
+# ------------------------------ Leitura --------------------------------
+def _raw_args(tile: ImageFile._Tile) -> Optional[Tuple[str, int, int]]:
+    args = tile.args
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    if not isinstance(args, tuple) or len(args) < 3 or args[0] not in _RAW_BITS:
+        return None
+    rawmode, stride, orientation = args[0], int(args[1]), int(args[2])
+    if stride <= 0:
+        x0, _, x1, _ = tile.extents
+        stride = (_RAW_BITS[rawmode] * (x1 - x0) + 7) // 8
+    return rawmode, stride, orientation
+
+
+def _png_chunks(fp: BinaryIO) -> Iterator[Tuple[bytes, int, int]]:
+    """(tipo, offset dos dados, tamanho) de cada chunk."""
+    fp.seek(len(_PNG_SIGNATURE))
+    while True:
+        head = fp.read(8)
+        if len(head) < 8:
+            return
+        length, ctype = struct.unpack(">I4s", head)
+        offset = fp.tell()
+        yield ctype, offset, length
+        if ctype == b"IEND":
+            return
+        fp.seek(offset + length + 4)
+
+
+def _png_chunk(ctype: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + ctype + body + struct.pack(">I", zlib.crc32(ctype + body))
+
+
+class StripReader(ABC):
+    """Lê uma imagem em faixas de cima para baixo (ver `open_reader`)."""
+
+    def __init__(self, src: Path, im: Image.Image) -> None:
+        self.src = Path(src)
+        self.size = im.size
+        self.mode = im.mode
+        self.format = im.format
+        self.info = dict(im.info)
+
+    @abstractmethod
+    def bands(self, rows: int) -> Iterator[Image.Image]:
+        """Faixas de `rows` linhas (a última pode ter menos)."""
+
+
+class _RawReader(StripReader):
+    def __init__(self, src: Path, im: Image.Image, tiles: List[Tuple[ImageFile._Tile, Tuple[str, int, int]]]) -> None:
+        super().__init__(src, im)
+        self.tiles = tiles
+
+    def _band_tiles(self, y0: int, y1: int) -> List[ImageFile._Tile]:
+        out = []
+        for tile, (rawmode, stride, orientation) in self.tiles:
+            x0, ty0, x1, ty1 = tile.extents
+            r0, r1 = max(ty0, y0), min(ty1, y1)
+            if r0 >= r1:
+                continue
+            # orientação negativa = linhas gravadas de baixo para cima (BMP/TGA/SGI)
+            skip = (r0 - ty0) if orientation > 0 else (ty1 - r1)
+            out.append(ImageFile._Tile(
+                "raw", (x0, r0 - y0, x1, r1 - y0), tile.offset + skip * stride, (rawmode, stride, orientation),
+            ))
+        return out
+
+    def bands(self, rows: int) -> Iterator[Image.Image]:
+        w, h = self.size
+        for y0 in range(0, h, rows):
+            y1 = min(h, y0 + rows)
+            with Image.open(self.src) as im:
+                im._size = (w, y1 - y0)
+                if hasattr(im, "_tile_size"):  # o TIFF aloca pelo tamanho do tile
+                    im._tile_size = im._size
+                im.tile = self._band_tiles(y0, y1)
+                im.load()
+                yield im
+
+
+class _PngReader(StripReader):
+    def __init__(self, src: Path, im: Image.Image) -> None:
+        super().__init__(src, im)
+        self._rawmode = im.tile[0].args if isinstance(im.tile[0].args, str) else im.tile[0].args[0]
+        w = im.size[0]
+        self._stride = (_RAW_BITS[self._rawmode] * w + 7) // 8
+        self._ihdr = b""
+        self._extra: List[bytes] = []  # PLTE/tRNS, necessários para decodificar
+        self._idat: List[Tuple[int, int]] = []
+        with open(self.src, "rb") as fp:
+            for ctype, offset, length in _png_chunks(fp):
+                if ctype in (b"IHDR", b"PLTE", b"tRNS"):
+                    fp.seek(offset)
+                    body = fp.read(length)
+                    if ctype == b"IHDR":
+                        self._ihdr = body
+                    else:
+                        self._extra.append(_png_chunk(ctype, body))
+                elif ctype == b"IDAT":
+                    self._idat.append((offset, length))
+
+    def _filtered(self) -> Iterator[bytes]:
+        """Linhas filtradas (byte de filtro + dados), descomprimidas em fluxo."""
+        z = zlib.decompressobj()
+        row = 1 + self._stride
+        pending = b""
+        with open(self.src, "rb") as fp:
+            for offset, length in self._idat:
+                fp.seek(offset)
+                remaining = length
+                while remaining:
+                    chunk = fp.read(min(remaining, _READ_BYTES))
+                    if not chunk:
+                        raise OSError("PNG truncado")
+                    remaining -= len(chunk)
+                    # saída limitada por chamada: zeros comprimem mais de 1000:1
+                    while chunk:
+                        pending += z.decompress(chunk, _READ_BYTES)
+                        chunk = z.unconsumed_tail
+                        n = len(pending) // row
+                        if n:
+                            yield pending[: n * row]
+                            pending = pending[n * row:]
+        pending += z.flush()
+        if pending:
+            yield pending
+
+    def _decode(self, parts: List[Union[bytes, memoryview]], height: int) -> Image.Image:
+        # PNG mínimo só com a faixa; o zlib em nível 0 só embala as linhas filtradas
+        c = zlib.compressobj(0)
+        idat = b"".join([*(c.compress(p) for p in parts), c.flush()])
+        mini = io.BytesIO()
+        ihdr = struct.pack(">II", self.size[0], height) + self._ihdr[8:]
+        mini.write(_PNG_SIGNATURE + _png_chunk(b"IHDR", ihdr) + b"".join(self._extra))
+        mini.write(struct.pack(">I", len(idat)) + b"IDAT")
+        mini.write(idat)
+        mini.write(struct.pack(">I", zlib.crc32(idat, zlib.crc32(b"IDAT"))) + _png_chunk(b"IEND", b""))
+        del idat
+        mini.seek(0)
+        band = Image.open(mini)
+        band.load()
+        return band
+
+    def bands(self, rows: int) -> Iterator[Image.Image]:
+        w, h = self.size
+        row = 1 + self._stride
+        buf = bytearray()
+        prev: Optional[bytes] = None  # última linha já decodificada, no layout do PNG
+        done = 0
+        stream = self._filtered()
+        while done < h:
+            need = min(rows, h - done) * row
+            while len(buf) < need:
+                chunk = next(stream, None)
+                if chunk is None:
+                    raise OSError("PNG truncado")
+                buf += chunk
+            n = need // row
+            with memoryview(buf) as view:
+                data = view[:need]
+                if prev is None:
+                    band = self._decode([data], n)
+                else:
+                    full = self._decode([b"\x00" + prev, data], n + 1)
+                    band = full.crop((0, 1, w, n + 1))
+                    band.info = full.info
+                    del full
+                data.release()
+            del buf[:need]
+            prev = band.crop((0, n - 1, w, n)).tobytes("raw", self._rawmode)
+            done += n
+            yield band
+
+
+def open_reader(src: Path, im: Image.Image) -> Optional[StripReader]:
+    """Leitor em faixas para `im` (já aberta de `src`), ou None se o formato não permite."""
+    if getattr(im, "n_frames", 1) != 1 or not im.tile:
+        return None
+    w = im.size[0]
+    if all(t.codec_name == "raw" for t in im.tile):
+        tiles = []
+        for t in im.tile:
+            args = _raw_args(t)
+            x0, _, x1, _ = t.extents
+            if args is None or (x0, x1) != (0, w):  # TIFF em blocos (tiles) não
+                return None
+            tiles.append((t, args))
+        return _RawReader(src, im, tiles)
+    if im.format == "PNG" and len(im.tile) == 1 and im.tile[0].codec_name == "zip" and not im.info.get("interlace"):
+        rawmode = im.tile[0].args if isinstance(im.tile[0].args, str) else im.tile[0].args[0]
+        if _PNG_MODES.get(rawmode) == im.mode:
+            return _PngReader(src, im)
+    return None
+
+
+def readable(im: Image.Image) -> bool:
+    """Se `open_reader` aceitaria a imagem (só olha o cabeçalho)."""
+    if getattr(im, "n_frames", 1) != 1 or not im.tile:
+        return False
+    w = im.size[0]
+    if all(t.codec_name == "raw" for t in im.tile):
+        return all(_raw_args(t) is not None and (t.extents[0], t.extents[2]) == (0, w) for t in im.tile)
+    if im.format == "PNG" and len(im.tile) == 1 and im.tile[0].codec_name == "zip" and not im.info.get("interlace"):
+        rawmode = im.tile[0].args if isinstance(im.tile[0].args, str) else im.tile[0].args[0]
+        return _PNG_MODES.get(rawmode) == im.mode
+    return False
+
+
+# ------------------------------ Escrita --------------------------------
+# amostras por pixel de cada color type do IHDR
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def _write_png(
+    bands: Iterator[Image.Image], fp: BinaryIO, size: Tuple[int, int], *,
+    compress_level: int, optimize: bool, icc_profile: Optional[bytes],
+) -> None:
+    w, h = size
+    # optimize, como no Pillow: filtros escolhidos com mais esforço e zlib no nível 9
+    z = zlib.compressobj(9 if optimize else compress_level)
+    prev: Optional[Image.Image] = None
+    row = 0
+
+    def emit(data: bytes) -> None:
+        if data:
+            fp.write(_png_chunk(b"IDAT", data))
+
+    for band in bands:
+        n = band.height
+        if prev is not None:
+            # a linha anterior entra como contexto para os filtros e é descartada depois
+            work = Image.new(band.mode, (w, n + 1))
+            if band.mode == "P":
+                work.putpalette(band.getpalette())
+            work.paste(prev, (0, 0))
+            work.paste(band, (0, 1))
+            work.info = band.info
+        else:
+            work = band
+        # o Pillow escolhe os filtros; level 0 = zlib só com blocos "stored"
+        buf = io.BytesIO()
+        kwargs: dict = {"optimize": True} if optimize else {"compress_level": 0}
+        if icc_profile:
+            kwargs["icc_profile"] = icc_profile
+        work.save(buf, "PNG", **kwargs)
+        del work
+        skip = 0 if prev is None else row
+        d = zlib.decompressobj()
+        head: List[bytes] = []
+        for ctype, offset, length in _png_chunks(buf):
+            body = buf.getbuffer()[offset: offset + length]
+            if ctype == b"IDAT":
+                if head:
+                    fp.write(_PNG_SIGNATURE + b"".join(head))
+                    head = []
+                data = d.decompress(body)
+                if skip:
+                    cut = min(skip, len(data))
+                    data, skip = data[cut:], skip - cut
+                emit(z.compress(data))
+            elif prev is None and ctype != b"IEND":
+                if ctype == b"IHDR":
+                    bit_depth, color_type = body[8], body[9]
+                    row = 1 + (w * bit_depth * _PNG_CHANNELS[color_type] + 7) // 8
+                    head.append(_png_chunk(ctype, struct.pack(">II", w, h) + bytes(body[8:])))
+                else:
+                    head.append(_png_chunk(ctype, bytes(body)))
+            body.release()
+        prev = band.crop((0, n - 1, w, n))
+    emit(z.flush())
+    fp.write(_png_chunk(b"IEND", b""))
+
+
+def _write_tiff(
+    bands: Iterator[Image.Image], fp: BinaryIO, size: Tuple[int, int], *,
+    compression: int, icc_profile: Optional[bytes],
+) -> None:
+    w, h = size
+    start = fp.tell()
+    fp.write(b"II*\x00\x00\x00\x00\x00")
+    offsets: List[int] = []
+    counts: List[int] = []
+    rows_per_strip = 0
+    mode = None
+    for band in bands:
+        if mode is None:
+            mode = band.mode
+            if mode not in ("L", "RGB", "RGBA"):
+                raise ValueError(f"Modo {mode} não suportado no TIFF em faixas")
+            rows_per_strip = band.height
+        data = band.tobytes()
+        if compression != 1:
+            data = zlib.compress(data, 6)
+        offsets.append(fp.tell() - start)
+        counts.append(len(data))
+        fp.write(data)
+        if fp.tell() - start > 0xFFFFFFF0:
+            raise ValueError("TIFF em faixas passaria de 4 GB")
+
+    spp = len(mode or "L")
+
+    def blob(data: bytes) -> int:
+        if (fp.tell() - start) % 2:
+            fp.write(b"\x00")
+        pos = fp.tell() - start
+        fp.write(data)
+        return pos
+
+    # (tag, tipo, quantidade, valor ou offset)  tipos: 3 SHORT, 4 LONG, 7 UNDEFINED
+    entries = [
+        (256, 4, 1, w),
+        (257, 4, 1, h),
+        (258, 3, spp, 8 if spp == 1 else blob(struct.pack(f"<{spp}H", *[8] * spp))),
+        (259, 3, 1, compression),
+        (262, 3, 1, 1 if mode == "L" else 2),
+        (273, 4, len(offsets), offsets[0] if len(offsets) == 1 else blob(struct.pack(f"<{len(offsets)}I", *offsets))),
+        (277, 3, 1, spp),
+        (278, 4, 1, rows_per_strip),
+        (279, 4, len(counts), counts[0] if len(counts) == 1 else blob(struct.pack(f"<{len(counts)}I", *counts))),
+        (284, 3, 1, 1),
+    ]
+    if mode == "RGBA":
+        entries.append((338, 3, 1, 2))  # alpha não associado
+    if icc_profile:
+        entries.append((34675, 7, len(icc_profile), blob(icc_profile)))
+    ifd = blob(b"")
+    out = [struct.pack("<H", len(entries))]
+    for tag, typ, count, value in sorted(entries):
+        if typ == 3 and count == 1:
+            out.append(struct.pack("<HHIHH", tag, typ, count, value, 0))
+        else:
+            out.append(struct.pack("<HHII", tag, typ, count, value))
+    out.append(b"\x00\x00\x00\x00")
+    fp.write(b"".join(out))
+    end = fp.tell()
+    fp.seek(start + 4)
+    fp.write(struct.pack("<I", ifd))
+    fp.seek(end)
+
+
+def _write_bmp(bands: Iterator[Image.Image], fp: BinaryIO, size: Tuple[int, int]) -> None:
+    w, h = size
+    start = fp.tell()
+    header_len = 0
+    stride = 0
+    y = 0
+    for band in bands:
+        if not header_len:
+            if band.mode not in ("RGB", "L"):
+                raise ValueError(f"Modo {band.mode} não suportado no BMP em faixas")
+            # cabeçalho (e paleta de cinza do modo L) gerado pelo próprio Pillow
+            head = io.BytesIO()
+            band.crop((0, 0, w, 1)).save(head, "BMP")
+            head = head.getvalue()
+            header_len = struct.unpack_from("<I", head, 10)[0]
+            bits = 24 if band.mode == "RGB" else 8
+            stride = ((w * bits + 31) // 32) * 4
+            head = bytearray(head[:header_len])
+            struct.pack_into("<I", head, 2, header_len + stride * h)
+            struct.pack_into("<i", head, 22, h)
+            struct.pack_into("<I", head, 34, stride * h)
+            fp.write(head)
+        rawmode = "BGR" if band.mode == "RGB" else "L"
+        n = band.height
+        # BMP guarda as linhas de baixo para cima: a faixa vai para o fim do arquivo
+        fp.seek(start + header_len + (h - y - n) * stride)
+        fp.write(band.tobytes("raw", (rawmode, stride, -1)))
+        y += n
+    fp.seek(start + header_len + stride * h)
+
+
+def _write_ppm(bands: Iterator[Image.Image], fp: BinaryIO, size: Tuple[int, int]) -> None:
+    w, h = size
+    first = True
+    for band in bands:
+        if first:
+            magic, rawmode = {"1": (b"P4", "1;I"), "L": (b"P5", "L"), "RGB": (b"P6", "RGB")}.get(band.mode, (None, None))
+            if magic is None:
+                raise ValueError(f"Modo {band.mode} não suportado no PPM em faixas")
+            fp.write(magic + b"\n%d %d\n" % (w, h) + (b"" if band.mode == "1" else b"255\n"))
+            first = False
+        fp.write(band.tobytes("raw", rawmode))
+
+
+def write(
+    bands: Iterator[Image.Image],
+    dst: Union[Path, BinaryIO],
+    pil_fmt: str,
+    *,
+    size: Tuple[int, int],
+    compress_level: int = 6,
+    optimize: bool = False,
+    tiff_compression: Optional[str] = None,
+    icc_profile: Optional[bytes] = None,
+) -> None:
+    """
+    Grava as faixas (já preparadas para `pil_fmt`, de cima para baixo) em
+    `dst`. O perfil ICC vai no PNG e no TIFF; EXIF não é gravado (o TIFF
+    com EXIF fica no caminho normal, ver ImagesConverter._strips_target).
+    """
+    if isinstance(dst, (str, Path)):
+        with open(dst, "wb") as fp:
+            return write(
+                bands, fp, pil_fmt, size=size, compress_level=compress_level, optimize=optimize,
+                tiff_compression=tiff_compression, icc_profile=icc_profile,
+            )
+    if pil_fmt == "PNG":
+        _write_png(bands, dst, size, compress_level=compress_level, optimize=optimize, icc_profile=icc_profile)
+    elif pil_fmt == "TIFF":
+        _write_tiff(bands, dst, size, compression=TIFF_COMPRESSIONS[tiff_compression], icc_profile=icc_profile)
+    elif pil_fmt == "BMP":
+        _write_bmp(bands, dst, size)
+    elif pil_fmt == "PPM":
+        _write_ppm(bands, dst, size)
+    else:
+        raise ValueError(f"Formato sem escrita em faixas: {pil_fmt}")
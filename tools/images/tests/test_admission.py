@@ -0,0 +1,223 @@
+# tools/images/tests/test_admission.py
+from __future__ import annotations
+
+import io
+import threading
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from PIL import Image
+
+from tools.images import jobs, strips
+from tools.images.admission import ImageProbe, MemoryBudget, batch_peak, cost_of, probe
+from tools.images.converter import ImagesConverter, _decode_reduced
+
+from .utils import add_formats, isolated_media, make_animation, make_image, temp_dir
+
+
+class MemoryBudgetTests(SimpleTestCase):
+    def test_try_acquire_respects_capacity(self):
+        budget = MemoryBudget(100)
+        self.assertTrue(budget.try_acquire(60))
+        self.assertFalse(budget.try_acquire(50))
+        budget.release(60)
+        self.assertTrue(budget.try_acquire(50))
+        self.assertEqual(budget.in_use, 50)
+
+    def test_acquire_times_out(self):
+        budget = MemoryBudget(100)
+        budget.acquire(100)
+        self.assertFalse(budget.acquire(1, timeout=0.01))
+
+    def test_release_wakes_waiter(self):
+        budget = MemoryBudget(100)
+        budget.acquire(80)
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(budget.acquire(50, timeout=5)))
+        waiter.start()
+        budget.release(80)
+        waiter.join(5)
+        self.assertEqual((got, budget.in_use), ([True], 50))
+
+    def test_oversized_request_runs_alone(self):
+        budget = MemoryBudget(100)
+        with budget.reserve(10_000):
+            self.assertEqual(budget.in_use, 100)
+            self.assertFalse(budget.try_acquire(1))
+        self.assertEqual(budget.in_use, 0)
+
+
+class CostTests(SimpleTestCase):
+    def test_static_rgb(self):
+        cost = cost_of(ImageProbe(name="a", width=100, height=50, mode="RGB"))
+        self.assertEqual(cost.decoded_bytes, 100 * 50 * 4)
+        self.assertEqual(cost.peak_bytes, 100 * 50 * 4 * 3)  # + 2 cópias de trabalho
+
+    def test_animation_keeps_previous_frame(self):
+        still = cost_of(ImageProbe(name="a", width=100, height=50, mode="P"))
+        anim = cost_of(ImageProbe(name="a", width=100, height=50, mode="P", frames=3))
+        self.assertEqual(anim.peak_bytes - still.peak_bytes, 100 * 50 * 4)
+
+    def test_streamed_costs_one_band(self):
+        info = ImageProbe(name="a", width=8000, height=8000, mode="RGB", strips=True)
+        streamed = cost_of(info, streamed=True)
+        self.assertEqual(streamed.peak_bytes, strips.peak_bytes(8000, 8000))
+        self.assertLess(streamed.peak_bytes, cost_of(info).peak_bytes)
+
+    def test_reduced_jpeg_decodes_small(self):
+        cost = cost_of(ImageProbe(name="a", format="JPEG", width=800, height=400, mode="RGB"), reduced_to=(100, 50))
+        self.assertEqual((cost.decoded_bytes, cost.peak_bytes), (100 * 50 * 4, 100 * 50 * 4 * 3))
+
+    def test_reduced_png_decodes_whole(self):
+        cost = cost_of(ImageProbe(name="a", format="PNG", width=800, height=400, mode="RGB"), reduced_to=(100, 50))
+        self.assertEqual(cost.decoded_bytes, 800 * 400 * 4)
+        self.assertEqual(cost.peak_bytes, 800 * 400 * 4 + 100 * 50 * 4 * 3)
+
+    def test_unreadable(self):
+        self.assertFalse(cost_of(ImageProbe(name="a", ok=False)).ok)
+
+    def test_batch_peak_sums_largest(self):
+        costs = [cost_of(ImageProbe(name=str(i), width=10 * i, height=10, mode="L")) for i in (1, 3, 2)]
+        self.assertEqual(batch_peak(costs), costs[1].peak_bytes)
+        self.assertEqual(batch_peak(costs, 2), costs[1].peak_bytes + costs[2].peak_bytes)
+
+
+class PlannerCostTests(SimpleTestCase):
+    def test_resize_shrinks_jpeg_estimate(self):
+        info = ImageProbe(name="a", format="JPEG", width=8000, height=6000, mode="RGB")
+        full = ImagesConverter().cost(info, "png")
+        reduced = ImagesConverter(max_width=800).cost(info, "png")
+        # decodifica em >= 2x a saída (1600x1200): draft em 1/4
+        self.assertEqual((reduced.width, reduced.decoded_bytes), (8000, 2000 * 1500 * 4))
+        self.assertLess(reduced.peak_bytes * 10, full.peak_bytes)
+
+    def test_icon_target_reduces_only_when_every_target_does(self):
+        info = ImageProbe(name="a", format="PNG", width=4096, height=4096, mode="RGBA")
+        conv = ImagesConverter()
+        self.assertLess(conv.cost(info, "ico").peak_bytes, conv.cost(info, "png").peak_bytes)
+        self.assertEqual(conv.cost(info, ["ico", "png"]).peak_bytes, conv.cost(info, "png").peak_bytes)
+
+    def test_unreducible_mode_and_animation_keep_full_cost(self):
+        conv = ImagesConverter(max_width=100)
+        for info in (
+            ImageProbe(name="a", format="PNG", width=2000, height=2000, mode="P"),
+            ImageProbe(name="a", format="GIF", width=2000, height=2000, mode="RGB", frames=3),
+        ):
+            self.assertEqual(conv.cost(info, "png"), cost_of(info))
+
+    def test_matches_converter_decode(self):
+        tmp = temp_dir(self)
+        src = tmp / "a.jpg"
+        Image.new("RGB", (1600, 1200), (10, 20, 30)).save(src)
+        conv = ImagesConverter(max_width=200)
+        with Image.open(src) as im:
+            out, _ = _decode_reduced(im, conv._decode_min_size("PNG", im))
+            expected = out.size
+        cost = conv.cost(probe(src), "png")
+        self.assertEqual(cost.decoded_bytes, expected[0] * expected[1] * 4)
+
+
+class ProbeTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def test_reads_header_and_restores_position(self):
+        buf = io.BytesIO(make_image(self.tmp / "a.png", size=(30, 20)).read_bytes())
+        buf.seek(3)
+        info = probe(buf, "a.png")
+        self.assertEqual((info.ok, info.format, info.width, info.height, info.mode), (True, "PNG", 30, 20, "RGB"))
+        self.assertEqual(buf.tell(), 3)
+
+    def test_orientation_and_frames(self):
+        src = self.tmp / "r.jpg"
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new("RGB", (40, 10)).save(src, exif=exif)
+        self.assertEqual(probe(src).oriented_size, (10, 40))
+        self.assertEqual(probe(make_animation(self.tmp / "a.gif", frames=4)).frames, 4)
+
+    def test_not_an_image(self):
+        self.assertFalse(probe(io.BytesIO(b"hello"), "x.png").ok)
+
+
+class BatchAdmissionTests(SimpleTestCase):
+    def test_batch_returns_every_reservation(self):
+        tmp = temp_dir(self)
+        files = [make_image(tmp / "in" / f"{i}.png", size=(64, 64), seed=i) for i in range(3)]
+        budget = MemoryBudget(64 * 64 * 4)  # menor que o pico de um arquivo
+        for workers in (1, 2):
+            batch = ImagesConverter(workers=workers).convert_batch_to_zip(
+                files, out_ext="png", work_dir=tmp / f"out{workers}", memory_budget=budget,
+            )
+            self.assertEqual(batch.converted, 3)
+            self.assertEqual(budget.in_use, 0)
+
+
+class ProcessAdmissionTests(TestCase):
+    def setUp(self):
+        self.media = isolated_media(self, IMAGES_MEMORY={"PROCESS_BUDGET_BYTES": 10**9, "MAX_FILE_PEAK_BYTES": 100_000})
+        add_formats("PNG")
+
+    def test_rejects_image_over_peak_limit(self):
+        src = make_image(self.media / "big.png", size=(200, 200))  # pico estimado: 480 000 bytes
+        with open(src, "rb") as fh:
+            resp = self.client.post(reverse("images:process"), {"arquivos": fh, "out_ext": "png"}, HTTP_HOST="localhost")
+        self.assertEqual(resp.status_code, 413)
+        data = resp.json()
+        self.assertEqual((data["code"], data["files"][0]["width"]), ("IMAGE_TOO_LARGE", 200))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_without_peak_limit_large_image_is_queued(self):
+        src = make_image(self.media / "big.png", size=(200, 200))
+        with self.settings(IMAGES_MEMORY={"PROCESS_BUDGET_BYTES": 100_000}), open(src, "rb") as fh:
+            resp = self.client.post(reverse("images:process"), {"arquivos": fh, "out_ext": "png"}, HTTP_HOST="localhost")
+        self.assertEqual(resp.status_code, 202)
+        self.assertIsNotNone(jobs.claim_next())
+
+
+class ProbeViewTests(TestCase):
+    def setUp(self):
+        self.media = isolated_media(self, IMAGES_MEMORY={"MAX_FILE_PEAK_BYTES": 100_000})
+        self.tmp = temp_dir(self)
+
+    def post(self, files, **data):
+        return self.client.post(reverse("images:probe"), {"arquivos": files, **data}, HTTP_HOST="localhost")
+
+    def test_reports_headers_without_saving(self):
+        small = make_image(self.tmp / "small.png", size=(30, 20))
+        big = make_image(self.tmp / "big.png", size=(200, 200))
+        with open(small, "rb") as a, open(big, "rb") as b:
+            resp = self.post([a, b])
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        ok, too_large = data["files"]
+        self.assertFalse(data["ok"])
+        self.assertEqual((ok["ok"], ok["width"], ok["height"]), (True, 30, 20))
+        self.assertEqual((too_large["ok"], too_large["code"]), (False, "IMAGE_TOO_LARGE"))
+        self.assertEqual(data["estimated_bytes"], (30 * 20 + 200 * 200) * 4)
+        self.assertEqual(list(self.media.iterdir()), [])
+
+    def test_truncated_chunk_is_partial(self):
+        src = make_image(self.tmp / "a.png", size=(30, 20))
+        head = io.BytesIO(src.read_bytes()[:4])
+        head.name = "a.png"
+        resp = self.post([head], tamanhos=[str(src.stat().st_size)])
+        self.assertEqual(resp.json()["files"], [{"name": "a.png", "ok": True, "partial": True}])
+
+    def test_whole_non_image_is_invalid(self):
+        junk = io.BytesIO(b"hello")
+        junk.name = "a.png"
+        entry = self.post([junk]).json()["files"][0]
+        self.assertEqual((entry["ok"], entry["code"]), (False, "INVALID_IMAGE"))
+
+    def test_requires_post_and_files(self):
+        self.assertEqual(self.client.get(reverse("images:probe"), HTTP_HOST="localhost").status_code, 405)
+        self.assertEqual(self.client.post(reverse("images:probe"), HTTP_HOST="localhost").status_code, 400)
+
+    def test_plan_limits_use_declared_sizes(self):
+        head = io.BytesIO(make_image(self.tmp / "a.png", size=(30, 20)).read_bytes()[:64])
+        head.name = "a.png"
+        with self.settings(CURRENT_PLAN="free", UPLOAD_LIMITS={"FREE_MAX_FILES": 5, "FREE_MAX_TOTAL_UPLOAD_BYTES": 1000}):
+            resp = self.post([head], tamanhos=["5000"])
+        self.assertEqual((resp.status_code, resp.json()["code"]), (413, "LIMIT_EXCEEDED"))
+        self.assertEqual(resp.json()["total_bytes"], 5000)
@@ -0,0 +1,74 @@
+# tools/images/tests/test_animation.py
+from __future__ import annotations
+
+import io
+
+from django.test import SimpleTestCase
+from PIL import Image, ImageSequence
+
+from tools.images.converter import ImagesConverter
+
+from .utils import make_animation, temp_dir
+
+
+def frames_of(data: bytes, mode: str = "RGB"):
+    with Image.open(io.BytesIO(data)) as im:
+        return [(f.convert(mode).tobytes(), f.info.get("duration")) for f in ImageSequence.Iterator(im)]
+
+
+class AnimationTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.src = make_animation(self.tmp / "anim.gif", frames=4)
+        self.expected = frames_of(self.src.read_bytes())
+
+    def convert(self, ext, **options):
+        r = ImagesConverter(**options).convert_one_to_bytes(self.src, ext)
+        self.assertTrue(r.ok, r.reason)
+        return r.data
+
+    def test_lossless_targets_keep_every_frame(self):
+        for ext in ("gif", "png", "tiff"):
+            with self.subTest(ext=ext):
+                got = frames_of(self.convert(ext))
+                self.assertEqual([px for px, _ in got], [px for px, _ in self.expected])
+                if ext != "tiff":
+                    self.assertEqual([d for _, d in got], [100] * 4)
+
+    def test_webp_keeps_frames_and_durations(self):
+        got = frames_of(self.convert("webp"))
+        self.assertEqual(len(got), 4)
+        self.assertEqual([d for _, d in got], [100] * 4)
+
+    def test_static_target_gets_first_frame(self):
+        with Image.open(io.BytesIO(self.convert("bmp"))) as im:
+            self.assertEqual(getattr(im, "n_frames", 1), 1)
+            self.assertEqual(im.convert("RGB").tobytes(), self.expected[0][0])
+
+    def test_resize_applies_to_every_frame(self):
+        with Image.open(io.BytesIO(self.convert("png", max_width=16))) as im:
+            self.assertEqual((im.size, im.n_frames), ((16, 16), 4))
+
+    def test_transparency_survives_gif(self):
+        src = self.tmp / "alpha.png"
+        frames = [Image.new("RGBA", (16, 16), (255, 0, 0, 0)) for _ in range(3)]
+        for i, f in enumerate(frames):
+            f.paste((0, 0, 255, 255), (i * 4, 0, i * 4 + 4, 4))
+        frames[0].save(src, "PNG", save_all=True, append_images=frames[1:], duration=50)
+        data = ImagesConverter().convert_one_to_bytes(src, "gif").data
+        with Image.open(io.BytesIO(data)) as im:
+            self.assertEqual(im.n_frames, 3)
+            for i, frame in enumerate(ImageSequence.Iterator(im)):
+                rgba = frame.convert("RGBA")
+                self.assertEqual(rgba.getpixel((15, 15))[3], 0)
+                self.assertEqual(rgba.getpixel((i * 4, 0)), (0, 0, 255, 255))
+
+    def test_truncated_animation_falls_back_to_first_frame(self):
+        data = self.src.read_bytes()
+        broken = self.tmp / "broken.gif"
+        broken.write_bytes(data[: len(data) * 2 // 3])
+        with self.assertLogs("tools.images.converter", "WARNING"):
+            r = ImagesConverter().convert_one_to_bytes(broken, "webp")
+        self.assertTrue(r.ok)
+        with Image.open(io.BytesIO(r.data)) as im:
+            self.assertEqual(getattr(im, "n_frames", 1), 1)
@@ -0,0 +1,61 @@
+# tools/images/tests/test_bench.py
+from __future__ import annotations
+
+import io
+import json
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from tools.images import bench
+
+from .utils import temp_dir
+
+
+class BenchTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def test_corpus_is_deterministic_and_reused(self):
+        items = bench.build_corpus(self.tmp / "a", sizes=[(32, 24)], modes=["RGB", "P"])
+        self.assertEqual([i.path.name for i in items], ["rgb-32x24.jpg", "rgb-32x24.png", "rgb-32x24.webp", "p-32x24.png", "p-32x24.gif"])
+        other = bench.build_corpus(self.tmp / "b", sizes=[(32, 24)], modes=["RGB", "P"])
+        self.assertEqual([i.path.read_bytes() for i in items], [i.path.read_bytes() for i in other])
+        mtimes = [i.path.stat().st_mtime_ns for i in items]
+        bench.build_corpus(self.tmp / "a", sizes=[(32, 24)], modes=["RGB", "P"])
+        self.assertEqual([i.path.stat().st_mtime_ns for i in items], mtimes)
+
+    def test_run_reports_each_case(self):
+        data = bench.run(
+            corpus_dir=self.tmp, sizes=[(32, 24)], targets=["jpeg"], cases=("convert_one", "convert_batch_to_zip"),
+            variants={"fast": {"encoder_preset": "fast"}},
+        )
+        results = data["results"]
+        self.assertEqual([(r["case"], r["target"], r["variant"]) for r in results], [
+            ("convert_one", "jpeg", "fast"), ("convert_batch_to_zip", "jpeg", "fast"),
+        ])
+        n = len(data["meta"]["corpus"])
+        self.assertTrue(all(r["images"] == n and r["errors"] == 0 for r in results))
+        json.dumps(data)  # relatório serializável
+        self.assertEqual(len(bench.compare(data, data)), 2)
+        self.assertIn("+0.0%", bench.compare(data, data)[0])
+
+    def test_percentile(self):
+        self.assertEqual(bench._percentile([], 95), 0.0)
+        self.assertEqual(bench._percentile([0.5], 95), 0.5)
+        self.assertEqual(bench._percentile([float(i) for i in range(1, 101)], 50), 50.5)
+
+
+class BenchCommandTests(SimpleTestCase):
+    def test_writes_report(self):
+        tmp = temp_dir(self)
+        out = tmp / "bench.json"
+        call_command(
+            "images_bench", "--sizes", "32x24", "--targets", "bmp", "--cases", "convert_one",
+            "--corpus-dir", str(tmp / "corpus"), "--out", str(out), stdout=io.StringIO(),
+        )
+        self.assertEqual({r["target"] for r in json.loads(out.read_text())["results"]}, {"bmp"})
+
+    def test_rejects_unknown_target(self):
+        with self.assertRaises(CommandError):
+            call_command("images_bench", "--targets", "nope", stdout=io.StringIO())
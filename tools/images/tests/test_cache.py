@@ -0,0 +1,121 @@
+# tools/images/tests/test_cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import time
+
+from django.test import SimpleTestCase
+
+from tools.images.cache import ResultCache, file_digest
+from tools.images.converter import ImagesConverter
+
+from .utils import make_image, temp_dir
+
+
+class ResultCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.cache = ResultCache(self.tmp / "cache", max_bytes=10_000)
+
+    def age(self, key: str, seconds: float) -> None:
+        t = time.time() - seconds
+        os.utime(self.cache._path(key), (t, t))
+
+    def test_put_get_roundtrip(self):
+        key = ResultCache.key_for("abc", "png", {"q": 1})
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, b"payload", {"name": "x.png"})
+        entry = self.cache.get(key)
+        self.assertEqual((entry.data, entry.meta), (b"payload", {"name": "x.png"}))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_key_depends_on_ext_and_params(self):
+        keys = {
+            ResultCache.key_for("abc", "png", {"q": 1}),
+            ResultCache.key_for("abc", "webp", {"q": 1}),
+            ResultCache.key_for("abc", "png", {"q": 2}),
+            ResultCache.key_for("abd", "png", {"q": 1}),
+        }
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(ResultCache.key_for("abc", "png", {"a": 1, "b": 2}), ResultCache.key_for("abc", "png", {"b": 2, "a": 1}))
+
+    def test_corrupt_entry_is_a_miss(self):
+        key = ResultCache.key_for("abc", "png", {})
+        self.cache.put(key, b"payload", {})
+        self.cache._path(key).write_bytes(b"\xff\xff\xff\xff{")
+        self.assertIsNone(self.cache.get(key))
+
+    def test_eviction_drops_least_recently_used(self):
+        keys = [ResultCache.key_for(str(i), "png", {}) for i in range(3)]
+        for i, key in enumerate(keys):
+            self.cache.put(key, b"x" * 3000, {})
+            self.age(key, 100 - i)
+        self.cache.get(keys[0])  # acerto renova o mtime: passa a ser o mais recente
+        self.cache.put(ResultCache.key_for("3", "png", {}), b"x" * 3000, {})  # passa de max_bytes
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertLessEqual(self.cache.stats()["bytes"], 9_000)
+
+    def test_eviction_skips_while_locked_and_breaks_stale_lock(self):
+        key = ResultCache.key_for("0", "png", {})
+        self.cache.put(key, b"x" * 3000, {})
+        self.cache.max_bytes = 100
+        lock = self.cache.root / ".evict.lock"
+        lock.touch()
+        self.assertEqual(self.cache.evict(), 0)
+        self.assertTrue(lock.exists())
+        t = time.time() - self.cache.lock_timeout - 1
+        os.utime(lock, (t, t))
+        self.cache.evict()  # só remove o lock abandonado
+        self.assertGreater(self.cache.evict(), 0)
+        self.assertFalse(lock.exists())
+
+    def test_pickled_copy_keeps_size_estimate(self):
+        self.cache.put(ResultCache.key_for("0", "png", {}), b"x" * 3000, {})
+        fresh = ResultCache(self.cache.root, max_bytes=10_000)
+        copy = pickle.loads(pickle.dumps(fresh))  # como chega a um processo do pool
+        self.assertEqual(copy._approx_bytes, fresh._approx_bytes)
+        self.assertGreater(copy._approx_bytes, 3000)
+
+    def test_record_remote_counts_and_evicts(self):
+        keys = [ResultCache.key_for(str(i), "png", {}) for i in range(3)]
+        for key in keys:
+            self.cache.put(key, b"x" * 3000, {})
+        self.cache.record_remote(hits=2, misses=1, stored_bytes=3000)  # gravação de outro processo
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+        self.assertLessEqual(self.cache.stats()["bytes"], 9_000)
+
+
+class ConverterCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.cache = ResultCache(self.tmp / "cache")
+        self.src = make_image(self.tmp / "in" / "photo.png")
+
+    def test_second_conversion_hits(self):
+        first = ImagesConverter(cache=self.cache).convert_one_to_bytes(self.src, "webp")
+        again = ImagesConverter(cache=self.cache).convert_one_to_bytes(self.src, "webp")
+        self.assertEqual((first.cache_hit, again.cache_hit), (False, True))
+        self.assertEqual(first.data, again.data)
+        self.assertEqual(first.dst, again.dst)
+
+    def test_output_params_change_the_key(self):
+        ImagesConverter(cache=self.cache, webp_quality=80).convert_one_to_bytes(self.src, "webp")
+        other = ImagesConverter(cache=self.cache, webp_quality=50).convert_one_to_bytes(self.src, "webp")
+        renamed = ImagesConverter(cache=self.cache, webp_quality=50, brand_tag="outro").convert_one_to_bytes(self.src, "webp")
+        self.assertFalse(other.cache_hit)
+        self.assertTrue(renamed.cache_hit)  # o nome não entra na chave
+        self.assertIn("outro", renamed.dst.name)
+
+    def test_pool_lookups_reach_the_parent_cache(self):
+        files = [make_image(self.tmp / "in" / f"{i}.png", seed=i) for i in range(3)]
+        conv = ImagesConverter(workers=2, cache=self.cache)
+        conv.convert_batch_to_zip(files, out_ext="png", work_dir=self.tmp / "a")
+        batch = conv.convert_batch_to_zip(files, out_ext="png", work_dir=self.tmp / "b")
+        self.assertEqual(batch.cache_hits, 3)
+        self.assertEqual((self.cache.hits, self.cache.misses), (3, 3))
+
+    def test_file_digest(self):
+        self.assertEqual(file_digest(self.src), hashlib.sha256(self.src.read_bytes()).hexdigest())
@@ -0,0 +1,365 @@
+# tools/images/tests/test_converter.py
+from __future__ import annotations
+
+import hashlib
+import io
+import random
+import shutil
+import zipfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from tools.images import converter
+from tools.images.bench import FLATTEN_SOURCES, _flatten_source, _legacy_flatten, _synthetic_rgb
+from tools.images.converter import (
+    ENCODER_PRESETS, QUANTIZERS, ImagesConverter, _decode_reduced, _duplicate_map, _encoder_kwargs, _ext_list,
+    _flatten_alpha,
+    _has_libimagequant, _prepare_image_for_format, _quantize, _quantize_method, _resize_for_box, _scaled_size,
+    ext_label,
+)
+
+from .utils import make_image, temp_dir
+
+
+def zip_contents(path) -> dict:
+    with zipfile.ZipFile(path) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+class ParallelBatchTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.files = [make_image(self.tmp / "in" / f"img{i}.png", seed=i * 40) for i in range(4)]
+
+    def test_pool_matches_sequential(self):
+        seq = ImagesConverter().convert_batch_to_zip(self.files, out_ext="jpeg", work_dir=self.tmp / "seq")
+        par = ImagesConverter(workers=2).convert_batch_to_zip(self.files, out_ext="jpeg", work_dir=self.tmp / "par")
+        self.assertTrue(par.ok)
+        self.assertEqual(par.converted, 4)
+        self.assertEqual([r.src for r in par.results], self.files)  # ordem de entrada
+        self.assertEqual(zip_contents(seq.zip_path), zip_contents(par.zip_path))
+
+    def test_pool_reports_broken_file_without_failing_batch(self):
+        bad = self.tmp / "in" / "broken.png"
+        bad.write_bytes(b"not an image")
+        batch = ImagesConverter(workers=2).convert_batch_to_zip([*self.files, bad], out_ext="webp", work_dir=self.tmp / "out")
+        self.assertTrue(batch.ok)
+        self.assertEqual(batch.converted, 4)
+        self.assertEqual([r.src for r in batch.errors], [bad])
+
+
+class PipelineZipTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.files = [make_image(self.tmp / "in" / f"img{i}.png", seed=i * 40) for i in range(3)]
+
+    def test_pipeline_matches_outputs_on_disk(self):
+        conv = ImagesConverter()
+        piped = conv.convert_batch_to_zip(self.files, out_ext="png", work_dir=self.tmp / "piped")
+        kept = conv.convert_batch_to_zip(self.files, out_ext="png", work_dir=self.tmp / "kept", keep_outputs=True)
+        self.assertFalse((self.tmp / "piped" / "out").exists())
+        self.assertEqual(zip_contents(piped.zip_path), zip_contents(kept.zip_path))
+
+    def test_stored_and_deflated_entries(self):
+        batch = ImagesConverter().convert_batch_to_zip(self.files, out_ext=["jpeg", "bmp"], work_dir=self.tmp / "out")
+        with zipfile.ZipFile(batch.zip_path) as zf:
+            types = {info.filename.rsplit(".", 1)[1]: info.compress_type for info in zf.infolist()}
+        self.assertEqual(types, {"jpeg": zipfile.ZIP_STORED, "bmp": zipfile.ZIP_DEFLATED})
+
+    def test_no_output_removes_zip(self):
+        bad = self.tmp / "in" / "broken.png"
+        bad.write_bytes(b"nope")
+        batch = ImagesConverter().convert_batch_to_zip([bad], out_ext="png", work_dir=self.tmp / "out")
+        self.assertFalse(batch.ok)
+        self.assertIsNone(batch.zip_path)
+        self.assertEqual(list((self.tmp / "out").iterdir()), [])
+
+
+class ReducedDecodeTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def test_reduce_keeps_at_least_min_size(self):
+        with Image.open(make_image(self.tmp / "big.png", size=(400, 300))) as im:
+            im.load()
+            out, reduced = _decode_reduced(im, (90, 90))
+        self.assertTrue(reduced)
+        self.assertEqual(out.size, (134, 100))  # fator 3 (reduce arredonda para cima)
+
+    def test_no_reduction_below_factor_two_or_without_target(self):
+        with Image.open(make_image(self.tmp / "big.png", size=(400, 300))) as im:
+            self.assertEqual(_decode_reduced(im, (250, 100)), (im, False))
+            self.assertEqual(_decode_reduced(im, None), (im, False))
+
+    def test_palette_images_are_not_reduced(self):
+        with Image.open(make_image(self.tmp / "big.gif", size=(400, 300), mode="P")) as im:
+            self.assertFalse(_decode_reduced(im, (50, 50))[1])
+
+    def test_jpeg_uses_draft(self):
+        with Image.open(make_image(self.tmp / "big.jpg", size=(800, 600))) as im:
+            out, reduced = _decode_reduced(im, (150, 150))
+            self.assertTrue(reduced)
+            self.assertEqual(out.size, (200, 150))  # escala 1/4 da DCT
+
+    def test_resized_output_size_unchanged(self):
+        src = make_image(self.tmp / "big.png", size=(1200, 900))
+        r = ImagesConverter(max_width=100).convert_one_to_bytes(src, "png")
+        self.assertEqual(Image.open(io.BytesIO(r.data)).size, (100, 75))
+
+    def test_exif_rotation_swaps_the_box(self):
+        src = self.tmp / "rotated.jpg"
+        exif = Image.Exif()
+        exif[0x0112] = 6  # girar 90°
+        Image.new("RGB", (800, 400), "red").save(src, exif=exif)
+        conv = ImagesConverter(max_width=100)
+        with Image.open(src) as im:
+            self.assertEqual(conv._decode_min_size("PNG", im), (400, 200))
+        r = conv.convert_one_to_bytes(src, "png")
+        self.assertEqual(Image.open(io.BytesIO(r.data)).size, (100, 200))
+
+    def test_icon_decodes_at_most_once_its_largest_side(self):
+        conv = ImagesConverter()
+        with Image.open(make_image(self.tmp / "big.png", size=(1024, 1024))) as im:
+            self.assertEqual(conv._decode_min_size("ICO", im), (256, 256))
+            self.assertIsNone(conv._decode_min_size_for(["ICO", "PNG"], im))
+
+
+class ResizeTests(SimpleTestCase):
+    def resize(self, im, mode, resample="lanczos", background_rgb=(255, 255, 255)):
+        return _resize_for_box(im, box_w=100, box_h=100, mode=mode, resample=resample, background_rgb=background_rgb)
+
+    def test_scaled_size(self):
+        self.assertEqual(_scaled_size(400, 200, 100, 100, "fit"), (100, 50))
+        self.assertEqual(_scaled_size(400, 200, 100, 100, "fill"), (200, 100))
+        self.assertEqual(_scaled_size(400, 200, None, 50, "fill"), (100, 50))  # um lado só: fit
+        self.assertIsNone(_scaled_size(80, 60, 100, 100, "fit"))  # nunca amplia
+        self.assertIsNone(_scaled_size(80, 60, None, None, "fit"))
+
+    def test_fit_keeps_aspect(self):
+        self.assertEqual(self.resize(Image.new("RGB", (400, 200)), "fit").size, (100, 50))
+
+    def test_fill_crops_center(self):
+        im = Image.new("RGB", (400, 200), "red")
+        im.paste((0, 0, 255), (0, 0, 100, 200))  # faixa azul na esquerda, fora do recorte
+        out = self.resize(im, "fill", resample="nearest")
+        self.assertEqual(out.size, (100, 100))
+        self.assertEqual(out.getpixel((0, 50)), (255, 0, 0))
+
+    def test_contain_pads_with_background(self):
+        out = self.resize(Image.new("RGB", (400, 200), "red"), "contain", background_rgb=(0, 255, 0))
+        self.assertEqual(out.size, (100, 100))
+        self.assertEqual((out.getpixel((50, 5)), out.getpixel((50, 50))), ((0, 255, 0), (255, 0, 0)))
+
+    def test_contain_pads_alpha_with_transparency(self):
+        out = self.resize(Image.new("RGBA", (400, 200), (255, 0, 0, 255)), "contain")
+        self.assertEqual(out.getpixel((50, 5)), (0, 0, 0, 0))
+
+    def test_palette_is_filtered_in_rgb(self):
+        self.assertEqual(self.resize(Image.new("P", (400, 200)), "fit").mode, "RGB")
+
+    def test_converter_resizes_before_encoding(self):
+        src = make_image(temp_dir(self) / "in.png", size=(300, 100))
+        conv = ImagesConverter(max_width=60, max_height=60, resize_mode="contain")
+        self.assertEqual(Image.open(io.BytesIO(conv.convert_one_to_bytes(src, "jpeg").data)).size, (60, 60))
+
+
+class EncoderPresetTests(SimpleTestCase):
+    def kwargs(self, pil_fmt, preset, **params):
+        base = dict(
+            exif_bytes=None, icc_profile=None, jpeg_quality=85, jpeg_progressive=True, webp_quality=85,
+            png_compress_level=6, tiff_compression=None,
+        )
+        return _encoder_kwargs(Image.new("RGB", (8, 8)), pil_fmt, **{**base, **params}, encoder_preset=preset)
+
+    def test_png_keeps_user_level(self):
+        self.assertEqual(self.kwargs("PNG", "max-compression", png_compress_level=3), {"compress_level": 3, "optimize": True})
+        self.assertEqual(self.kwargs("PNG", "balanced", png_compress_level=3), {"compress_level": 3, "optimize": False})
+        self.assertEqual(self.kwargs("PNG", "fast", png_compress_level=9), {"compress_level": 9, "optimize": False})
+
+    def test_preset_fills_unset_values(self):
+        self.assertEqual(self.kwargs("PNG", "fast", png_compress_level=None)["compress_level"], 1)
+        self.assertEqual(self.kwargs("PNG", "balanced", png_compress_level=None)["compress_level"], 6)
+        self.assertTrue(self.kwargs("PNG", "fast", optimize=True)["optimize"])
+        self.assertFalse(self.kwargs("JPEG", "max-compression", optimize=False)["optimize"])
+        self.assertNotIn("optimize", self.kwargs("WEBP", "fast", optimize=True))
+
+    def test_quality_is_never_touched(self):
+        for preset in ENCODER_PRESETS:
+            self.assertEqual(self.kwargs("JPEG", preset, jpeg_quality=70)["quality"], 70)
+            self.assertEqual(self.kwargs("WEBP", preset, webp_quality=60)["quality"], 60)
+
+    def test_unknown_preset_falls_back(self):
+        self.assertEqual(self.kwargs("WEBP", "nope"), self.kwargs("WEBP", "max-compression"))
+        self.assertEqual(ImagesConverter(encoder_preset="nope").encoder_preset, "max-compression")
+
+    def test_lossless_output_pixels_match_across_presets(self):
+        src = make_image(temp_dir(self) / "in.png", mode="RGBA")
+        outputs = {p: ImagesConverter(encoder_preset=p).convert_one_to_bytes(src, "png").data for p in ENCODER_PRESETS}
+        self.assertLess(len(outputs["max-compression"]), len(outputs["fast"]))
+        pixels = {p: Image.open(io.BytesIO(data)).tobytes() for p, data in outputs.items()}
+        self.assertEqual(len(set(pixels.values())), 1)
+
+
+class QuantizerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        # 16 cores distintas: cabem na paleta sem perda em qualquer backend
+        self.im = Image.new("RGB", (64, 64))
+        for i in range(16):
+            self.im.paste(((i * 16) % 256, (i * 48) % 256, (i * 80) % 256), ((i % 4) * 16, (i // 4) * 16, (i % 4) * 16 + 16, (i // 4) * 16 + 16))
+
+    def test_backends_map_small_palettes_exactly(self):
+        for name in QUANTIZERS:
+            with self.subTest(quantizer=name):
+                out = _quantize(self.im, quantizer=name)
+                self.assertEqual(out.mode, "P")
+                self.assertEqual(out.convert("RGB").tobytes(), self.im.tobytes())
+
+    def test_sampled_palette_keeps_full_resolution(self):
+        out = _quantize(self.im, sample_side=16)
+        self.assertEqual(out.size, (64, 64))
+        self.assertLessEqual(len(out.getcolors()), 256)
+
+    def test_transparent_index(self):
+        im = self.im.convert("RGBA")
+        im.putalpha(Image.new("L", im.size, 255))
+        im.paste((0, 0, 0, 0), (0, 0, 8, 8))
+        out = _quantize(im, transparent_index=255)
+        self.assertEqual((out.info["transparency"], out.getpixel((0, 0)), out.getpixel((40, 40)) != 255), (255, 255, True))
+
+    def test_fallbacks(self):
+        expected = QUANTIZERS["libimagequant"] if _has_libimagequant() else QUANTIZERS["fastoctree"]
+        self.assertEqual(_quantize_method("libimagequant"), expected)
+        self.assertEqual(_quantize_method("mediancut"), Image.Quantize.MEDIANCUT)  # vale 0
+        self.assertEqual(_quantize_method("nope"), Image.Quantize.MEDIANCUT)
+        self.assertEqual(ImagesConverter().quantizer, "mediancut")
+        self.assertEqual(ImagesConverter(quantizer="nope").quantizer, "mediancut")
+
+    def test_quantizer_and_dither_are_output_params(self):
+        size = (96, 64)
+        src = self.tmp / "in.png"
+        Image.merge("RGB", (  # conteúdo "de foto": os backends escolhem paletas diferentes
+            Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 64),
+            Image.linear_gradient("L").resize(size),
+            Image.effect_noise(size, 40),
+        )).save(src)
+        outputs = {
+            (q, d): ImagesConverter(quantizer=q, dither=d).convert_one_to_bytes(src, "gif").data
+            for q in ("fastoctree", "mediancut") for d in (False, True)
+        }
+        self.assertEqual(len(set(outputs.values())), 4)
+        self.assertEqual(Image.open(io.BytesIO(outputs[("mediancut", True)])).mode, "P")
+
+
+class MultiTargetTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.src = make_image(self.tmp / "in" / "a.png", size=(80, 60))
+
+    def test_ext_list_normalizes_and_dedups(self):
+        self.assertEqual(_ext_list([".PNG", "webp", "png"]), ["png", "webp"])
+        self.assertEqual(_ext_list("JPG"), ["jpg"])
+        self.assertEqual(ext_label(["png", "webp"]), "png+webp")
+
+    def test_decodes_once_for_every_target(self):
+        conv = ImagesConverter(max_width=40)
+        with mock.patch.object(converter.Image, "open", wraps=Image.open) as opened:
+            results = conv.convert_many_to_bytes(self.src, ["png", "webp", "jpeg"])
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual([r.dst_format for r in results], ["PNG", "WEBP", "JPEG"])
+        for r in results:
+            self.assertTrue(r.ok)
+            with Image.open(io.BytesIO(r.data)) as im:
+                self.assertEqual(im.size, (40, 30))
+
+    def test_matches_single_target_output(self):
+        conv = ImagesConverter()
+        many = conv.convert_many_to_bytes(self.src, ["png", "webp"])
+        single = [conv.convert_one_to_bytes(self.src, ext) for ext in ("png", "webp")]
+        self.assertEqual([r.data for r in many], [r.data for r in single])
+
+    def test_zip_has_every_target(self):
+        files = [self.src, make_image(self.tmp / "in" / "b.png", seed=9)]
+        for pipeline in (True, False):
+            batch = ImagesConverter().convert_batch_to_zip(
+                files, out_ext=["png", "webp"], work_dir=self.tmp / f"out{pipeline}", pipeline=pipeline,
+            )
+            self.assertEqual(batch.converted, 4)
+            self.assertEqual(sorted(zip_contents(batch.zip_path)), [f"{stem}--converte-tudo.{ext}" for stem in "ab" for ext in ("png", "webp")])
+
+
+class FlattenAlphaTests(SimpleTestCase):
+    BACKGROUND = (250, 128, 3)
+
+    def setUp(self):
+        self.base = _synthetic_rgb((57, 31), random.Random(5))
+
+    def test_matches_legacy_flatten(self):
+        for kind in FLATTEN_SOURCES:
+            with self.subTest(kind=kind):
+                im = _flatten_source(kind, self.base)
+                new = _flatten_alpha(im, self.BACKGROUND)
+                self.assertEqual(new.mode, "RGB")
+                self.assertEqual(new.tobytes(), _legacy_flatten(im, self.BACKGROUND).tobytes())
+
+    def test_formats_without_alpha_use_it(self):
+        im = _flatten_source("RGBA", self.base)
+        expected = _legacy_flatten(im, self.BACKGROUND).tobytes()
+        for fmt in ("JPEG", "BMP", "PCX"):
+            with self.subTest(fmt=fmt):
+                out = _prepare_image_for_format(im, fmt, background_rgb=self.BACKGROUND)
+                self.assertEqual((out.mode, out.tobytes()), ("RGB", expected))
+
+    def test_source_is_untouched(self):
+        im = _flatten_source("RGBA", self.base)
+        before = im.tobytes()
+        _flatten_alpha(im, self.BACKGROUND)
+        self.assertEqual((im.mode, im.tobytes()), ("RGBA", before))
+
+
+class DuplicateTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.a = make_image(self.tmp / "in" / "a.png")
+        self.copy = Path(shutil.copy(self.a, self.tmp / "in" / "copy.png"))
+        self.other = make_image(self.tmp / "in" / "other.png", seed=7)
+        self.files = [self.a, self.copy, self.other]
+
+    def test_duplicate_map_reads_same_size_files(self):
+        same_size = self.tmp / "in" / "same-size.png"  # mesmo tamanho, outro conteúdo
+        data = bytearray(self.a.read_bytes())
+        data[-20] ^= 0xFF
+        same_size.write_bytes(bytes(data))
+        files = [*self.files, same_size, self.tmp / "in" / "missing.png"]
+        self.assertEqual(_duplicate_map(files), {1: 0})
+
+    def test_duplicate_map_uses_upload_digests(self):
+        digests = {p.name: hashlib.sha256(p.read_bytes()).hexdigest() for p in self.files}
+        with mock.patch.object(converter, "file_digest") as file_digest:
+            self.assertEqual(_duplicate_map(self.files, digests), {1: 0})
+        file_digest.assert_not_called()
+        digests["copy.png"] = "0" * 64  # o hash do upload manda
+        self.assertEqual(_duplicate_map(self.files, digests), {})
+
+    def test_copies_are_not_converted_again(self):
+        conv = ImagesConverter()
+        with mock.patch.object(conv, "_convert", wraps=conv._convert) as convert:
+            batch = conv.convert_batch_to_zip(self.files, out_ext=["png", "webp"], work_dir=self.tmp / "out")
+        self.assertEqual(convert.call_count, 2)
+        self.assertEqual((batch.converted, batch.duplicates), (6, 1))
+        self.assertEqual([r.duplicate_of for r in batch.results[2:4]], [self.a, self.a])
+        entries = zip_contents(batch.zip_path)
+        for ext in ("png", "webp"):
+            self.assertEqual(entries[f"copy--converte-tudo.{ext}"], entries[f"a--converte-tudo.{ext}"])
+
+    def test_every_batch_mode_names_copies(self):
+        conv = ImagesConverter()
+        expected = sorted(f"{p.stem}--converte-tudo.webp" for p in self.files)
+        kept = conv.convert_batch_to_zip(self.files, out_ext="webp", work_dir=self.tmp / "kept", keep_outputs=True)
+        streamed = io.BytesIO(b"".join(conv.iter_zip(self.files, out_ext="webp")))
+        self.assertEqual(sorted(zip_contents(kept.zip_path)), expected)
+        self.assertEqual(sorted(zip_contents(streamed)), expected)
+        self.assertEqual((self.tmp / "kept" / "out" / expected[0]).read_bytes(), (self.tmp / "kept" / "out" / expected[1]).read_bytes())
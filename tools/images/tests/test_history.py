@@ -0,0 +1,104 @@
+# tools/images/tests/test_history.py
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from tools.images import history
+from tools.images.converter import BatchResult, ConvertResult
+from tools.images.models import ConversionJob, ConversionRollup
+
+NOON = timezone.make_aware(datetime(2026, 10, 17, 12, 30))  # no fuso do site
+
+
+def batch_of(*pairs, ok: bool = True) -> BatchResult:
+    """Lote com um arquivo por par (origem, destino); `ok=False` deixa o último com erro."""
+    results = [
+        ConvertResult(
+            src=Path(f"{i}.{src.lower()}"), ok=True, dst=None, dst_format=dst, fallback_used=False,
+            src_format=src, src_bytes=100, out_bytes=40, timings={"encode": 0.5},
+        )
+        for i, (src, dst) in enumerate(pairs)
+    ]
+    if not ok:
+        results[-1].ok = False
+    return BatchResult(
+        ok=True, zip_path=None, converted=sum(r.ok for r in results), fallback_count=0,
+        errors=[r for r in results if not r.ok], results=results,
+        src_bytes=100 * len(results), out_bytes=40 * len(results),
+    )
+
+
+class RecordTests(TestCase):
+    def test_job_and_rollups(self):
+        history.record(batch_of(("PNG", "JPEG"), ("GIF", "JPEG"), ok=False), out_ext="jpeg", now=NOON)
+        job = ConversionJob.objects.get()
+        self.assertEqual((job.src_formats, job.dst_formats, job.files, job.converted, job.errors), ("GIF,PNG", "JPEG", 2, 1, 1))
+        total = ConversionRollup.objects.get(period=ConversionRollup.ALL, src_format="", dst_format="")
+        self.assertEqual((total.jobs, total.files, total.converted, total.errors, total.src_bytes, total.seconds), (1, 2, 1, 1, 200, 1.0))
+        # (PNG, JPEG), (GIF, JPEG), (PNG, ""), (GIF, ""), ("", JPEG), ("", "") em cada período
+        self.assertEqual(ConversionRollup.objects.filter(period=ConversionRollup.HOUR).count(), 6)
+
+    def test_increments_existing_rows(self):
+        for _ in range(3):
+            history.record(batch_of(("PNG", "JPEG")), out_ext="jpeg", now=NOON)
+        row = ConversionRollup.objects.get(period=ConversionRollup.DAY, src_format="PNG", dst_format="JPEG")
+        self.assertEqual((row.jobs, row.files, row.out_bytes), (3, 3, 120))
+
+    def test_query_count_does_not_grow_with_formats(self):
+        counts = []
+        for pairs in ([("PNG", "JPEG")], [("PNG", "JPEG"), ("GIF", "WEBP"), ("BMP", "PNG"), ("TIFF", "GIF")]):
+            with CaptureQueriesContext(connection) as ctx:
+                history.record(batch_of(*pairs), out_ext="jpeg", now=NOON)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_empty_batch_is_ignored(self):
+        history.record(batch_of(), out_ext="png", now=NOON)
+        self.assertFalse(ConversionJob.objects.exists())
+
+    def test_sink_logs_database_errors(self):
+        with mock.patch.object(history, "record", side_effect=DatabaseError("down")), \
+                self.assertLogs("tools.images.history", "ERROR"):
+            history.DatabaseSink().observe_batch(batch_of(("PNG", "JPEG")), out_ext="jpeg")
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        history.record(batch_of(("PNG", "JPEG"), ("GIF", "WEBP")), out_ext="jpeg", now=NOON - timedelta(days=1))
+        history.record(batch_of(("PNG", "JPEG"), ("PNG", "JPEG"), ("GIF", "WEBP")), out_ext="jpeg", now=NOON - timedelta(hours=2))
+        history.record(batch_of(("BMP", "PNG")), out_ext="png", now=NOON)
+
+    def test_totals_by_period(self):
+        with self.assertNumQueries(1):
+            data = history.stats(now=NOON)
+        self.assertEqual((data["total"], data["today"], data["this_hour"]), (6, 4, 1))
+        self.assertEqual(data["formats_today"], [
+            {"format": "JPEG", "converted": 2}, {"format": "PNG", "converted": 1}, {"format": "WEBP", "converted": 1},
+        ])
+
+    def test_cached_stats(self):
+        with self.settings(IMAGES_STATS_CACHE_SECONDS=60):
+            first = history.cached_stats()
+            history.record(batch_of(("PNG", "JPEG")), out_ext="jpeg")
+            with self.assertNumQueries(0):
+                self.assertEqual(history.cached_stats(), first)
+        with self.settings(IMAGES_STATS_CACHE_SECONDS=0):
+            self.assertEqual(history.cached_stats()["total"], first["total"] + 1)
+
+    def test_stats_endpoint(self):
+        with self.settings(IMAGES_STATS_CACHE_SECONDS=30):
+            resp = self.client.get("/api/conversions/stats", HTTP_HOST="localhost")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.json()["ok"], resp.json()["total"]), (True, 6))
+        self.assertIn("max-age=30", resp["Cache-Control"])
+        self.assertEqual(self.client.post("/api/conversions/stats", HTTP_HOST="localhost").status_code, 405)
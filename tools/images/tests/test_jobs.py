@@ -0,0 +1,155 @@
+# tools/images/tests/test_jobs.py
+from __future__ import annotations
+
+import io
+import os
+import signal
+import time
+import zipfile
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from tools.images import jobs
+
+from .utils import add_formats, isolated_media, make_image
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        self.media = isolated_media(self)
+
+    def new_job(self, job_id: str, n_files: int = 2, out_ext=("png",)):
+        base = jobs.jobs_root() / job_id
+        names = [make_image(base / "src" / f"img{i}.bmp", fmt="BMP", seed=i * 50).name for i in range(n_files)]
+        jobs.enqueue(base, {"out_ext": list(out_ext), "files": names, "options": {}})
+        return base
+
+    def test_claim_is_exclusive_and_fifo(self):
+        first, second = self.new_job("a" * 32), self.new_job("b" * 32)
+        self.assertEqual(jobs.read_status(first)["state"], jobs.QUEUED)
+        self.assertEqual(jobs.claim_next(), first)
+        self.assertEqual(jobs.claim_next(), second)
+        self.assertIsNone(jobs.claim_next())
+        jobs.release(first)
+        (left,) = os.listdir(jobs._spool("running"))
+        self.assertTrue(left.endswith("-" + "b" * 32))
+
+    def test_run_job_writes_zip_and_status(self):
+        base = self.new_job("c" * 32)
+        self.assertEqual(jobs.claim_next(), base)
+        status = jobs.run_job(base)
+        jobs.release(base)
+        self.assertEqual(status["state"], jobs.DONE)
+        self.assertEqual(status["converted"], 2)
+        with zipfile.ZipFile(base / status["zip_name"]) as zf:
+            self.assertEqual(len(zf.namelist()), 2)
+
+    def test_requeue_stale_returns_dead_worker_jobs(self):
+        base = self.new_job("d" * 32)
+        jobs.claim_next()
+        (marker,) = jobs._spool("running").iterdir()
+        marker.write_text("999999999")  # PID que não existe
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim_next(), base)
+        self.assertEqual(jobs.requeue_stale(), 0)  # marcador com o nosso PID, vivo
+
+    def test_queued_job_is_stranded_without_worker(self):
+        base = self.new_job("f" * 32)
+        self.assertFalse(jobs.is_stranded(jobs.read_status(base)))  # recém-enfileirado
+        status = {**jobs.read_status(base), "updated_at": time.time() - 120}
+        self.assertTrue(jobs.is_stranded(status))  # nenhum worker deu sinal
+        jobs.heartbeat()
+        self.assertFalse(jobs.is_stranded(status))
+        os.utime(jobs._heartbeat_path(), (time.time() - 120,) * 2)
+        self.assertTrue(jobs.is_stranded(status))
+        self.assertFalse(jobs.is_stranded({**status, "state": jobs.RUNNING}))
+
+    def test_worker_signals_it_is_alive(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, sig, signal.getsignal(sig))
+        self.assertIsNone(jobs.worker_last_seen())
+        call_command("images_worker", "--once", stdout=io.StringIO())
+        self.assertIsNotNone(jobs.worker_last_seen())
+
+    def test_invalid_job_fails(self):
+        base = jobs.jobs_root() / ("e" * 32)
+        base.mkdir(parents=True)
+        self.assertEqual(jobs.run_job(base)["state"], jobs.FAILED)
+
+
+class ProcessViewTests(TestCase):
+    def setUp(self):
+        self.media = isolated_media(self)
+        add_formats("PNG", "JPEG")
+        self.src = make_image(self.media / "upload.png")
+
+    def post(self, **data):
+        with open(self.src, "rb") as fh:
+            return self.client.post(reverse("images:process"), {"arquivos": fh, **data}, HTTP_HOST="localhost")
+
+    def test_process_enqueues_and_status_follows_job(self):
+        resp = self.post(out_ext="jpeg")
+        self.assertEqual(resp.status_code, 202)
+        data = resp.json()
+        self.assertEqual(data["delivery"], "queue")
+        status = self.client.get(data["status_url"], HTTP_HOST="localhost").json()
+        self.assertEqual(status["state"], jobs.QUEUED)
+
+        base = jobs.claim_next()
+        self.assertEqual(base.name, data["job_id"])
+        self.assertEqual(jobs.read_spec(base)["out_ext"], ["jpeg"])
+        jobs.run_job(base)
+        status = self.client.get(data["status_url"], HTTP_HOST="localhost").json()
+        self.assertEqual((status["state"], status["converted"]), (jobs.DONE, 1))
+        self.assertTrue(status["zip_name"].endswith(".zip"))
+
+    def test_several_output_formats(self):
+        resp = self.post(out_ext=["png", "jpeg", "png"])
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(jobs.read_spec(jobs.job_dir(resp.json()["job_id"]))["out_ext"], ["png", "jpeg"])
+
+    def test_limits_output_formats(self):
+        add_formats("GIF", "WEBP", "BMP", "TIFF")
+        resp = self.post(out_ext=["png", "jpeg", "gif", "webp", "bmp", "tiff"])
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("out_ext", resp.json()["errors"])
+
+    def test_encoder_preset_defaults_to_plan(self):
+        with self.settings(CURRENT_PLAN="free"):
+            default = self.post(out_ext="png").json()["job_id"]
+            chosen = self.post(out_ext="png", encoder_preset="fast").json()["job_id"]
+        with self.settings(CURRENT_PLAN="free", IMAGES_ENCODER_PRESETS={"FREE": "max-compression"}):
+            configured = self.post(out_ext="png").json()["job_id"]
+        presets = [jobs.read_spec(jobs.job_dir(j))["options"]["encoder_preset"] for j in (default, chosen, configured)]
+        self.assertEqual(presets, ["balanced", "fast", "max-compression"])
+
+    def test_quantizer_defaults_to_setting(self):
+        default = self.post(out_ext="png").json()["job_id"]
+        chosen = self.post(out_ext="png", quantizer="fastoctree").json()["job_id"]
+        with self.settings(IMAGES_QUANTIZER="libimagequant"):
+            configured = self.post(out_ext="png").json()["job_id"]
+        quantizers = [jobs.read_spec(jobs.job_dir(j))["options"]["quantizer"] for j in (default, chosen, configured)]
+        self.assertEqual(quantizers, ["mediancut", "fastoctree", "libimagequant"])
+
+    def test_png_level_left_to_preset_when_not_sent(self):
+        options = jobs.read_spec(jobs.job_dir(self.post(out_ext="png").json()["job_id"]))["options"]
+        self.assertIsNone(options["png_compress_level"])
+
+    def test_rejects_non_image(self):
+        self.src.write_bytes(b"plain text")
+        resp = self.post(out_ext="png")
+        self.assertEqual((resp.status_code, resp.json()["code"]), (415, "INVALID_IMAGE"))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_status_reports_job_without_worker_as_error(self):
+        job_id = self.post(out_ext="png").json()["job_id"]
+        with self.settings(IMAGES_WORKER_STALE_SECONDS=0):
+            data = self.client.get(reverse("images:job_status", args=[job_id]), HTTP_HOST="localhost").json()
+        self.assertEqual((data["ok"], data["state"], data["code"]), (False, jobs.FAILED, "WORKER_UNAVAILABLE"))
+        self.assertEqual(jobs.read_status(jobs.job_dir(job_id))["state"], jobs.QUEUED)  # o job segue na fila
+
+    def test_unknown_job(self):
+        resp = self.client.get(reverse("images:job_status", args=["f" * 32]), HTTP_HOST="localhost")
+        self.assertEqual((resp.status_code, resp.json()["code"]), (404, "JOB_NOT_FOUND"))
@@ -0,0 +1,88 @@
+# tools/images/tests/test_metrics.py
+from __future__ import annotations
+
+import json
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from tools.images import metrics
+from tools.images.converter import STAGES, ImagesConverter
+
+from .utils import isolated_media, make_image, temp_dir
+
+
+class RecordingSink(metrics.MetricsSink):
+    def __init__(self):
+        self.batches = []
+
+    def observe_batch(self, batch, *, out_ext):
+        self.batches.append((batch, out_ext))
+
+
+class TimingTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        self.files = [make_image(self.tmp / "in" / f"{i}.png", seed=i) for i in range(2)]
+
+    def test_results_carry_stage_timings_and_bytes(self):
+        r = ImagesConverter(max_width=32).convert_one_to_bytes(self.files[0], "jpeg")
+        self.assertTrue({"decode", "resize", "prepare", "encode"} <= set(r.timings) <= set(STAGES))
+        self.assertEqual(r.src_format, "PNG")
+        self.assertEqual((r.src_bytes, r.out_bytes), (self.files[0].stat().st_size, len(r.data)))
+
+    def test_batch_sums_stages_and_calls_sink_once(self):
+        sink = RecordingSink()
+        batch = ImagesConverter().convert_batch_to_zip(self.files, out_ext=["png", "webp"], work_dir=self.tmp / "out", metrics=sink)
+        self.assertEqual(len(sink.batches), 1)
+        self.assertIs(sink.batches[0][0], batch)
+        self.assertEqual(sink.batches[0][1], "png+webp")
+        self.assertAlmostEqual(batch.timings["encode"], sum(r.timings.get("encode", 0) for r in batch.results))
+        self.assertIn("total", batch.timings)
+        self.assertEqual(batch.src_bytes, sum(f.stat().st_size for f in self.files))  # origem conta uma vez
+        self.assertEqual(batch.zip_bytes, batch.zip_path.stat().st_size)
+
+
+class PrometheusTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        files = [make_image(self.tmp / "in" / f"{i}.png", seed=i) for i in range(2)]
+        self.batch = ImagesConverter().convert_batch_to_zip(files, out_ext="jpeg", work_dir=self.tmp / "out")
+
+    def test_counters_sum_across_processes(self):
+        directory = self.tmp / "m"
+        metrics.PrometheusSink(directory).observe_batch(self.batch, out_ext="jpeg")
+        (own,) = directory.glob("*.json")
+        own.rename(directory / "outro-host-1.json")  # arquivo de outro processo
+        metrics.PrometheusSink(directory).observe_batch(self.batch, out_ext="jpeg")
+        values = metrics.collect(directory)
+        key = ("images_conversions_total", (("dst_format", "JPEG"), ("outcome", "ok"), ("src_format", "PNG")))
+        self.assertEqual(values[key], 4)
+        self.assertEqual(values[("images_batches_total", (("ok", "true"), ("out_ext", "jpeg")))], 2)
+
+    def test_render(self):
+        sink = metrics.PrometheusSink(self.tmp / "m")
+        sink.observe_batch(self.batch, out_ext="jpeg")
+        text = metrics.render_prometheus(metrics.collect(self.tmp / "m"))
+        self.assertIn("# TYPE images_stage_seconds summary", text)
+        self.assertIn('images_conversions_total{dst_format="JPEG",outcome="ok",src_format="PNG"} 2', text)
+        self.assertRegex(text, r'images_stage_seconds_count\{dst_format="JPEG",src_format="PNG",stage="encode"\} 2\n')
+
+    def test_logging_sink(self):
+        with self.assertLogs("tools.images.metrics", "INFO") as logs:
+            metrics.LoggingSink().observe_batch(self.batch, out_ext="jpeg")
+        payload = json.loads(logs.records[0].getMessage())
+        self.assertEqual((payload["event"], payload["converted"]), ("batch_converted", 2))
+
+    def test_format_label(self):
+        self.assertEqual((metrics.format_label("png"), metrics.format_label(None)), ("PNG", "UNKNOWN"))
+
+
+class MetricsViewTests(SimpleTestCase):
+    def test_requires_token(self):
+        media = isolated_media(self)
+        with self.settings(IMAGES_METRICS={"SINKS": [], "DIR": str(media / "_metrics"), "TOKEN": "s3cret"}):
+            self.assertEqual(self.client.get(reverse("images:metrics"), HTTP_HOST="localhost").status_code, 401)
+            resp = self.client.get(reverse("images:metrics"), HTTP_HOST="localhost", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
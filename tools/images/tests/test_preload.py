@@ -0,0 +1,68 @@
+# tools/images/tests/test_preload.py
+from __future__ import annotations
+
+import io
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from tools.images import preload
+
+
+def run_fresh(code: str) -> dict:
+    """Roda `code` num interpretador novo (com Django configurado) e devolve o JSON que ele imprime."""
+    prelude = "import django, io, json, os, sys\nos.environ.setdefault('DJANGO_SETTINGS_MODULE', 'convert_all.settings')\ndjango.setup()\n"
+    proc = subprocess.run(
+        [sys.executable, "-c", prelude + code], cwd=str(settings.BASE_DIR), capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_urls_do_not_load_converter_or_pillow(self):
+        loaded = run_fresh(
+            "from django.urls import get_resolver\n"
+            "get_resolver().url_patterns\n"
+            "print(json.dumps(sorted(m for m in sys.modules if m.startswith(('PIL', 'tools.images')))))\n"
+        )
+        self.assertIn("tools.images.views", loaded)
+        for name in ("tools.images.converter", "tools.images.admission", "tools.images.strips"):
+            self.assertNotIn(name, loaded)
+        self.assertEqual([m for m in loaded if m.endswith("Plugin")], [])
+
+    def test_converter_formats_skip_pillow_init(self):
+        state = run_fresh(
+            "from PIL import Image\n"
+            "from tools.images.converter import load_plugins, pil_can_save\n"
+            "load_plugins()\n"
+            "saves = {f: pil_can_save(f) for f in ('TIFF', 'WEBP', 'TGA')}\n"
+            "for fmt in ('TIFF', 'WEBP', 'TGA'):\n"
+            "    buf = io.BytesIO()\n"
+            "    Image.new('RGB', (4, 4)).save(buf, fmt)\n"
+            "    buf.seek(0)\n"
+            "    Image.open(buf).load()\n"
+            "print(json.dumps({'initialized': Image._initialized, 'saves': saves}))\n"
+        )
+        self.assertLess(state["initialized"], 2)  # 2 = Image.init() importou todos os plugins
+        self.assertEqual(state["saves"], {"TIFF": True, "WEBP": True, "TGA": True})
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_loads_converter_and_plugins(self):
+        timings = preload.warm_up()
+        self.assertEqual(set(timings), {"urls", "converter", "plugins"})
+        self.assertIn("tools.images.converter", sys.modules)
+        self.assertIn("PIL.TiffImagePlugin", sys.modules)
+
+    def test_boot_profile_command(self):
+        out = io.StringIO()
+        call_command("images_boot_profile", "--runs", "1", "--top", "3", "--warm", "--json", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["runs"], 1)
+        self.assertIn("warm_up.plugins", report["stages_ms"])
+        self.assertIn("TiffImagePlugin", report["pil_plugins"])
+        self.assertEqual(len(report["top_modules"]), 3)
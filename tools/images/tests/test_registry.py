@@ -0,0 +1,59 @@
+# tools/images/tests/test_registry.py
+from __future__ import annotations
+
+from django.test import TestCase
+
+from tools.images import registry
+from tools.images.forms import ImageConvertForm
+from tools.images.models import ImageFormat
+
+from .utils import add_formats, isolated_media
+
+
+class RegistryTests(TestCase):
+    def setUp(self):
+        isolated_media(self)
+        add_formats("PNG", "JPEG", "XPM")
+
+    def test_one_query_per_process(self):
+        with self.assertNumQueries(1):
+            registry.all_formats()
+        with self.assertNumQueries(0):
+            registry.all_formats()
+            registry.choices()
+            registry.get("png")
+            ImageConvertForm()
+
+    def test_only_writable_formats_are_choices(self):
+        xpm = registry.get("xpm")
+        self.assertEqual((xpm.can_open, xpm.writable), (True, False))  # o Pillow lê XPM, mas não grava
+        self.assertEqual(registry.choices(), [("jpeg", "JPEG"), ("png", "PNG")])
+        self.assertEqual(ImageConvertForm().fields["out_ext"].choices, registry.choices())
+
+    def test_get_normalizes_value(self):
+        self.assertEqual(registry.get(" .PNG ").pil_format, "PNG")
+        self.assertIsNone(registry.get("svg"))
+        self.assertIsNone(registry.get(""))
+
+    def test_acronym_falls_back_to_known_extension(self):
+        ImageFormat.objects.create(acronym="TGA (TPIC)", file_extension=".tga; .tpic", format_name="TGA", description="")
+        tga = registry.get("tga")
+        self.assertEqual((tga.acronym, tga.pil_format), ("TGA (TPIC)", "TGA"))
+
+    def test_duplicate_values_are_listed_once(self):
+        add_formats("png")
+        self.assertEqual([f.value for f in registry.all_formats()].count("png"), 1)
+
+    def test_save_and_delete_invalidate(self):
+        registry.all_formats()
+        webp = ImageFormat.objects.create(acronym="WEBP", file_extension=".webp", format_name="WebP", description="")
+        self.assertIsNotNone(registry.get("webp"))
+        webp.delete()
+        self.assertIsNone(registry.get("webp"))
+
+    def test_ttl_expires_cache(self):
+        with self.settings(IMAGES_FORMAT_REGISTRY_TTL_SECONDS=0):
+            registry.invalidate()
+            registry.all_formats()
+            with self.assertNumQueries(1):
+                registry.all_formats()
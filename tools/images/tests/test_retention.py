@@ -0,0 +1,101 @@
+# tools/images/tests/test_retention.py
+from __future__ import annotations
+
+import io
+import time
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from tools.images import jobs, retention
+
+from .utils import isolated_media, temp_dir
+
+NOW = 1_000_000.0
+HOUR = 3600.0
+
+
+def make_job(root, name: str, state, *, age: float, size: int = 1000, now: float = NOW):
+    """Diretório de job com `size` bytes em src/ e última atividade há `age` segundos."""
+    base = root / name
+    (base / "src").mkdir(parents=True)
+    (base / "src" / "a.bin").write_bytes(b"x" * size)
+    if state is not None:
+        jobs._write_json(base / "status.json", {"state": state, "updated_at": now - age})
+    return base
+
+
+class SweepTests(SimpleTestCase):
+    def setUp(self):
+        self.root = temp_dir(self)
+
+    def sweep(self, **kwargs):
+        return retention.sweep(self.root, **{"ttl_seconds": 6 * HOUR, "now": NOW, **kwargs})
+
+    def test_ttl_and_abandoned(self):
+        old_done = make_job(self.root, "old-done", jobs.DONE, age=7 * HOUR)
+        old_failed = make_job(self.root, "old-failed", jobs.FAILED, age=7 * HOUR)
+        fresh = make_job(self.root, "fresh", jobs.DONE, age=HOUR)
+        running = make_job(self.root, "running", jobs.RUNNING, age=7 * HOUR)
+        stuck = make_job(self.root, "stuck", jobs.QUEUED, age=25 * HOUR)
+        result = self.sweep(active_max_age_seconds=24 * HOUR)
+        self.assertEqual(result.by_reason, {"ttl": 2, "abandoned": 1})
+        self.assertEqual((result.scanned, result.removed, result.kept_active), (5, 3, 1))
+        self.assertEqual(result.reclaimed_bytes, sum(result.reclaimed_by_reason.values()))
+        for path in (old_done, old_failed, stuck):
+            self.assertFalse(path.exists())
+        self.assertTrue(fresh.exists() and running.exists())
+
+    def test_active_jobs_are_kept_without_max_age(self):
+        make_job(self.root, "queued", jobs.QUEUED, age=100 * HOUR)
+        make_job(self.root, "no-status", None, age=0)
+        result = self.sweep()
+        self.assertEqual((result.removed, result.kept_active), (0, 2))
+
+    def test_high_water_drops_oldest_finished_until_low_water(self):
+        make_job(self.root, "a", jobs.DONE, age=3 * HOUR)
+        make_job(self.root, "b", jobs.DONE, age=2 * HOUR)
+        make_job(self.root, "c", jobs.DONE, age=1 * HOUR)
+        make_job(self.root, "d", jobs.RUNNING, age=5 * HOUR)
+        result = self.sweep(high_water_bytes=3500, low_water_ratio=0.6)  # 4000 > 3500; para em <= 2100
+        self.assertEqual(result.by_reason, {"high_water": 2})
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()), ["c", "d"])
+        self.assertEqual(result.total_bytes_after, sum(retention._dir_size(self.root / n) for n in "cd"))
+
+    def test_below_high_water_keeps_everything(self):
+        make_job(self.root, "a", jobs.DONE, age=HOUR)
+        self.assertEqual(self.sweep(high_water_bytes=10_000).removed, 0)
+
+    def test_dry_run_removes_nothing(self):
+        job = make_job(self.root, "old", jobs.DONE, age=7 * HOUR)
+        result = self.sweep(dry_run=True)
+        self.assertEqual((result.by_reason, result.reclaimed_bytes), ({"ttl": 1}, retention._dir_size(job)))
+        self.assertTrue(job.exists())
+
+    def test_purges_trash_and_ignores_hidden(self):
+        (self.root / ".trash-old" / "src").mkdir(parents=True)
+        (self.root / ".hidden").mkdir()
+        result = self.sweep()
+        self.assertEqual(result.scanned, 0)
+        self.assertEqual([p.name for p in self.root.iterdir()], [".hidden"])
+
+    def test_missing_root(self):
+        self.assertEqual(retention.sweep(self.root / "nope", ttl_seconds=1).scanned, 0)
+
+
+class CleanupCommandTests(SimpleTestCase):
+    def setUp(self):
+        isolated_media(self, IMAGES_RETENTION={"TTL_SECONDS": 60})
+        self.root = jobs.jobs_root()
+        self.root.mkdir(parents=True)
+
+    def test_uses_settings_and_overrides(self):
+        old = make_job(self.root, "a" * 32, jobs.DONE, age=120, now=time.time())
+        out = io.StringIO()
+        call_command("images_cleanup", "--dry-run", stdout=out)
+        self.assertIn("1 seriam removidos (ttl: 1)", out.getvalue())
+        self.assertTrue(old.exists())
+        call_command("images_cleanup", "--ttl", "600", stdout=io.StringIO())
+        self.assertTrue(old.exists())
+        call_command("images_cleanup", stdout=io.StringIO())
+        self.assertFalse(old.exists())
@@ -0,0 +1,137 @@
+# tools/images/tests/test_strips.py
+from __future__ import annotations
+
+import io
+import zlib
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image
+
+from tools.images import strips
+from tools.images.admission import probe
+from tools.images.converter import ImagesConverter
+
+from .utils import make_image, temp_dir
+
+SIZE = (61, 45)  # largura ímpar: linhas sem alinhamento de 4 bytes
+
+
+class StripConversionTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        # faixas de poucas linhas: várias por imagem, a última incompleta
+        patcher = mock.patch.object(strips, "STRIP_BYTES", SIZE[0] * 4 * 7)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def convert(self, src, ext, **options):
+        """(whole, banded, strips.write foi usado?) para `src` -> `ext`."""
+        whole = ImagesConverter(strip_min_pixels=None, **options).convert_one_to_bytes(src, ext)
+        with mock.patch.object(strips, "write", wraps=strips.write) as write:
+            banded = ImagesConverter(strip_min_pixels=1, **options).convert_one_to_bytes(src, ext)
+        return whole, banded, write.called
+
+    def assertSamePixels(self, a: bytes, b: bytes):
+        with Image.open(io.BytesIO(a)) as x, Image.open(io.BytesIO(b)) as y:
+            self.assertEqual((x.format, x.mode, x.size), (y.format, y.mode, y.size))
+            self.assertEqual(x.tobytes(), y.tobytes())
+
+    def test_png_sources_match_whole_image(self):
+        for mode in ("L", "RGB", "RGBA", "P"):
+            src = make_image(self.tmp / f"{mode}.png", size=SIZE, mode=mode)
+            for ext in ("png", "tiff", "bmp", "ppm"):
+                with self.subTest(mode=mode, ext=ext):
+                    whole, banded, used = self.convert(src, ext)
+                    self.assertTrue(used)
+                    self.assertTrue(banded.ok, banded.reason)
+                    self.assertSamePixels(whole.data, banded.data)
+
+    def test_raw_sources_match_whole_image(self):
+        for name in ("a.bmp", "a.ppm", "a.tif"):
+            src = make_image(self.tmp / name, size=SIZE)
+            with self.subTest(src=name):
+                whole, banded, used = self.convert(src, "png")
+                self.assertTrue(used)
+                self.assertSamePixels(whole.data, banded.data)
+
+    def test_tiff_deflate(self):
+        src = make_image(self.tmp / "a.png", size=SIZE, mode="RGBA")
+        whole, banded, used = self.convert(src, "tiff", tiff_compression="tiff_deflate")
+        self.assertTrue(used)
+        self.assertSamePixels(whole.data, banded.data)
+
+    def test_png_filters_match_whole_image(self):
+        def filtered(data: bytes) -> bytes:
+            buf = io.BytesIO(data)
+            return zlib.decompress(b"".join(
+                buf.getbuffer()[o: o + n].tobytes() for t, o, n in strips._png_chunks(buf) if t == b"IDAT"
+            ))
+
+        src = self.tmp / "m.png"  # conteúdo em que optimize escolhe outros filtros
+        Image.effect_mandelbrot(SIZE, (-2.0, -1.2, 1.0, 1.2), 64).convert("RGB").save(src)
+        for preset in ("balanced", "max-compression"):  # max-compression = optimize
+            with self.subTest(preset=preset):
+                whole, banded, used = self.convert(src, "png", encoder_preset=preset)
+                self.assertTrue(used)
+                self.assertEqual(filtered(whole.data), filtered(banded.data))
+
+    def test_tiff_with_exif_uses_whole_image(self):
+        src = self.tmp / "e.png"
+        exif = Image.Exif()
+        exif[0x010F] = "Camera"
+        with Image.open(make_image(self.tmp / "a.png", size=SIZE)) as im:
+            im.save(src, exif=exif)
+        whole, banded, used = self.convert(src, "tiff")
+        self.assertFalse(used)
+        with Image.open(io.BytesIO(banded.data)) as out:
+            self.assertEqual(out.getexif()[0x010F], "Camera")
+        self.assertTrue(self.convert(src, "png")[2])
+        self.assertFalse(ImagesConverter(strip_min_pixels=1).streams(probe(src), "tiff"))
+
+    def test_resize_and_rotation_use_whole_image(self):
+        src = make_image(self.tmp / "a.png", size=SIZE)
+        self.assertFalse(self.convert(src, "png", max_width=30)[2])
+        rotated = self.tmp / "r.tif"
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        with Image.open(src) as im:
+            im.save(rotated, exif=exif)
+        self.assertFalse(self.convert(rotated, "png")[2])
+
+
+class StripSupportTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def test_writable(self):
+        self.assertTrue(strips.writable("PNG"))
+        self.assertTrue(strips.writable("TIFF", "tiff_deflate"))
+        self.assertFalse(strips.writable("TIFF", "tiff_lzw"))
+        self.assertFalse(strips.writable("PPM", requested_ext="pbm"))
+        self.assertFalse(strips.writable("JPEG"))
+
+    def test_readable(self):
+        plain = make_image(self.tmp / "a.png", size=SIZE)
+        jpeg = make_image(self.tmp / "a.jpg", size=SIZE)
+        with Image.open(plain) as a, Image.open(jpeg) as b:
+            self.assertEqual((strips.readable(a), strips.readable(b)), (True, False))
+
+    def test_streams_needs_readable_source_and_target(self):
+        conv = ImagesConverter(strip_min_pixels=1)
+        info = probe(make_image(self.tmp / "a.png", size=SIZE))
+        self.assertTrue(conv.streams(info))
+        self.assertTrue(conv.streams(info, ["png", "tiff"]))
+        self.assertFalse(conv.streams(info, ["png", "jpeg"]))
+        self.assertFalse(ImagesConverter(strip_min_pixels=SIZE[0] * SIZE[1] + 1).streams(info, "png"))
+        self.assertFalse(ImagesConverter(strip_min_pixels=1, max_width=30).streams(info, "png"))
+        self.assertFalse(conv.streams(probe(make_image(self.tmp / "a.jpg", size=SIZE)), "png"))
+
+    def test_reader_must_implement_bands(self):
+        with Image.open(make_image(self.tmp / "a.png", size=SIZE)) as im:
+            with self.assertRaises(TypeError):
+                strips.StripReader(self.tmp / "a.png", im)
+
+    def test_band_rows(self):
+        self.assertEqual(strips.band_rows(100, 10), 10)
+        self.assertEqual(strips.band_rows(strips.STRIP_BYTES, 10), 1)
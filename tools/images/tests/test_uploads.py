@@ -0,0 +1,222 @@
+# tools/images/tests/test_uploads.py
+from __future__ import annotations
+
+import io
+import os
+import time
+import uuid
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from tools.images import jobs, uploads
+from tools.images.uploads import UploadError, UploadStalled
+
+from .utils import add_formats, isolated_media, make_image
+
+
+def accept_all(path, name):
+    return None
+
+
+class UploadTestMixin:
+    def new_upload(self, *entries, chunk_bytes: int = 4):
+        base = self.media / "tmp_uploads" / uuid.uuid4().hex
+        (base / "src").mkdir(parents=True)
+        uploads.create(base, {"out_ext": ["png"], "options": {}}, entries, chunk_bytes)
+        return base
+
+    def write(self, base, index, offset, data: bytes, check=accept_all, length=None):
+        return uploads.write_chunk(base, index, offset, io.BytesIO(data), len(data) if length is None else length, check)
+
+
+class WriteChunkTests(UploadTestMixin, SimpleTestCase):
+    def setUp(self):
+        self.media = isolated_media(self)
+        self.base = self.new_upload(("a.png", 6), ("b.png", 3))
+
+    def test_unique_names(self):
+        self.assertEqual(
+            uploads.unique_names(["foto.png", "FOTO.png", "a/b.png", ".oculto", ""]),
+            ["foto.png", "FOTO (2).png", "a_b.png", "oculto", "arquivo"],
+        )
+
+    def test_chunks_must_follow_offset(self):
+        self.assertEqual(self.write(self.base, 0, 0, b"abcd")["state"], "uploading")
+        with self.assertRaises(UploadError) as ctx:
+            self.write(self.base, 0, 0, b"ab")  # repetido: o cliente precisa retomar do 4
+        self.assertEqual((ctx.exception.code, ctx.exception.extra), ("OFFSET_MISMATCH", {"offset": 4}))
+        item = self.write(self.base, 0, 4, b"ef")
+        self.assertEqual((item["state"], item["offset"]), ("done", 6))
+        self.assertEqual((self.base / "src" / "a.png").read_bytes(), b"abcdef")
+        with self.assertRaises(UploadError) as ctx:
+            self.write(self.base, 0, 6, b"g")
+        self.assertEqual(ctx.exception.code, "FILE_COMPLETE")
+
+    def test_rejects_bad_chunks(self):
+        cases = [
+            ((5, 0, b"a"), "FILE_NOT_FOUND", 404),
+            ((0, 0, b""), "EMPTY_CHUNK", 400),
+            ((0, 0, b"abcde"), "CHUNK_TOO_LARGE", 413),
+            ((1, 0, b"abcd"), "CHUNK_OUT_OF_RANGE", 400),
+        ]
+        for args, code, status in cases:
+            with self.subTest(code=code), self.assertRaises(UploadError) as ctx:
+                self.write(self.base, *args)
+            self.assertEqual((ctx.exception.code, ctx.exception.status), (code, status))
+
+    def test_dropped_connection_keeps_what_arrived(self):
+        item = self.write(self.base, 0, 0, b"ab", length=4)
+        self.assertEqual(item["offset"], 2)
+        self.assertEqual([f["offset"] for f in uploads.state(self.base)["files"]], [2, 0])
+
+    def test_lock_blocks_concurrent_chunk(self):
+        lock = self.base / "src" / ".a.png.part.lock"
+        lock.touch()
+        with self.assertRaises(UploadError) as ctx:
+            self.write(self.base, 0, 0, b"ab")
+        self.assertEqual((ctx.exception.code, ctx.exception.status), ("UPLOAD_BUSY", 409))
+        old = time.time() - uploads._LOCK_STALE_SECONDS - 1
+        os.utime(lock, (old, old))  # dono do lock morreu no meio do pedaço
+        self.assertEqual(self.write(self.base, 0, 0, b"ab")["offset"], 2)
+        self.assertFalse(lock.exists())
+
+    def test_first_complete_file_queues_job_once(self):
+        self.write(self.base, 1, 0, b"xyz")
+        self.assertEqual(jobs.claim_next(), self.base)
+        self.write(self.base, 0, 0, b"abcd")
+        self.write(self.base, 0, 4, b"ef")
+        self.assertIsNone(jobs.claim_next())
+
+    def test_rejected_file(self):
+        item = self.write(self.base, 1, 0, b"xyz", check=lambda path, name: ("INVALID_IMAGE", "não é imagem"))
+        self.assertEqual((item["state"], item["code"]), ("rejected", "INVALID_IMAGE"))
+        self.assertEqual(os.listdir(self.base / "src"), [])
+        self.assertEqual(uploads.pending(self.base), [0])
+        self.assertEqual(uploads.rejected(self.base)[0]["name"], "b.png")
+        self.assertEqual(uploads.state(self.base)["files"][1]["state"], "rejected")
+
+
+class ArrivalTests(UploadTestMixin, SimpleTestCase):
+    def setUp(self):
+        self.media = isolated_media(self)
+        self.base = self.new_upload(("a.png", 2), ("b.png", 2), ("c.png", 2))
+
+    def idle(self):
+        old = time.time() - 60
+        os.utime(self.base / "upload.active", (old, old))
+
+    def test_yields_in_arrival_order(self):
+        for i in (2, 0, 1):
+            self.write(self.base, i, 0, b"ok")
+        names = [p.name for p in uploads.arrivals(self.base, idle_seconds=1, poll_seconds=0)]
+        self.assertEqual(names, ["c.png", "a.png", "b.png"])
+
+    def test_skips_rejected(self):
+        self.write(self.base, 0, 0, b"ok")
+        self.write(self.base, 1, 0, b"no", check=lambda path, name: ("INVALID_IMAGE", "x"))
+        self.write(self.base, 2, 0, b"ok")
+        self.assertEqual(len(list(uploads.arrivals(self.base, idle_seconds=1, poll_seconds=0))), 2)
+
+    def test_stalls_without_chunks(self):
+        self.write(self.base, 0, 0, b"ok")
+        self.idle()
+        got = []
+        with self.assertRaises(UploadStalled):
+            for path in uploads.arrivals(self.base, idle_seconds=30, poll_seconds=0):
+                got.append(path.name)
+        self.assertEqual(got, ["a.png"])
+
+    def test_finalize_and_park(self):
+        self.write(self.base, 0, 0, b"ok")
+        self.assertEqual(uploads.finalize(self.base), [1, 2])
+        self.assertFalse(uploads.is_finalized(self.base))
+        jobs.claim_next()
+        uploads.park(self.base)  # ainda faltam arquivos: fica fora da fila
+        self.assertIsNone(jobs.claim_next())
+        self.write(self.base, 1, 0, b"ok")  # o próximo arquivo completo volta a enfileirar
+        self.assertEqual(jobs.claim_next(), self.base)
+        self.write(self.base, 2, 0, b"ok")
+        self.assertEqual(uploads.finalize(self.base), [])
+        self.assertTrue(uploads.is_finalized(self.base))
+
+
+class UploadViewTests(TestCase):
+    def setUp(self):
+        self.media = isolated_media(self, IMAGES_UPLOAD={"CHUNK_BYTES": 1024, "IDLE_SECONDS": 30})
+        add_formats("PNG")
+        self.image = make_image(self.media / "in.png").read_bytes()
+
+    def init(self, *entries):
+        resp = self.client.post(reverse("images:upload_init"), {
+            "out_ext": "png",
+            "nomes": [name for name, _ in entries],
+            "tamanhos": [str(size) for _, size in entries],
+        }, HTTP_HOST="localhost")
+        return resp
+
+    def put(self, job, index, offset, data: bytes):
+        return self.client.put(
+            job["upload_url"] + f"{index}/", data, content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset), HTTP_HOST="localhost",
+        )
+
+    def send(self, job, index, data: bytes):
+        for offset in range(0, len(data), job["chunk_bytes"]):
+            resp = self.put(job, index, offset, data[offset:offset + job["chunk_bytes"]])
+        return resp
+
+    def test_upload_converts_while_files_arrive(self):
+        resp = self.init(("a.png", len(self.image)), ("junk.png", 5))
+        self.assertEqual(resp.status_code, 201)
+        job = resp.json()
+        self.assertEqual(job["chunk_bytes"], 1024)
+        self.assertEqual(self.send(job, 0, self.image).json()["state"], "done")
+        self.assertEqual(self.client.post(job["finalize_url"], HTTP_HOST="localhost").json()["missing"], [1])
+        rejected = self.put(job, 1, 0, b"hello").json()
+        self.assertEqual((rejected["state"], rejected["code"]), ("rejected", "INVALID_IMAGE"))
+
+        state = self.client.get(job["upload_url"], HTTP_HOST="localhost").json()
+        self.assertEqual((state["received_bytes"], state["total_bytes"]), (len(self.image) + 5, len(self.image) + 5))
+        resp = self.client.post(job["finalize_url"], HTTP_HOST="localhost")
+        self.assertEqual(resp.status_code, 202)
+
+        base = jobs.claim_next()
+        jobs.run_job(base)
+        status = self.client.get(job["status_url"], HTTP_HOST="localhost").json()
+        self.assertEqual((status["state"], status["converted"]), (jobs.DONE, 1))
+        self.assertEqual([e["src"] for e in status["errors"]], ["junk.png"])
+
+    def test_stalled_upload_is_parked(self):
+        job = self.init(("a.png", len(self.image)), ("b.png", len(self.image))).json()
+        self.send(job, 0, self.image)
+        base = jobs.claim_next()
+        old = time.time() - 60
+        os.utime(base / "upload.active", (old, old))
+        with self.settings(IMAGES_JOBS_POLL_SECONDS=0):
+            status = jobs.run_job(base)
+        self.assertEqual(status["state"], jobs.UPLOADING)
+        self.assertEqual(list(base.glob("*.zip")), [])
+        self.send(job, 1, self.image)
+        jobs.run_job(jobs.claim_next())
+        self.assertEqual(jobs.read_status(base)["converted"], 2)
+
+    def test_chunk_errors(self):
+        job = self.init(("a.png", len(self.image))).json()
+        resp = self.client.put(job["upload_url"] + "0/", b"x", content_type="application/octet-stream", HTTP_HOST="localhost")
+        self.assertEqual((resp.status_code, resp.json()["code"]), (400, "OFFSET_REQUIRED"))
+        resp = self.put(job, 0, 10, b"x")
+        self.assertEqual((resp.status_code, resp.json()["code"], resp.json()["offset"]), (409, "OFFSET_MISMATCH", 0))
+        self.assertEqual(self.client.post(job["upload_url"] + "0/", HTTP_HOST="localhost").status_code, 405)
+
+    def test_init_validation(self):
+        resp = self.client.post(reverse("images:upload_init"), {"out_ext": "png", "nomes": ["a.png"]}, HTTP_HOST="localhost")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.init(("a.png", 0))
+        self.assertEqual((resp.status_code, resp.json()["code"]), (415, "INVALID_IMAGE"))
+        with self.settings(UPLOAD_LIMITS={"FREE_MAX_FILES": 1}, CURRENT_PLAN="free"):
+            self.assertEqual(self.init(("a.png", 1), ("b.png", 1)).status_code, 413)
+
+    def test_unknown_upload(self):
+        url = reverse("images:upload_state", args=["f" * 32])
+        self.assertEqual(self.client.get(url, HTTP_HOST="localhost").json()["code"], "JOB_NOT_FOUND")
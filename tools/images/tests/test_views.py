@@ -0,0 +1,279 @@
+# tools/images/tests/test_views.py
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import zipfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from tools.images import jobs
+from tools.images.views import _aiter_in_thread, _save_uploads
+
+from .utils import add_formats, isolated_media, make_image, temp_dir
+
+
+def sse_events(chunks):
+    """[(evento, dados)] dos blocos SSE (comentários e retry ficam de fora)."""
+    out = []
+    for block in chunks:
+        fields = dict(line.split(": ", 1) for line in block.strip().splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+class JobEventsTests(SimpleTestCase):
+    def setUp(self):
+        self.media = isolated_media(self, IMAGES_SSE_INTERVAL_SECONDS=0.01, IMAGES_SSE_KEEPALIVE_SECONDS=0.05)
+        self.base = jobs.jobs_root() / ("a" * 32)
+        (self.base / "src").mkdir(parents=True)
+        jobs.enqueue(self.base, {"out_ext": ["png"], "files": [], "options": {}})
+        self.url = reverse("images:job_events", args=[self.base.name])
+
+    async def test_progress_until_end(self):
+        resp = await self.async_client.get(self.url, HTTP_HOST="localhost")
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        stream = resp.streaming_content
+        chunks = [await anext(stream), await anext(stream)]
+        self.assertEqual(chunks[0], b"retry: 2000\n\n")
+        jobs.write_status(self.base, state=jobs.DONE, progress=100, label="Concluído", converted=3)
+        async for chunk in stream:
+            chunks.append(chunk)
+        events = sse_events(c.decode() for c in chunks)
+        self.assertEqual([e for e, _ in events], ["progress", "end"])
+        self.assertEqual(events[0][1]["state"], jobs.QUEUED)
+        self.assertEqual((events[1][1]["state"], events[1][1]["converted"]), (jobs.DONE, 3))
+
+    async def test_keepalive_while_idle(self):
+        resp = await self.async_client.get(self.url, HTTP_HOST="localhost")
+        stream = resp.streaming_content
+        chunks = [await anext(stream) for _ in range(3)]
+        self.assertEqual(chunks[2], b": ping\n\n")
+        await stream.aclose()
+
+    async def test_job_without_worker_ends_stream(self):
+        with self.settings(IMAGES_WORKER_STALE_SECONDS=0.2):
+            resp = await self.async_client.get(self.url, HTTP_HOST="localhost")
+            chunks = [c async for c in resp.streaming_content]
+        events = sse_events(c.decode() for c in chunks)
+        self.assertEqual([e for e, _ in events], ["progress", "end"])
+        self.assertEqual((events[1][1]["state"], events[1][1]["code"]), (jobs.FAILED, "WORKER_UNAVAILABLE"))
+
+    async def test_status_is_read_off_the_event_loop(self):
+        read_status, threads = jobs.read_status, []
+
+        def spy(base):
+            try:
+                asyncio.get_running_loop()
+                threads.append("loop")
+            except RuntimeError:
+                threads.append("worker")
+            return read_status(base)
+
+        with mock.patch.object(jobs, "read_status", spy):
+            resp = await self.async_client.get(self.url, HTTP_HOST="localhost")
+            stream = resp.streaming_content
+            [await anext(stream) for _ in range(2)]
+            await stream.aclose()
+        self.assertEqual(set(threads), {"worker"})
+
+    def test_wsgi_answers_current_state_only(self):
+        resp = self.client.get(self.url, HTTP_HOST="localhost")
+        self.assertFalse(resp.streaming)
+        events = sse_events(resp.content.decode().split("\n\n"))
+        self.assertEqual([(e, d["state"]) for e, d in events], [("progress", jobs.QUEUED)])
+
+    async def test_unknown_job(self):
+        resp = await self.async_client.get(reverse("images:job_events", args=["b" * 32]), HTTP_HOST="localhost")
+        self.assertEqual(resp.status_code, 404)
+
+
+class SaveUploadsTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = temp_dir(self)
+        (self.tmp / "dst").mkdir()
+
+    def test_temporary_file_is_moved_not_copied(self):
+        f = TemporaryUploadedFile("b.png", "image/png", 0, None)
+        f.write(b"pixels")
+        f.flush()
+        temp_path = f.temporary_file_path()
+        inode = os.stat(temp_path).st_ino
+        (saved,) = _save_uploads([f], self.tmp / "dst")
+        f.close()  # o Django ignora o temporário que já foi movido
+        self.assertEqual(saved, self.tmp / "dst" / "b.png")
+        self.assertEqual((saved.read_bytes(), saved.stat().st_ino), (b"pixels", inode))
+        self.assertFalse(os.path.exists(temp_path))
+
+    def test_in_memory_upload_is_written_and_hashed(self):
+        digests = {}
+        (saved,) = _save_uploads([SimpleUploadedFile("c.png", b"data")], self.tmp / "dst", digests)
+        self.assertEqual(saved.read_bytes(), b"data")
+        self.assertEqual(digests, {"c.png": hashlib.sha256(b"data").hexdigest()})
+
+
+class ProcessUploadTests(TestCase):
+    def test_upload_leaves_no_temporary_copy(self):
+        media = isolated_media(self)
+        upload_tmp = temp_dir(self)
+        add_formats("PNG")
+        src = make_image(media / "in.png")
+        with self.settings(FILE_UPLOAD_TEMP_DIR=str(upload_tmp)), open(src, "rb") as fh:
+            resp = self.client.post(reverse("images:process"), {"arquivos": fh, "out_ext": "png"}, HTTP_HOST="localhost")
+        job_base = jobs.job_dir(resp.json()["job_id"])
+        self.assertEqual((job_base / "src" / "in.png").read_bytes(), src.read_bytes())
+        self.assertEqual(list(upload_tmp.iterdir()), [])
+
+    def test_identical_uploads_are_converted_once(self):
+        media = isolated_media(self)
+        add_formats("PNG")
+        src = make_image(media / "in.png")
+        again = shutil.copy(src, media / "again.png")
+        with open(src, "rb") as a, open(again, "rb") as b:
+            resp = self.client.post(reverse("images:process"), {"arquivos": [a, b], "out_ext": "png"}, HTTP_HOST="localhost")
+        job_base = jobs.job_dir(resp.json()["job_id"])
+        digest = hashlib.sha256(src.read_bytes()).hexdigest()
+        self.assertEqual(jobs.read_spec(job_base)["digests"], {"in.png": digest, "again.png": digest})
+        jobs.run_job(jobs.claim_next())
+        status = jobs.read_status(job_base)
+        self.assertEqual((status["converted"], status["duplicates"]), (2, 1))
+
+
+class DownloadTests(TestCase):
+    def setUp(self):
+        self.media = isolated_media(self, IMAGES_DEFAULT_DELIVERY="queue")
+        add_formats("PNG", "WEBP")
+        self.srcs = [make_image(self.media / f"in{i}.png", seed=i * 30) for i in range(3)]
+
+    def submit(self, **data):
+        files = [open(p, "rb") for p in self.srcs]
+        try:
+            resp = self.client.post(reverse("images:process"), {"arquivos": files, "out_ext": "webp", **data}, HTTP_HOST="localhost")
+        finally:
+            for fh in files:
+                fh.close()
+        return resp.json()
+
+    def download(self, job):
+        return self.client.get(job["download_url"], HTTP_HOST="localhost")
+
+    def test_stream_delivery_converts_during_download(self):
+        job = self.submit(delivery="stream")
+        self.assertEqual(job["delivery"], "stream")
+        self.assertIsNone(jobs.claim_next())  # fica para o download, não para o worker
+        resp = self.download(job)
+        self.assertEqual(resp["Content-Type"], "application/zip")
+        body = b"".join(resp.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(body)) as zf:
+            self.assertEqual(len(zf.namelist()), 3)
+            self.assertIsNone(zf.testzip())
+        base = jobs.job_dir(job["job_id"])
+        status = jobs.read_status(base)
+        self.assertEqual((status["state"], status["streamed"], status.get("zip_name")), (jobs.DONE, True, None))
+        self.assertEqual([p.name for p in base.iterdir() if p.suffix == ".zip"], [])
+        again = self.download(job)
+        self.assertEqual((again.status_code, again.json()["code"]), (410, "ALREADY_DOWNLOADED"))
+
+    def test_interrupted_stream_returns_job_to_waiting(self):
+        job = self.submit(delivery="stream")
+        resp = self.download(job)
+        next(iter(resp.streaming_content))
+        resp.close()  # cliente desconectou
+        base = jobs.job_dir(job["job_id"])
+        self.assertEqual(jobs.read_status(base)["state"], jobs.QUEUED)
+        self.assertTrue(jobs.claim_deferred(base))
+
+    def test_queue_delivery_serves_file_from_disk(self):
+        job = self.submit()
+        not_ready = self.download(job)
+        self.assertEqual((not_ready.status_code, not_ready.json()["code"]), (409, "JOB_NOT_READY"))
+        base = jobs.claim_next()
+        status = jobs.run_job(base)
+        resp = self.download(job)
+        self.assertEqual(b"".join(resp.streaming_content), (base / status["zip_name"]).read_bytes())
+        self.assertIn(status["zip_name"], resp["Content-Disposition"])
+
+    def test_iter_zip_matches_batch_zip(self):
+        from tools.images.converter import ImagesConverter
+
+        conv = ImagesConverter()
+        finished = []
+        streamed = b"".join(conv.iter_zip(self.srcs, out_ext="png", on_finish=finished.append))
+        batch = conv.convert_batch_to_zip(self.srcs, out_ext="png", work_dir=temp_dir(self))
+        with zipfile.ZipFile(io.BytesIO(streamed)) as a, zipfile.ZipFile(batch.zip_path) as b:
+            self.assertEqual({n: a.read(n) for n in a.namelist()}, {n: b.read(n) for n in b.namelist()})
+        self.assertEqual((finished[0].converted, finished[0].zip_bytes), (3, len(streamed)))
+
+
+class AiterInThreadTests(SimpleTestCase):
+    def test_yields_then_reraises(self):
+        def gen():
+            yield b"a"
+            yield b"b"
+            raise ValueError("boom")
+
+        async def consume():
+            out = []
+            with self.assertRaisesMessage(ValueError, "boom"):
+                async for chunk in _aiter_in_thread(gen()):
+                    out.append(chunk)
+            return out
+
+        self.assertEqual(asyncio.run(consume()), [b"a", b"b"])
+
+    def test_closing_consumer_stops_producer(self):
+        closed = threading.Event()
+
+        def gen():
+            try:
+                while True:
+                    yield b"x"
+            finally:
+                closed.set()
+
+        async def consume():
+            it = _aiter_in_thread(gen(), maxsize=1)
+            await anext(it)
+            await it.aclose()
+
+        asyncio.run(consume())
+        self.assertTrue(closed.wait(5))
+
+    def test_cancelled_mid_conversion_frees_executor_thread(self):
+        started, release = threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+
+        def gen():
+            yield b"a"
+            started.set()
+            release.wait(30)  # conversão da próxima imagem em andamento
+            yield b"b"
+
+        async def consume():
+            got = []
+
+            async def read():
+                async for chunk in _aiter_in_thread(gen()):
+                    got.append(chunk)
+
+            task = asyncio.create_task(read())
+            while not (got and started.is_set()):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)  # o consumidor volta a esperar o próximo pedaço
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        done = threading.Event()
+        # asyncio.run só termina quando as threads do executor padrão terminam
+        threading.Thread(target=lambda: (asyncio.run(consume()), done.set()), daemon=True).start()
+        self.assertTrue(done.wait(5))
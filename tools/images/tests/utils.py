@@ -0,0 +1,78 @@
+# tools/images/tests/utils.py
+"""Imagens de teste geradas na hora (nada de binários no repositório)."""
+from __future__ import annotations
+
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+from django.test import override_settings
+from PIL import Image
+
+
+def temp_dir(test) -> Path:
+    """Diretório temporário apagado ao fim do teste."""
+    path = Path(tempfile.mkdtemp(prefix="images-test-"))
+    test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+def isolated_media(test, **settings) -> Path:
+    """
+    MEDIA_ROOT temporário, sem cache de resultados nem sinks de métricas
+    (mais `settings`), e os singletons de jobs recriados com ele.
+    """
+    from tools.images import jobs, registry
+
+    media = temp_dir(test)
+    override = override_settings(
+        **{"MEDIA_ROOT": media, "IMAGES_RESULT_CACHE": {"DIR": None}, "IMAGES_METRICS": {"SINKS": []}, **settings}
+    )
+    override.enable()
+    test.addCleanup(override.disable)
+    for name in ("_metrics", "_budget"):
+        setattr(jobs, name, None)
+        test.addCleanup(setattr, jobs, name, None)
+    test.addCleanup(registry.invalidate)
+    return media
+
+
+def add_formats(*acronyms: str) -> None:
+    """Cadastra ImageFormat para `acronyms` (ex.: "PNG") e invalida o registry."""
+    from tools.images import registry
+    from tools.images.models import ImageFormat
+
+    for acronym in acronyms:
+        ImageFormat.objects.create(
+            acronym=acronym, file_extension=f".{acronym.lower()}", format_name=acronym, description=acronym,
+        )
+    registry.invalidate()
+
+
+def make_image(
+    path: Path,
+    size: Tuple[int, int] = (64, 48),
+    mode: str = "RGB",
+    fmt: Optional[str] = None,
+    seed: int = 0,
+) -> Path:
+    """Grava um degradê `mode`/`size` em `path` (`seed` muda os pixels)."""
+    w, h = size
+    im = Image.new("RGB", size)
+    im.putdata([((x * 255 // max(1, w - 1) + seed) % 256, (y * 255 // max(1, h - 1)) % 256, seed % 256) for y in range(h) for x in range(w)])
+    if mode == "RGBA":
+        im.putalpha(Image.linear_gradient("L").resize(size))
+    elif mode != "RGB":
+        im = im.convert(mode)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    im.save(path, fmt)
+    return path
+
+
+def make_animation(path: Path, frames: int = 3, size: Tuple[int, int] = (32, 32), fmt: str = "GIF") -> Path:
+    """Animação de `frames` quadros de cores diferentes."""
+    ims = [Image.new("RGB", size, ((i * 80) % 256, 255 - (i * 60) % 256, 40)) for i in range(frames)]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ims[0].save(path, fmt, save_all=True, append_images=ims[1:], duration=100, loop=0)
+    return path
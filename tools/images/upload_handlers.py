@@ -0,0 +1,28 @@
+# tools/images/upload_handlers.py
+"""
+Handlers de upload do Django usados pelo conversor (settings.FILE_UPLOAD_HANDLERS).
+"""
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class HashingTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    TemporaryFileUploadHandler que calcula o sha256 de cada arquivo enquanto
+    ele é gravado no temporário (`UploadedFile.sha256`). A deduplicação do
+    lote (converter._duplicate_map) usa esse hash e não relê o arquivo.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self._sha256.hexdigest()
+        return uploaded
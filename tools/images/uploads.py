@@ -0,0 +1,314 @@
+# tools/images/uploads.py
+"""
+Upload em partes, retomável, direto para o diretório do job.
+
+O navegador abre o envio (manifesto com nome e tamanho de cada arquivo),
+manda cada arquivo em pedaços com o offset onde cada um começa e, no fim,
+finaliza. Tudo fica em MEDIA_ROOT/tmp_uploads/<job_id>/, ao lado do
+job.json e do status.json (ver jobs):
+
+    upload.json        manifesto: tamanho dos pedaços e {name, size} de cada arquivo
+    upload.active      tocado a cada pedaço (o worker mede a ociosidade por ele)
+    upload.done        índices dos arquivos completos, na ordem em que terminaram
+    upload.rejected    um JSON por linha: arquivo completo mas recusado no cabeçalho
+    upload.finalized   o cliente disse que terminou
+    upload.started     o job já foi para a fila (criado com O_EXCL: enfileira uma vez)
+    src/.<nome>.part   arquivo chegando; o tamanho é o offset para retomar
+    src/<nome>         arquivo completo e aceito (rename do .part)
+
+O job entra na fila quando o primeiro arquivo fica pronto: o worker consome
+`arrivals()`, que entrega cada arquivo assim que ele termina de chegar, e a
+conversão anda junto com o restante do upload.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from . import jobs
+
+_READ_BYTES = 1024 * 1024
+_LOCK_STALE_SECONDS = 120.0  # lock de quem morreu no meio de um pedaço
+
+# Confere um arquivo completo (caminho, nome): None = aceito, ou (code, motivo)
+Check = Callable[[Path, str], Optional[Tuple[str, str]]]
+
+
+class UploadError(Exception):
+    """Pedaço recusado; vira JSON com `code` (e `extra`) na view."""
+
+    def __init__(self, code: str, message: str, status: int = 409, **extra: Any):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+class UploadStalled(Exception):
+    """Nenhum pedaço chegou em IMAGES_UPLOAD["IDLE_SECONDS"] (ver `arrivals`)."""
+
+
+# ================== Manifesto ==================
+
+def unique_names(names: Sequence[str]) -> List[str]:
+    """Nomes seguros para src/, sem repetição ("foto.png", "foto (2).png"...)."""
+    used: Set[str] = set()
+    out = []
+    for raw in names:
+        safe = (raw or "arquivo").replace("/", "_").replace("\\", "_").lstrip(".") or "arquivo"
+        stem, dot, ext = safe.rpartition(".")
+        if not dot:
+            stem, ext = safe, ""
+        name, n = safe, 1
+        while name.lower() in used:
+            n += 1
+            name = f"{stem} ({n})" + (f".{ext}" if ext else "")
+        used.add(name.lower())
+        out.append(name)
+    return out
+
+def create(job_base: Path, spec: Dict[str, Any], entries: Sequence[Tuple[str, int]], chunk_bytes: int) -> Dict[str, Any]:
+    """
+    Abre o upload: manifesto de `entries` (nome, tamanho), job.json com
+    `spec` e os nomes finais, status UPLOADING. O job só entra na fila em
+    `start`.
+    """
+    job_base = Path(job_base)
+    names = unique_names([name for name, _ in entries])
+    manifest = {
+        "chunk_bytes": int(chunk_bytes),
+        "files": [{"name": name, "size": int(size)} for name, (_, size) in zip(names, entries)],
+    }
+    jobs._write_json(job_base / "upload.json", manifest)
+    jobs._write_json(job_base / "job.json", {**spec, "files": names, "upload": True})
+    jobs.write_status(
+        job_base, job_id=job_base.name, state=jobs.UPLOADING, progress=0,
+        label="Recebendo arquivos…", created_at=time.time(),
+    )
+    (job_base / "upload.active").touch()
+    return manifest
+
+def read_manifest(job_base: Path) -> Optional[Dict[str, Any]]:
+    return jobs._read_json(Path(job_base) / "upload.json")
+
+
+# ================== Estado ==================
+
+def _part(job_base: Path, name: str) -> Path:
+    # nomes do manifesto nunca começam com ".": o parcial não colide com outro arquivo
+    return Path(job_base) / "src" / f".{name}.part"
+
+def _append_line(path: Path, line: str) -> None:
+    # O_APPEND com uma escrita só: linhas de processos diferentes não se misturam
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, (line + "\n").encode("utf-8"))
+    finally:
+        os.close(fd)
+
+def _read_lines(path: Path, start: int = 0) -> Tuple[List[str], int]:
+    """Linhas completas a partir do byte `start` e a posição depois da última."""
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(start)
+            data = fh.read()
+    except FileNotFoundError:
+        return [], start
+    end = data.rfind(b"\n") + 1  # linha pela metade fica para a próxima leitura
+    return data[:end].decode("utf-8").splitlines(), start + end
+
+def done_indexes(job_base: Path) -> List[int]:
+    return [int(line) for line in _read_lines(Path(job_base) / "upload.done")[0] if line.strip()]
+
+def rejected(job_base: Path) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in _read_lines(Path(job_base) / "upload.rejected")[0] if line.strip()]
+
+def is_finalized(job_base: Path) -> bool:
+    return (Path(job_base) / "upload.finalized").exists()
+
+def pending(job_base: Path, manifest: Optional[Dict[str, Any]] = None) -> List[int]:
+    """Índices que ainda não chegaram inteiros (nem foram recusados)."""
+    manifest = manifest or read_manifest(job_base) or {"files": []}
+    closed = set(done_indexes(job_base)) | {r["index"] for r in rejected(job_base)}
+    return [i for i in range(len(manifest["files"])) if i not in closed]
+
+def state(job_base: Path) -> Optional[Dict[str, Any]]:
+    """Onde cada arquivo parou: é o que o cliente consulta para retomar."""
+    manifest = read_manifest(job_base)
+    if manifest is None:
+        return None
+    done = set(done_indexes(job_base))
+    refused = {r["index"]: r for r in rejected(job_base)}
+    files = []
+    for i, entry in enumerate(manifest["files"]):
+        item = {"index": i, "name": entry["name"], "size": entry["size"]}
+        if i in done:
+            item.update(state="done", offset=entry["size"])
+        elif i in refused:
+            item.update(state="rejected", offset=entry["size"], code=refused[i]["code"], reason=refused[i]["reason"])
+        else:
+            try:
+                offset = _part(job_base, entry["name"]).stat().st_size
+            except FileNotFoundError:
+                offset = 0
+            item.update(state="uploading" if offset else "pending", offset=offset)
+        files.append(item)
+    return {
+        "chunk_bytes": manifest["chunk_bytes"],
+        "files": files,
+        "received_bytes": sum(f["offset"] for f in files),
+        "total_bytes": sum(f["size"] for f in files),
+        "finalized": is_finalized(job_base),
+    }
+
+
+# ================== Pedaços ==================
+
+def _lock(path: Path) -> bool:
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        try:
+            stale = time.time() - path.stat().st_mtime > _LOCK_STALE_SECONDS
+        except FileNotFoundError:
+            stale = True
+        if stale:
+            path.unlink(missing_ok=True)
+            return _lock(path)
+        return False
+
+def write_chunk(job_base: Path, index: int, offset: int, stream: BinaryIO, length: int, check: Check) -> Dict[str, Any]:
+    """
+    Acrescenta `length` bytes de `stream` ao arquivo `index`, que precisa
+    estar exatamente em `offset`; se a conexão cair no meio, o que chegou
+    fica e o offset diz onde retomar. Com o último byte o arquivo passa por
+    `check` e é aceito (`accept`, e o job vai para a fila) ou recusado
+    (`reject`). Devolve o arquivo como em `state()`.
+    """
+    job_base = Path(job_base)
+    manifest = read_manifest(job_base)
+    if manifest is None or not 0 <= index < len(manifest["files"]):
+        raise UploadError("FILE_NOT_FOUND", "Arquivo não faz parte deste envio.", 404)
+    entry = manifest["files"][index]
+    if index not in pending(job_base, manifest):
+        raise UploadError("FILE_COMPLETE", "Este arquivo já foi recebido.", 409, offset=entry["size"])
+    if length <= 0:
+        raise UploadError("EMPTY_CHUNK", "Pedaço vazio.", 400)
+    if length > manifest["chunk_bytes"]:
+        raise UploadError("CHUNK_TOO_LARGE", "Pedaço maior que o permitido.", 413, chunk_bytes=manifest["chunk_bytes"])
+
+    part = _part(job_base, entry["name"])
+    lock = part.with_name(f"{part.name}.lock")
+    if not _lock(lock):
+        raise UploadError("UPLOAD_BUSY", "Outro pedaço deste arquivo está chegando.", 409)
+    try:
+        current = part.stat().st_size if part.exists() else 0
+        if offset != current:
+            raise UploadError("OFFSET_MISMATCH", "O envio deve continuar de outro ponto.", 409, offset=current)
+        if current + length > entry["size"]:
+            raise UploadError("CHUNK_OUT_OF_RANGE", "Pedaço passa do tamanho declarado do arquivo.", 400, offset=current)
+        remaining = length
+        with open(part, "ab") as out:
+            while remaining > 0:
+                data = stream.read(min(_READ_BYTES, remaining))
+                if not data:
+                    break
+                out.write(data)
+                remaining -= len(data)
+        (job_base / "upload.active").touch()
+        item = {"index": index, "name": entry["name"], "size": entry["size"], "offset": current + length - remaining}
+        if item["offset"] < entry["size"]:
+            return {**item, "state": "uploading"}
+        # completo: decide ainda com o lock, um pedaço repetido não chega aqui duas vezes
+        refused = check(part, entry["name"])
+        if refused:
+            reject(job_base, index, *refused)
+            return {**item, "state": "rejected", "code": refused[0], "reason": refused[1]}
+        accept(job_base, index)
+        start(job_base)
+        return {**item, "state": "done"}
+    finally:
+        lock.unlink(missing_ok=True)
+
+def accept(job_base: Path, index: int) -> Path:
+    """Arquivo completo e válido: sai do .part e entra na fila de chegada."""
+    entry = read_manifest(job_base)["files"][index]
+    dst = Path(job_base) / "src" / entry["name"]
+    os.replace(_part(job_base, entry["name"]), dst)
+    _append_line(Path(job_base) / "upload.done", str(index))
+    return dst
+
+def reject(job_base: Path, index: int, code: str, reason: str) -> None:
+    """Arquivo completo mas recusado: some do disco e vira erro do lote."""
+    entry = read_manifest(job_base)["files"][index]
+    _part(job_base, entry["name"]).unlink(missing_ok=True)
+    line = json.dumps({"index": index, "name": entry["name"], "code": code, "reason": reason}, ensure_ascii=False)
+    _append_line(Path(job_base) / "upload.rejected", line)
+
+
+# ================== Fila ==================
+
+def start(job_base: Path) -> bool:
+    """Põe o job na fila, se ainda não foi (seguro chamar a cada arquivo)."""
+    try:
+        os.close(os.open(Path(job_base) / "upload.started", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    jobs.submit(job_base)
+    return True
+
+def finalize(job_base: Path) -> List[int]:
+    """Marca o fim do envio e garante o job na fila. Devolve os índices que faltam."""
+    missing = pending(job_base)
+    if missing:
+        return missing
+    (Path(job_base) / "upload.finalized").touch()
+    start(job_base)
+    return []
+
+def park(job_base: Path) -> None:
+    """
+    Worker desistiu de esperar (`UploadStalled`): o job sai da fila até o
+    próximo arquivo completo ou o finalizar. Se tudo chegou enquanto ele
+    desistia, volta para a fila já.
+    """
+    (Path(job_base) / "upload.started").unlink(missing_ok=True)
+    if not pending(job_base):
+        start(job_base)
+
+def arrivals(job_base: Path, *, idle_seconds: float, poll_seconds: float = 0.5) -> Iterator[Path]:
+    """
+    Arquivos aceitos, na ordem em que terminaram de chegar; espera pelos
+    seguintes e termina quando todos chegaram ou foram recusados. Sem pedaço
+    novo por `idle_seconds`, levanta UploadStalled.
+    """
+    job_base = Path(job_base)
+    manifest = read_manifest(job_base) or {"files": []}
+    files = manifest["files"]
+    seen: Set[int] = set()
+    pos = 0
+    heartbeat = job_base / "upload.active"
+    while True:
+        finished = not pending(job_base, manifest)  # antes de ler: nada chega entre um e outro
+        lines, pos = _read_lines(job_base / "upload.done", pos)
+        new = [int(line) for line in lines if line.strip()]
+        for i in new:
+            if i not in seen:
+                seen.add(i)
+                yield job_base / "src" / files[i]["name"]
+        if finished:
+            return
+        if new:
+            continue
+        try:
+            idle = time.time() - heartbeat.stat().st_mtime
+        except FileNotFoundError:
+            idle = 0.0
+        if idle > idle_seconds:
+            raise UploadStalled(f"{len(seen)}/{len(files)} arquivos recebidos; nenhum pedaço há {idle:.0f} s")
+        time.sleep(poll_seconds)
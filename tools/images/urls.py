@@ -6,4 +6,13 @@ app_name = "images"
 urlpatterns = [
     path("", views.images_converter, name="images_converter"),
     path("processar/", views.process, name="process"),
+    path("sondar/", views.probe, name="probe"),
+    path("envios/", views.upload_init, name="upload_init"),
+    path("envios/<str:job_id>/", views.upload_state, name="upload_state"),
+    path("envios/<str:job_id>/<int:index>/", views.upload_chunk, name="upload_chunk"),
+    path("envios/<str:job_id>/finalizar/", views.upload_finalize, name="upload_finalize"),
+    path("jobs/<str:job_id>/", views.job_status, name="job_status"),
+    path("jobs/<str:job_id>/eventos/", views.job_events, name="job_events"),
+    path("jobs/<str:job_id>/zip/", views.job_download, name="job_download"),
+    path("metricas/", views.metrics, name="metrics"),
 ]
@@ -1,14 +1,24 @@
 from __future__ import annotations
-import os, uuid
+import asyncio, hashlib, json, queue, threading, time, uuid
 from pathlib import Path
+from typing import TYPE_CHECKING
 from django.conf import settings
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed
+from django.core.handlers.asgi import ASGIRequest
+from django.core.files.move import file_move_safe
+from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, HttpResponseNotAllowed, StreamingHttpResponse
 from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.shortcuts import render
 
+from . import jobs, registry, uploads
+from . import metrics as images_metrics
 from .forms import ImageConvertForm
-from .converter import ImagesConverter
-from .models import ImageFormat
+
+# converter/admission (e com eles o Pillow) são importados dentro das views
+# que convertem ou leem cabeçalhos: carregar as URLs no boot do worker não
+# paga por eles (ver gunicorn.conf.py, que os pré-carrega antes do fork).
+if TYPE_CHECKING:
+    from .converter import ImagesConverter
 
 
 # ================== Helpers de FS / URLs ==================
@@ -20,17 +30,47 @@ def _job_dirs() -> tuple[Path, Path]:
     src_dir.mkdir(parents=True, exist_ok=True)
     return base, src_dir
 
-def _save_uploads(files, dst_dir: Path) -> list[Path]:
+def _save_uploads(files, dst_dir: Path, digests: dict | None = None) -> list[Path]:
+    """
+    Grava os uploads em `dst_dir` e preenche `digests` (nome -> sha256): o
+    hash vem do upload handler (HashingTemporaryFileUploadHandler) ou é
+    calculado aqui, na cópia em pedaços.
+    """
     paths = []
     for f in files:
         safe = f.name.replace("/", "_").replace("\\", "_")
         p = dst_dir / safe
-        with open(p, "wb") as out:
-            for chunk in f.chunks():
-                out.write(chunk)
+        if hasattr(f, "temporary_file_path"):
+            # TemporaryFileUploadHandler já gravou o upload em FILE_UPLOAD_TEMP_DIR
+            # (mesmo volume do MEDIA_ROOT): move com rename em vez de copiar de
+            # novo. O Django ignora o temporário já movido ao fechar o arquivo.
+            file_move_safe(f.temporary_file_path(), str(p), allow_overwrite=True)
+            if digests is not None and getattr(f, "sha256", None):
+                digests[p.name] = f.sha256
+        else:
+            h = hashlib.sha256()
+            with open(p, "wb") as out:
+                for chunk in f.chunks():
+                    out.write(chunk)
+                    h.update(chunk)
+            if digests is not None:
+                digests[p.name] = h.hexdigest()
         paths.append(p)
     return paths
 
+def _uploaded_files(request) -> list:
+    # Aceita 'arquivos' e 'arquivos[]'
+    return request.FILES.getlist("arquivos") or request.FILES.getlist("arquivos[]")
+
+def _strip_planner(**options) -> ImagesConverter:
+    """Conversor só para decidir, antes de enfileirar, quais imagens sairão em faixas."""
+    from .converter import DEFAULT_STRIP_MIN_PIXELS, ImagesConverter
+
+    return ImagesConverter(
+        **options,
+        strip_min_pixels=getattr(settings, "IMAGES_STRIP_MIN_PIXELS", DEFAULT_STRIP_MIN_PIXELS),
+    )
+
 def _public_url(abs_path: Path) -> str:
     rel = Path(abs_path).resolve().relative_to(Path(settings.MEDIA_ROOT).resolve())
     return settings.MEDIA_URL.rstrip("/") + "/" + str(rel).replace("\\", "/")
@@ -57,6 +97,10 @@ def _current_upload_limit_bytes(request) -> int:
         return int(limits.get("PREMIUM_MAX_TOTAL_UPLOAD_BYTES", 1024 * 1024 * 1024))
     return int(limits.get("FREE_MAX_TOTAL_UPLOAD_BYTES", 500 * 1024 * 1024))
 
+def _default_encoder_preset(request) -> str:
+    presets = getattr(settings, "IMAGES_ENCODER_PRESETS", {}) or {}
+    return presets.get(_current_plan(request).upper(), "balanced")
+
 def _current_upload_limit_files(request) -> int:
     limits = getattr(settings, "UPLOAD_LIMITS", {})
     plan = _current_plan(request)
@@ -64,12 +108,106 @@ def _current_upload_limit_files(request) -> int:
         return int(limits.get("PREMIUM_MAX_FILES", 2000))
     return int(limits.get("FREE_MAX_FILES", 300))
 
+def _plan_limit_error(request, count: int, total_size: int) -> JsonResponse | None:
+    """413 se o lote passa do limite de arquivos ou de bytes do plano."""
+    limit_files = _current_upload_limit_files(request)
+    if limit_files and count > limit_files:
+        return JsonResponse(
+            {
+                "ok": False,
+                "code": "TOO_MANY_FILES",
+                "attempted_files": count,
+                "allowed_files": int(limit_files),
+                "upgrade_url": _upgrade_url(),
+                "message": "Quantidade de arquivos excede o limite do plano atual.",
+            },
+            status=413,  # para o XHR tratar como “bloqueio de limite”
+        )
+
+    limit_bytes = _current_upload_limit_bytes(request)
+    if limit_bytes and total_size > limit_bytes:
+        return JsonResponse(
+            {
+                "ok": False,
+                "code": "LIMIT_EXCEEDED",
+                "total_bytes": int(total_size),
+                "allowed_bytes": int(limit_bytes),
+                "upgrade_url": _upgrade_url(),
+                "message": "Limite de tamanho de upload atingido para o plano atual.",
+            },
+            status=413,
+        )
+    return None
+
+def _upload_config() -> dict:
+    cfg = getattr(settings, "IMAGES_UPLOAD", None) or {}
+    return {
+        "CHUNK_BYTES": int(cfg.get("CHUNK_BYTES", 8 * 1024 * 1024)),
+        "MIN_BATCH_BYTES": int(cfg.get("MIN_BATCH_BYTES", 32 * 1024 * 1024)),
+    }
+
+
+# ================== Helpers de parâmetros ==================
+
+def _out_exts(request, form) -> list[str]:
+    # 'out_ext' do form (um ou vários) ou alias 'format' do <select>
+    return form.cleaned_data.get("out_ext") or [
+        v.strip().lower() for v in request.POST.getlist("format") if v.strip()
+    ]
+
+def _out_ext_required() -> JsonResponse:
+    return JsonResponse(
+        {"ok": False, "errors": {"out_ext": ["Formato de saída é obrigatório."]}},
+        status=400,
+    )
+
+def _job_options(request, form) -> dict:
+    """Parâmetros do ImagesConverter (job.json "options") vindos do formulário."""
+    from .converter import DEFAULT_PALETTE_SAMPLE_SIDE, DEFAULT_QUANTIZER
+
+    background_hex = (form.cleaned_data.get("background_hex") or "#FFFFFF").upper()
+    return {
+        "brand_tag": form.cleaned_data.get("brand_tag") or "ConverteTudo",
+        "name_style": form.cleaned_data.get("name_style") or "suffix",
+        "background_rgb": [int(background_hex[i:i+2], 16) for i in (1, 3, 5)],
+        "overwrite": bool(form.cleaned_data.get("overwrite")),
+        "jpeg_quality": form.cleaned_data.get("jpeg_quality") or 85,
+        "webp_quality": form.cleaned_data.get("webp_quality") or 85,
+        "jpeg_progressive": bool(form.cleaned_data.get("jpeg_progressive")),
+        "png_compress_level": form.cleaned_data.get("png_compress_level"),  # None = o do preset
+        "tiff_compression": form.cleaned_data.get("tiff_compression") or None,
+        "max_width": form.cleaned_data.get("max_width") or None,
+        "max_height": form.cleaned_data.get("max_height") or None,
+        "resize_mode": form.cleaned_data.get("resize_mode") or "fit",
+        "resample": form.cleaned_data.get("resample") or "lanczos",
+        "encoder_preset": form.cleaned_data.get("encoder_preset") or _default_encoder_preset(request),
+        "quantizer": form.cleaned_data.get("quantizer") or getattr(settings, "IMAGES_QUANTIZER", DEFAULT_QUANTIZER),
+        "dither": bool(form.cleaned_data.get("dither")),
+        "palette_sample_side": form.cleaned_data.get("palette_sample_side") or DEFAULT_PALETTE_SAMPLE_SIDE,
+    }
+
+def _options_planner(options: dict) -> ImagesConverter:
+    # (faixas e decodificação reduzida barateiam a estimativa; ver ImagesConverter.cost)
+    return _strip_planner(
+        max_width=options["max_width"], max_height=options["max_height"],
+        tiff_compression=options["tiff_compression"],
+    )
+
+def _job_urls(job_id: str) -> dict:
+    return {
+        "status_url": reverse("images:job_status", args=[job_id]),
+        "events_url": reverse("images:job_events", args=[job_id]),
+        "download_url": reverse("images:job_download", args=[job_id]),
+    }
+
 
 # ================== Views ==================
 
 def images_converter(request):
-    # Carrega formatos permitidos do banco
-    image_formats = ImageFormat.objects.all().order_by("acronym")
+    from . import history
+
+    # Formatos que o conversor grava (mesma lista das choices do formulário)
+    image_formats = registry.output_formats()
 
     # Expõe limites ao template (o JS lê estas globals)
     context = {
@@ -79,11 +217,16 @@ def images_converter(request):
         "UPLOAD_LIMIT_FILES": _current_upload_limit_files(request),
         "UPGRADE_URL": _upgrade_url(),
         "CURRENT_PLAN": _current_plan(request),
+        "UPLOAD_CHUNKED_MIN_BYTES": _upload_config()["MIN_BATCH_BYTES"],
+        # valor inicial do live-stats (depois ele consulta /api/conversions/stats)
+        "conversion_total": history.cached_stats()["total"],
     }
     return render(request, "tools/images/images-converter.html", context)
 
 
 def process(request):
+    from . import admission
+
     if request.method != "POST":
         return HttpResponseNotAllowed(["POST"])
 
@@ -92,10 +235,7 @@ def process(request):
     if not form.is_valid():
         return JsonResponse({"ok": False, "errors": form.errors}, status=400)
 
-    # Aceita 'arquivos' e 'arquivos[]'
-    files = request.FILES.getlist("arquivos")
-    if not files:
-        files = request.FILES.getlist("arquivos[]")
+    files = _uploaded_files(request)
     if not files:
         return JsonResponse(
             {"ok": False, "errors": {"arquivos": ["Nenhum arquivo enviado."]}},
@@ -103,108 +243,587 @@ def process(request):
         )
 
     # Limites por plano
-    limit_files = _current_upload_limit_files(request)
-    if limit_files and len(files) > limit_files:
+    limit_error = _plan_limit_error(request, len(files), sum(int(getattr(f, "size", 0)) for f in files))
+    if limit_error:
+        return limit_error
+
+    # Cabeçalhos: recusa o que não é imagem antes de salvar e enfileirar
+    probes = [admission.probe(f, f.name) for f in files]
+    invalid = [p for p in probes if not p.ok]
+    if invalid:
         return JsonResponse(
             {
                 "ok": False,
-                "code": "TOO_MANY_FILES",
-                "attempted_files": len(files),
-                "allowed_files": int(limit_files),
-                "upgrade_url": _upgrade_url(),
-                "message": "Quantidade de arquivos excede o limite do plano atual.",
+                "code": "INVALID_IMAGE",
+                "files": [{"name": p.name, "reason": p.reason} for p in invalid],
+                "message": "Alguns arquivos não são imagens válidas ou estão corrompidos.",
             },
-            status=413,  # para o XHR tratar como “bloqueio de limite”
+            status=415,
         )
 
-    total_size = sum(int(getattr(f, "size", 0)) for f in files)
-    limit_bytes = _current_upload_limit_bytes(request)
-    if limit_bytes and total_size > limit_bytes:
+    out_exts = _out_exts(request, form)
+    if not out_exts:
+        return _out_ext_required()
+
+    options = _job_options(request, form)
+    delivery = form.cleaned_data.get("delivery") or getattr(settings, "IMAGES_DEFAULT_DELIVERY", "queue")
+
+    # Orçamento de memória: estima pixels decodificados só pelo cabeçalho
+    mem = getattr(settings, "IMAGES_MEMORY", {}) or {}
+    planner = _options_planner(options)
+    costs = [planner.cost(p, out_exts) for p in probes]
+    max_file = mem.get("MAX_FILE_PEAK_BYTES")
+    too_large = [c for c in costs if max_file and c.peak_bytes > int(max_file)]
+    if too_large:
         return JsonResponse(
             {
                 "ok": False,
-                "code": "LIMIT_EXCEEDED",
-                "total_bytes": int(total_size),
-                "allowed_bytes": int(limit_bytes),
-                "upgrade_url": _upgrade_url(),
-                "message": "Limite de tamanho de upload atingido para o plano atual.",
+                "code": "IMAGE_TOO_LARGE",
+                "files": [
+                    {"name": c.name, "width": c.width, "height": c.height, "estimated_bytes": c.peak_bytes}
+                    for c in too_large
+                ],
+                "allowed_bytes": int(max_file),
+                "message": "Imagem grande demais para converter (resolução excede o limite de memória).",
             },
             status=413,
         )
+    max_batch = mem.get("MAX_BATCH_DECODED_BYTES")
+    batch_decoded = sum(c.decoded_bytes for c in costs)
+    if max_batch and batch_decoded > int(max_batch):
+        return JsonResponse(
+            {
+                "ok": False,
+                "code": "BATCH_TOO_LARGE",
+                "estimated_bytes": int(batch_decoded),
+                "allowed_bytes": int(max_batch),
+                "message": "O lote excede o limite de memória de pixels. Envie menos imagens por vez.",
+            },
+            status=413,
+        )
+
+    # 1) Salva uploads
+    job_base, src_dir = _job_dirs()
+    digests: dict = {}
+    src_paths = _save_uploads(files, src_dir, digests)
+
+    # 2) Enfileira a conversão (executada pelo worker: manage.py images_worker),
+    #    ou deixa para o download em streaming (/jobs/<id>/zip/) gerar o ZIP
+    job_id = jobs.enqueue(job_base, {
+        "out_ext": out_exts,
+        "files": [p.name for p in src_paths],
+        "estimated_peak_bytes": admission.batch_peak(costs, int(getattr(settings, "IMAGES_CONVERTER_WORKERS", 1))),
+        "costs": {p.name: c.peak_bytes for p, c in zip(src_paths, costs)},
+        "digests": digests,
+        "options": options,
+    }, deferred=(delivery == "stream"))
+
+    return JsonResponse({"ok": True, "job_id": job_id, **_job_urls(job_id), "delivery": delivery}, status=202)
+
+
+def probe(request):
+    """
+    Pré-validação do uploader: lê só os cabeçalhos (formato, dimensões,
+    modo, quadros, orientação EXIF, ICC) e diz o que seria recusado em
+    /processar/, sem salvar nada.
+
+    O JS manda apenas o começo de cada arquivo (`tamanhos` traz o tamanho
+    real, na mesma ordem). Se o cabeçalho não couber no pedaço, o arquivo
+    volta como `partial` e a decisão fica para o upload.
+    """
+    from . import admission
+
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    files = _uploaded_files(request)
+    if not files:
+        return JsonResponse(
+            {"ok": False, "errors": {"arquivos": ["Nenhum arquivo enviado."]}},
+            status=400,
+        )
+    sizes = request.POST.getlist("tamanhos")
+    real_sizes = []
+    for i, f in enumerate(files):
+        try:
+            real_sizes.append(int(sizes[i]))
+        except (IndexError, ValueError):
+            real_sizes.append(int(f.size))
+    limit_error = _plan_limit_error(request, len(files), sum(real_sizes))
+    if limit_error:
+        return limit_error
+
+    mem = getattr(settings, "IMAGES_MEMORY", {}) or {}
+    max_file = mem.get("MAX_FILE_PEAK_BYTES")
+
+    planner = _strip_planner()
+    results, batch_decoded = [], 0
+    for f, real_size in zip(files, real_sizes):
+        info = admission.probe(f, f.name)
+        if not info.ok:
+            if real_size > f.size:
+                results.append({"name": info.name, "ok": True, "partial": True})
+            else:
+                results.append({**info.as_dict(), "code": "INVALID_IMAGE"})
+            continue
+        # sem os parâmetros da conversão: vale o melhor caso (faixas, se a origem permite)
+        cost = planner.cost(info)
+        batch_decoded += cost.decoded_bytes
+        entry = {**info.as_dict(), "estimated_bytes": cost.peak_bytes}
+        if max_file and cost.peak_bytes > int(max_file):
+            entry.update(ok=False, code="IMAGE_TOO_LARGE", allowed_bytes=int(max_file))
+        results.append(entry)
+
+    max_batch = mem.get("MAX_BATCH_DECODED_BYTES")
+    return JsonResponse({
+        "ok": all(r["ok"] for r in results),
+        "files": results,
+        "estimated_bytes": int(batch_decoded),
+        "allowed_batch_bytes": int(max_batch) if max_batch else None,
+    })
+
+
+# ================== Upload em partes ==================
+
+def _upload_check(spec: dict) -> uploads.Check:
+    """Confere cada arquivo completo como /processar/ confere os uploads."""
+    from . import admission
+
+    max_file = (getattr(settings, "IMAGES_MEMORY", {}) or {}).get("MAX_FILE_PEAK_BYTES")
+
+    def check(path: Path, name: str):
+        info = admission.probe(path, name)
+        if not info.ok:
+            return "INVALID_IMAGE", info.reason
+        planner = _options_planner(spec["options"])
+        cost = planner.cost(info, spec["out_ext"])
+        if max_file and cost.peak_bytes > int(max_file):
+            return "IMAGE_TOO_LARGE", "Imagem grande demais para converter (resolução excede o limite de memória)."
+        return None
+
+    return check
+
+def _upload_urls(job_id: str) -> dict:
+    # pedaços: PUT em upload_url + "<índice>/"
+    return {
+        "upload_url": reverse("images:upload_state", args=[job_id]),
+        "finalize_url": reverse("images:upload_finalize", args=[job_id]),
+        **_job_urls(job_id),
+    }
+
+
+def upload_init(request):
+    """
+    Abre um upload em partes (lotes grandes): os mesmos campos de /processar/,
+    mas no lugar dos arquivos vêm `nomes` e `tamanhos`, na mesma ordem. Os
+    limites do plano são conferidos aqui; o cabeçalho de cada arquivo, quando
+    ele termina de chegar (ver tools.images.uploads).
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    form = ImageConvertForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({"ok": False, "errors": form.errors}, status=400)
 
-    # 'out_ext' do form ou alias 'format' do <select>
-    out_ext = (form.cleaned_data.get("out_ext") or request.POST.get("format") or "").strip().lower()
-    if not out_ext:
+    names = request.POST.getlist("nomes")
+    try:
+        sizes = [int(v) for v in request.POST.getlist("tamanhos")]
+    except ValueError:
+        sizes = []
+    if not names or len(names) != len(sizes) or any(n < 0 for n in sizes):
         return JsonResponse(
-            {"ok": False, "errors": {"out_ext": ["Formato de saída é obrigatório."]}},
+            {"ok": False, "errors": {"arquivos": ["Informe nome e tamanho de cada arquivo."]}},
             status=400,
         )
 
-    # Demais parâmetros
-    jpeg_quality       = form.cleaned_data.get("jpeg_quality") or 85
-    jpeg_progressive   = bool(form.cleaned_data.get("jpeg_progressive"))
-    webp_quality       = form.cleaned_data.get("webp_quality") or 85
-    png_compress_level = form.cleaned_data.get("png_compress_level") or 6
-    tiff_compression   = form.cleaned_data.get("tiff_compression") or None
-    background_hex     = (form.cleaned_data.get("background_hex") or "#FFFFFF").upper()
-    bg_rgb = tuple(int(background_hex[i:i+2], 16) for i in (1, 3, 5))
-    brand_tag   = form.cleaned_data.get("brand_tag") or "ConverteTudo"
-    name_style  = form.cleaned_data.get("name_style") or "suffix"
-    overwrite   = bool(form.cleaned_data.get("overwrite"))
+    limit_error = _plan_limit_error(request, len(names), sum(sizes))
+    if limit_error:
+        return limit_error
 
-    # 1) Salva uploads
-    job_base, src_dir = _job_dirs()
-    src_paths = _save_uploads(files, src_dir)
-
-    # 2) Converte e zipa
-    conv = ImagesConverter(
-        brand_tag=brand_tag,
-        name_style=name_style,
-        background_rgb=bg_rgb,
-        overwrite=overwrite,
-        jpeg_quality=jpeg_quality,
-        webp_quality=webp_quality,
-        jpeg_progressive=jpeg_progressive,
-        png_compress_level=png_compress_level,
-        tiff_compression=tiff_compression,
-    )
+    empty = [name for name, size in zip(names, sizes) if size == 0]
+    if empty:
+        return JsonResponse(
+            {
+                "ok": False,
+                "code": "INVALID_IMAGE",
+                "files": [{"name": name, "reason": "Arquivo vazio"} for name in empty],
+                "message": "Alguns arquivos não são imagens válidas ou estão corrompidos.",
+            },
+            status=415,
+        )
 
-    def on_progress(pct: int, label: str) -> None:
-        # Hook para SSE/WebSocket futuramente
-        pass
+    out_exts = _out_exts(request, form)
+    if not out_exts:
+        return _out_ext_required()
 
-    batch = conv.convert_batch_to_zip(
-        src_files=src_paths,
-        out_ext=out_ext,
-        work_dir=job_base,
-        progress=on_progress,
-        keep_outputs=False,  # mantemos só o ZIP final
+    job_base, _ = _job_dirs()
+    manifest = uploads.create(
+        job_base,
+        {"out_ext": out_exts, "options": _job_options(request, form)},
+        list(zip(names, sizes)),
+        _upload_config()["CHUNK_BYTES"],
     )
+    job_id = job_base.name
+    return JsonResponse(
+        {
+            "ok": True,
+            "job_id": job_id,
+            "chunk_bytes": manifest["chunk_bytes"],
+            "files": uploads.state(job_base)["files"],
+            **_upload_urls(job_id),
+        },
+        status=201,
+    )
+
+
+def upload_state(request, job_id: str):
+    """Até onde cada arquivo chegou: o cliente retoma dos offsets daqui."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    job_base = jobs.job_dir(job_id)
+    state = uploads.state(job_base) if job_base else None
+    if state is None:
+        return _job_not_found()
+    status = jobs.read_status(job_base) or {}
+    return JsonResponse({"ok": True, "job_id": job_id, "state": status.get("state"), **state, **_upload_urls(job_id)})
+
+
+def upload_chunk(request, job_id: str, index: int):
+    """
+    PUT com os bytes de um pedaço do arquivo `index`; o cabeçalho
+    Upload-Offset diz onde ele começa. Com o último pedaço o arquivo é
+    conferido e, se aceito, já pode ser convertido.
+    """
+    if request.method != "PUT":
+        return HttpResponseNotAllowed(["PUT"])
+
+    job_base = jobs.job_dir(job_id)
+    spec = jobs.read_spec(job_base) if job_base else None
+    if not spec or not spec.get("upload"):
+        return _job_not_found()
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return JsonResponse(
+            {"ok": False, "code": "OFFSET_REQUIRED", "message": "Cabeçalho Upload-Offset ausente ou inválido."},
+            status=400,
+        )
+    length = int(request.META.get("CONTENT_LENGTH") or 0)
+
+    try:
+        # lê do request em pedaços (request.body carregaria tudo e esbarra em DATA_UPLOAD_MAX_MEMORY_SIZE)
+        item = uploads.write_chunk(job_base, index, offset, request, length, _upload_check(spec))
+    except uploads.UploadError as e:
+        return JsonResponse({"ok": False, "code": e.code, "message": e.message, **e.extra}, status=e.status)
+    return JsonResponse({"ok": True, **item})
+
 
-    if not batch.ok or not batch.zip_path:
+def upload_finalize(request, job_id: str):
+    """Fim do envio: com todos os arquivos recebidos, responde como /processar/."""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    job_base = jobs.job_dir(job_id)
+    if job_base is None or uploads.read_manifest(job_base) is None:
+        return _job_not_found()
+    missing = uploads.finalize(job_base)
+    if missing:
         return JsonResponse(
             {
                 "ok": False,
-                "errors": (
-                    [{"src": str(e.src), "reason": e.reason} for e in getattr(batch, "errors", [])]
-                    or [{"reason": "Falha ao converter"}]
-                ),
+                "code": "UPLOAD_INCOMPLETE",
+                "missing": missing,
+                "message": "Ainda faltam arquivos para terminar o envio.",
             },
-            status=400,
+            status=409,
+        )
+    # a conversão acompanhou o upload no worker: não há entrega em streaming aqui
+    return JsonResponse({"ok": True, "job_id": job_id, **_job_urls(job_id), "delivery": "queue"}, status=202)
+
+def _job_payload(job_id: str, job_base: Path, status: dict) -> dict:
+    payload = {
+        "ok": status.get("state") != jobs.FAILED,
+        "job_id": job_id,
+        "state": status.get("state"),
+        "progress": int(status.get("progress") or 0),
+        "label": status.get("label") or "",
+    }
+    if jobs.is_stranded(status):
+        # ninguém vai converter: o cliente para de esperar (o job segue na fila)
+        payload.update(
+            ok=False,
+            state=jobs.FAILED,
+            code="WORKER_UNAVAILABLE",
+            label="Conversão indisponível",
+            errors=[{"reason": "Nenhum worker de conversão ativo. Tente novamente mais tarde."}],
         )
+        return payload
+    if status.get("state") in (jobs.DONE, jobs.FAILED):
+        payload["errors"] = status.get("errors") or []
+    if status.get("state") == jobs.DONE:
+        payload.update(
+            converted=int(status.get("converted") or 0),
+            fallback_count=int(status.get("fallback_count") or 0),
+            duplicates=int(status.get("duplicates") or 0),
+            timings_ms=status.get("timings_ms") or {},
+            streamed=bool(status.get("streamed")),
+        )
+        if status.get("zip_name"):  # jobs em streaming não deixam ZIP em disco
+            payload.update(
+                zip_url=_public_url(job_base / status["zip_name"]),
+                zip_name=status["zip_name"],
+                download_url=reverse("images:job_download", args=[job_id]),
+            )
+    return payload
+
+def _job_not_found() -> JsonResponse:
+    return JsonResponse({"ok": False, "code": "JOB_NOT_FOUND", "message": "Job não encontrado."}, status=404)
+
+
+def job_status(request, job_id: str):
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    job_base = jobs.job_dir(job_id)
+    status = jobs.read_status(job_base) if job_base else None
+    if status is None:
+        return _job_not_found()
+    return JsonResponse(_job_payload(job_id, job_base, status))
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _job_event(job_id: str, job_base: Path, last_mtime: int | None, idle: bool):
+    """
+    Próximo evento SSE do job: (mtime, evento, payload), com evento None se não
+    há nada novo. O status.json só é relido quando o mtime muda, ou em `idle`
+    (keepalive) para notar um job que ficou sem worker. Faz E/S de arquivo:
+    sob ASGI roda fora do event loop.
+    """
+    try:
+        mtime = (job_base / "status.json").stat().st_mtime_ns
+    except FileNotFoundError:
+        return last_mtime, None, None
+    if mtime == last_mtime and not idle:
+        return mtime, None, None
+    status = jobs.read_status(job_base)
+    if status is None or (mtime == last_mtime and not jobs.is_stranded(status)):
+        return last_mtime, None, None
+    payload = _job_payload(job_id, job_base, status)
+    return mtime, ("end" if payload["state"] in (jobs.DONE, jobs.FAILED) else "progress"), payload
+
+
+async def job_events(request, job_id: str):
+    """
+    Progresso do job via Server-Sent Events.
+
+    View assíncrona: sob ASGI cada conexão é só uma corrotina no event loop
+    (nenhuma thread presa), então centenas de abas abertas custam pouco. As
+    leituras do status.json vão para uma thread (asyncio.to_thread) e só
+    acontecem quando o mtime muda.
+
+    Sob WSGI (runserver, gunicorn sem o worker uvicorn) o Django consome o
+    iterador assíncrono inteiro antes de enviar o primeiro byte, e o stream
+    só termina com o job. Ali a resposta é só o estado atual: o EventSource
+    do cliente cai para o polling de /jobs/<id>/.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    job_base = await asyncio.to_thread(jobs.job_dir, job_id)
+    if job_base is None or await asyncio.to_thread(jobs.read_status, job_base) is None:
+        return _job_not_found()
+
+    if not isinstance(request, ASGIRequest):
+        _, event, payload = _job_event(job_id, job_base, None, True)
+        response = HttpResponse("retry: 2000\n\n" + (_sse(event, payload) if event else ""), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    interval = float(getattr(settings, "IMAGES_SSE_INTERVAL_SECONDS", 0.25))
+    keepalive = float(getattr(settings, "IMAGES_SSE_KEEPALIVE_SECONDS", 15.0))
+
+    async def stream():
+        last_mtime = None
+        last_sent = time.monotonic()
+        yield "retry: 2000\n\n"
+        while True:
+            idle = time.monotonic() - last_sent >= keepalive
+            last_mtime, event, payload = await asyncio.to_thread(_job_event, job_id, job_base, last_mtime, idle)
+            if event is not None:
+                last_sent = time.monotonic()
+                yield _sse(event, payload)
+                if event == "end":
+                    return
+            elif idle:
+                last_sent = time.monotonic()
+                yield ": ping\n\n"  # mantém proxies/conexão abertos
+            await asyncio.sleep(interval)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # desliga buffering em proxies nginx
+    return response
+
+
+# ================== Download do ZIP ==================
+
+_STREAM_END = object()
+
+def _aiter_in_thread(gen, maxsize: int = 8):
+    """
+    Adapta um gerador síncrono para iterador assíncrono (resposta sob ASGI).
 
+    O gerador roda numa thread própria: a conversão leva segundos e não pode
+    ocupar a thread única que o Django usa para código síncrono sob ASGI
+    (nem ser materializada inteira, como o Django faz com iteradores
+    síncronos). A fila limitada segura a conversão se o cliente ler devagar;
+    se o cliente desconectar, o gerador é fechado na própria thread dele.
+    """
+    chunks: queue.Queue = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def deliver(item) -> bool:
+        # nunca bloqueia sem prazo: se o consumidor foi embora (stop), desiste
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in gen:
+                if not deliver(chunk):
+                    break
+        except BaseException as e:
+            deliver(e)
+        finally:
+            gen.close()
+            deliver(_STREAM_END)
+
+    threading.Thread(target=produce, name="images-zip-stream", daemon=True).start()
+
+    def take():
+        # idem na leitura: cancelado no meio de uma conversão, o consumidor
+        # não pode deixar uma thread do executor presa em chunks.get()
+        while not stop.is_set():
+            try:
+                return chunks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _STREAM_END
+
+    async def consume():
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                item = await loop.run_in_executor(None, take)
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    return consume()
+
+def _file_chunks(path: Path, chunk_size: int = 256 * 1024):
+    with open(path, "rb") as fh:
+        while chunk := fh.read(chunk_size):
+            yield chunk
+
+def _zip_response(request, chunks, filename: str) -> StreamingHttpResponse:
+    if isinstance(request, ASGIRequest):
+        chunks = _aiter_in_thread(chunks)
+    response = StreamingHttpResponse(chunks, content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["Cache-Control"] = "no-store"
+    response["X-Accel-Buffering"] = "no"  # entrega cada pedaço assim que sai do conversor
+    return response
+
+
+def job_download(request, job_id: str):
+    """
+    ZIP do job. Jobs com entrega em streaming são convertidos aqui mesmo, e
+    o ZIP sai em pedaços à medida que cada imagem fica pronta, sem existir
+    inteiro em disco nem em memória. Jobs do worker já concluídos são
+    servidos do disco (não depende de MEDIA_URL/DEBUG).
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    job_base = jobs.job_dir(job_id)
+    status = jobs.read_status(job_base) if job_base else None
+    if status is None:
+        return _job_not_found()
+
+    if status.get("state") == jobs.DONE and status.get("zip_name"):
+        return _zip_response(request, _file_chunks(job_base / status["zip_name"]), status["zip_name"])
+
+    spec = jobs.read_spec(job_base) or {}
+    if status.get("state") == jobs.QUEUED and jobs.claim_deferred(job_base):
+        from .converter import zip_name_for
+
+        return _zip_response(request, jobs.stream_job(job_base), zip_name_for(spec.get("out_ext") or ""))
+
+    if status.get("state") == jobs.DONE:
+        return JsonResponse(
+            {"ok": False, "code": "ALREADY_DOWNLOADED", "message": "O ZIP deste job já foi entregue em streaming."},
+            status=410,
+        )
+    if status.get("state") == jobs.FAILED:
+        return JsonResponse(_job_payload(job_id, job_base, status) | {"code": "JOB_FAILED"}, status=409)
     return JsonResponse(
         {
-            "ok": True,
-            "zip_url": _public_url(batch.zip_path),
-            "zip_name": os.path.basename(str(batch.zip_path)),
-            "converted": int(getattr(batch, "converted", 0)),
-            "fallback_count": int(getattr(batch, "fallback_count", 0)),
-            "errors": [{"src": str(e.src), "reason": e.reason} for e in getattr(batch, "errors", [])],
-        }
+            "ok": False,
+            "code": "JOB_NOT_READY",
+            "status_url": reverse("images:job_status", args=[job_id]),
+            "message": "O ZIP ainda não está pronto.",
+        },
+        status=409,
     )
 
 
+# ================== Métricas ==================
+
+def metrics(request):
+    """Contadores de conversão no formato texto do Prometheus (todos os processos)."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    cfg = getattr(settings, "IMAGES_METRICS", None) or {}
+    token = cfg.get("TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+
+    values = images_metrics.collect(Path(cfg["DIR"])) if cfg.get("DIR") else {}
+    return HttpResponse(
+        images_metrics.render_prometheus(values),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# ================== Estatísticas ==================
+
+def conversion_stats(request):
+    """Contadores do live-stats da página (agregados de tools.images.history, em cache)."""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    from . import history
+
+    response = JsonResponse({"ok": True, **history.cached_stats()})
+    patch_cache_control(response, public=True, max_age=history.stats_ttl())
+    return response
+
+
 # ================== Handler 400 custom (TooManyFilesSent) ==================
 
 def bad_request(request, exception):